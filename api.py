@@ -0,0 +1,346 @@
+"""HTTP/JSON API over the generators, for other tools.
+
+A plain ASGI application, served by any ASGI server:
+
+    uvicorn api:app --port 8000
+
+    GET  /generators              generators and the arguments each one takes
+    POST /jobs                    {"generator": "plan", "args": {"transcript": "..."}} -> 202 {"id", "status"}
+    GET  /jobs/<id>               status, result or error of a job
+    GET  /jobs/<id>/events        server-sent events: status changes, partial output, the result
+
+Partial output is the model output as it streams in, {"text": ...} chunks
+to append (repair requests stream too, so it is a preview; the result is
+final), or one {"use_case", "spec"} event per finished use case spec.
+    GET  /health
+
+Send an ``Idempotency-Key`` header with POST /jobs to make retries safe: a
+repeated request with the same key returns the job created by the first one.
+An ``X-Client-Id`` header lets the scheduler share request slots fairly
+between client tools.
+
+Jobs run the same synchronous generators the UI uses, on a bounded thread
+pool. They share the process-wide LLM client, completion cache and request
+scheduler, so many concurrent jobs queue for request slots rather than
+opening connections of their own. Throughput is bound by those slots, not by
+threads: api_benchmark.py measures the pool against asyncio tasks awaiting
+the same requests, and the two match once the pool has at least as many
+threads as there are slots. The cache and the OpenAI key are set up at
+server startup (the ASGI lifespan), as the UI does for its sessions.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import artifacts
+import fanout
+import llm
+import main
+import progress
+import scheduler
+
+JOB_WORKERS = int(os.environ.get("AGENT_SIMON_API_WORKERS", 32))
+MAX_JOBS = 10000  # finished jobs beyond this are forgotten, oldest first
+MAX_BODY_BYTES = 10 * 1024 * 1024
+HEARTBEAT_SECONDS = 15
+PARTIAL_SECONDS = 0.5  # streamed model output is published at most this often
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+def _streamed(fn):
+    """Wrap a generator so the model output is published as ``partial`` events ({"text": ...}) while it streams in."""
+    def run(args, job):
+        tracker = progress.Tracker()
+        pending, published = [], time.monotonic()
+
+        def flush():
+            if pending:
+                job.publish("partial", {"text": "".join(pending)})
+                pending.clear()
+
+        def listener(event, stage):
+            nonlocal published
+            if event == progress.TOKENS and stage.get("text"):
+                pending.append(stage["text"])
+                if time.monotonic() - published >= PARTIAL_SECONDS:
+                    flush()
+                    published = time.monotonic()
+        tracker.subscribe(listener)
+        with tracker.stage(job.generator):
+            result = fn(args, job)
+        flush()
+        return result
+    return run
+
+
+def _plan(args, job):
+    return main.generate_plan(args["transcript"], raise_errors=True)
+
+
+def _table(args, job):
+    table = main.generate_table(args["plan"], args["instruction"])
+    return main.repair_object_table(table, args["plan"], args["instruction"])[0]
+
+
+def _workflow(args, job):
+    return main.generate_workflow(args["plan"], args["actor_objects"])
+
+
+def _use_case_table(args, job):
+    table = main.generate_use_case_table(args["plan"], args["actor_objects"])
+    return main.repair_use_case_table(table, args["plan"], args["actor_objects"])[0]
+
+
+def _permission_matrix(args, job):
+    matrix = main.generate_permission_matrix(args["actor_objects"], args["use_case_table"])
+    return main.repair_permission_matrix(matrix, args["actor_objects"], args["use_case_table"])[0]
+
+
+def _use_case_specs(args, job):
+    use_cases = artifacts.use_cases_from_markdown(args["use_case_table"])
+    if not use_cases:
+        raise ValueError("No use cases found in use_case_table.")
+    key = lambda use_case: use_case.id or use_case.name
+
+    def generate(use_case):
+        spec = main.generate_use_case_specs(use_case, args["workflow"])
+        job.publish("partial", {"use_case": key(use_case), "spec": spec})
+        return spec
+    run = fanout.FanOutRun(scheduler.bind(generate), use_cases, key=key, workers=main.SPEC_WORKERS)
+    run.start()
+    run.wait()
+    if run.failed():
+        raise RuntimeError("; ".join(f"{key(use_case)}: {run.result(use_case)['error']}" for use_case in run.failed()))
+    return {key(use_case): spec for use_case, spec in zip(run.done(), run.values())}
+
+
+# name -> (required arguments, fn(args, job))
+GENERATORS = {
+    "plan": (["transcript"], _streamed(_plan)),
+    "table": (["plan", "instruction"], _streamed(_table)),
+    "workflow": (["plan", "actor_objects"], _streamed(_workflow)),
+    "use_case_table": (["plan", "actor_objects"], _streamed(_use_case_table)),
+    "permission_matrix": (["actor_objects", "use_case_table"], _streamed(_permission_matrix)),
+    "use_case_specs": (["use_case_table", "workflow"], _use_case_specs),
+}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class Job:
+    def __init__(self, generator, args, loop):
+        self.id = uuid.uuid4().hex
+        self.generator = generator
+        self.args = args
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.events = []  # (event, data), replayed to every subscriber
+        self._lock = threading.Lock()
+        self._loop = loop
+        self._waiters = set()
+        self.publish("status", {"status": QUEUED})
+
+    def publish(self, event, data):
+        """Record an event and wake the subscribers. Safe to call from any thread."""
+        with self._lock:
+            self.events.append((event, data))
+            waiters, self._waiters = self._waiters, set()
+        for waiter in waiters:
+            self._loop.call_soon_threadsafe(waiter.set)
+
+    def waiter(self):
+        """An asyncio.Event set on the next published event."""
+        event = asyncio.Event()
+        with self._lock:
+            self._waiters.add(event)
+        return event
+
+    def finished(self):
+        return self.status in (DONE, FAILED)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "generator": self.generator,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+            "partial": [data for event, data in self.events if event == "partial"],
+        }
+
+
+class JobService:
+    """Runs jobs on a bounded thread pool and keeps them for polling."""
+
+    def __init__(self, workers=JOB_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="api-job")
+        self._lock = threading.Lock()
+        self.jobs = OrderedDict()
+        self._idempotency = {}  # key -> (request digest, job id)
+
+    def submit(self, generator, args, idempotency_key=None, client=None):
+        """Start a job, or return the job already created for ``idempotency_key``. Returns (job, created)."""
+        if generator not in GENERATORS:
+            raise HTTPError(404, f"Unknown generator {generator!r}; available: {', '.join(GENERATORS)}")
+        required, fn = GENERATORS[generator]
+        if not isinstance(args, dict):
+            raise HTTPError(400, "args must be an object")
+        missing = [name for name in required if not isinstance(args.get(name), str)]
+        if missing:
+            raise HTTPError(400, f"Missing string arguments: {', '.join(missing)}")
+        digest = hashlib.sha256(json.dumps([generator, args], sort_keys=True).encode()).hexdigest()
+        with self._lock:
+            if idempotency_key is not None and idempotency_key in self._idempotency:
+                known_digest, job_id = self._idempotency[idempotency_key]
+                if known_digest != digest:
+                    raise HTTPError(409, "Idempotency-Key was already used for a different request")
+                if job_id in self.jobs:
+                    return self.jobs[job_id], False
+            job = Job(generator, args, asyncio.get_running_loop())
+            self.jobs[job.id] = job
+            if idempotency_key is not None:
+                self._idempotency[idempotency_key] = (digest, job.id)
+            self._forget_old_jobs()
+        self._executor.submit(self._run, job, fn, client)
+        return job, True
+
+    def _forget_old_jobs(self):
+        if len(self.jobs) <= MAX_JOBS:
+            return
+        while len(self.jobs) > MAX_JOBS:
+            oldest = next((job for job in self.jobs.values() if job.finished()), None)
+            if oldest is None:
+                break
+            del self.jobs[oldest.id]
+        self._idempotency = {key: value for key, value in self._idempotency.items() if value[1] in self.jobs}
+
+    def _run(self, job, fn, client):
+        job.status = RUNNING
+        job.publish("status", {"status": RUNNING})
+        try:
+            # Requests of one client share slots fairly with the UI sessions
+            with scheduler.context(session=f"api:{client or 'anonymous'}"):
+                job.result = fn(job.args, job)
+        except Exception as e:
+            job.error = str(e)
+            job.status = FAILED
+            job.publish("failed", {"error": job.error})
+        else:
+            job.status = DONE
+            job.publish("done", {"result": job.result})
+
+    def get(self, job_id):
+        with self._lock:
+            job = self.jobs.get(job_id)
+        if job is None:
+            raise HTTPError(404, f"No job {job_id}")
+        return job
+
+
+service = JobService()
+
+
+async def _read_body(receive):
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if len(body) > MAX_BODY_BYTES:
+            raise HTTPError(413, "Request body too large")
+        if not message.get("more_body"):
+            return body
+
+
+async def _send_json(send, status, payload):
+    body = json.dumps(payload).encode()
+    await send({"type": "http.response.start", "status": status, "headers": [
+        (b"content-type", b"application/json"),
+        (b"content-length", str(len(body)).encode()),
+    ]})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _stream_events(send, job, last_event_id):
+    """Send the job's events as server-sent events until the job finishes."""
+    await send({"type": "http.response.start", "status": 200, "headers": [
+        (b"content-type", b"text/event-stream"),
+        (b"cache-control", b"no-cache"),
+    ]})
+    position = last_event_id + 1
+    while True:
+        waiter = job.waiter()
+        events = job.events[position:]
+        for offset, (event, data) in enumerate(events):
+            message = f"id: {position + offset}\nevent: {event}\ndata: {json.dumps(data)}\n\n"
+            await send({"type": "http.response.body", "body": message.encode(), "more_body": True})
+        position += len(events)
+        if job.finished() and position >= len(job.events):
+            break
+        try:
+            await asyncio.wait_for(waiter.wait(), HEARTBEAT_SECONDS)
+        except asyncio.TimeoutError:
+            await send({"type": "http.response.body", "body": b": keep-alive\n\n", "more_body": True})
+    await send({"type": "http.response.body", "body": b""})
+
+
+def connect():
+    """Resolve the OpenAI key as the UI does and cache completions in the process's shared store."""
+    main.connect_openai()
+    llm.cache = main.shared_store()
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            connect()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    """The ASGI application."""
+    if scope["type"] == "lifespan":
+        return await _lifespan(receive, send)
+    if scope["type"] != "http":
+        return
+    method, parts = scope["method"], [part for part in scope["path"].split("/") if part]
+    headers = {name.decode().lower(): value.decode() for name, value in scope["headers"]}
+    try:
+        if method == "GET" and parts == ["health"]:
+            return await _send_json(send, 200, {"status": "ok", "jobs": len(service.jobs), "queue": llm.queue.stats()})
+        if method == "GET" and parts == ["generators"]:
+            return await _send_json(send, 200, {name: {"args": required} for name, (required, _) in GENERATORS.items()})
+        if method == "POST" and parts == ["jobs"]:
+            try:
+                request = json.loads(await _read_body(receive) or b"{}")
+            except json.JSONDecodeError:
+                raise HTTPError(400, "Body must be JSON")
+            if not isinstance(request, dict):
+                raise HTTPError(400, "Body must be a JSON object")
+            job, created = service.submit(request.get("generator"), request.get("args", {}), headers.get("idempotency-key"), headers.get("x-client-id"))
+            return await _send_json(send, 202 if created else 200, {"id": job.id, "status": job.status})
+        if method == "GET" and len(parts) == 2 and parts[0] == "jobs":
+            return await _send_json(send, 200, service.get(parts[1]).to_dict())
+        if method == "GET" and len(parts) == 3 and parts[0] == "jobs" and parts[2] == "events":
+            job = service.get(parts[1])
+            last_event_id = int(headers.get("last-event-id", -1)) if headers.get("last-event-id", "").lstrip("-").isdigit() else -1
+            return await _stream_events(send, job, last_event_id)
+        raise HTTPError(404, f"No route for {method} {scope['path']}")
+    except HTTPError as e:
+        await _send_json(send, e.status, {"error": str(e)})
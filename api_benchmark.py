@@ -0,0 +1,87 @@
+"""Throughput of the API's job thread pool against plain asyncio tasks, with a local fake LLM.
+
+Both runs start ``--jobs`` object table jobs at once. Every request is
+answered by a fake model after ``--latency`` seconds and holds one of
+``--slots`` request slots, as requests do under the process-wide scheduler.
+The thread pool run goes through ``api.JobService`` with the real
+generators; the asyncio run only awaits the same number of requests per job
+behind a semaphore, which is the most an async client could reach with the
+same slots:
+
+    python api_benchmark.py --jobs 100 300 --workers 32 256
+"""
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+import api
+import llm
+import scheduler
+import worker_benchmark
+
+INSTRUCTION = "List all data objects within the software system..."
+
+
+async def threaded(jobs, workers):
+    """Seconds to finish ``jobs`` jobs on a JobService with ``workers`` threads, requests sent and peak thread count."""
+    calls, peak = [], threading.active_count()
+
+    def send(**request):
+        calls.append(1)
+        return worker_benchmark._fake_send(**request)
+    llm._send = send
+    service = api.JobService(workers)
+    start = time.perf_counter()
+    submitted = [service.submit("table", {"plan": f"Plan {index}", "instruction": INSTRUCTION})[0] for index in range(jobs)]
+    while not all(job.finished() for job in submitted):
+        peak = max(peak, threading.active_count())
+        await asyncio.sleep(0.01)
+    seconds = time.perf_counter() - start
+    service._executor.shutdown()
+    failed = sum(job.status == api.FAILED for job in submitted)
+    return seconds, len(calls), peak, failed
+
+
+async def asynchronous(jobs, calls, slots, latency):
+    """Seconds for ``jobs`` tasks to await ``calls`` fake requests each, ``slots`` at a time."""
+    semaphore = asyncio.Semaphore(slots)
+
+    async def job():
+        for _ in range(calls):
+            async with semaphore:
+                await asyncio.sleep(latency)
+    start = time.perf_counter()
+    await asyncio.gather(*(job() for _ in range(jobs)))
+    return time.perf_counter() - start
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type=int, nargs="+", default=[100, 300])
+    parser.add_argument("--workers", type=int, nargs="+", default=[api.JOB_WORKERS], help="thread pool sizes to measure")
+    parser.add_argument("--slots", type=int, default=32, help="requests in flight at once")
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds the fake model takes per request")
+    return parser.parse_args(argv)
+
+
+def run(argv=None):
+    args = parse_args(argv)
+    os.environ["AGENT_SIMON_FAKE_LATENCY"] = str(args.latency)
+    llm.cache = None  # every job sends its own requests
+    llm.queue = scheduler.Scheduler(slots=args.slots)
+    print(f"{'jobs':>5s} {'run':>14s} {'seconds':>8s} {'jobs/s':>8s} {'threads':>7s} {'failed':>6s}")
+    for jobs in args.jobs:
+        calls = None
+        for workers in args.workers:
+            seconds, sent, peak, failed = asyncio.run(threaded(jobs, workers))
+            calls = sent // jobs
+            print(f"{jobs:5d} {f'{workers} threads':>14s} {seconds:8.2f} {jobs / seconds:8.2f} {peak:7d} {failed:6d}")
+        seconds = asyncio.run(asynchronous(jobs, calls, args.slots, args.latency))
+        print(f"{jobs:5d} {'asyncio':>14s} {seconds:8.2f} {jobs / seconds:8.2f} {threading.active_count():7d} {0:6d}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(run())
@@ -0,0 +1,279 @@
+"""Process-wide artifact store shared by all Streamlit sessions.
+
+Values are keyed by content hash, compressed when they are large, and evicted
+least recently used once the store is over its memory cap. Sessions keep only
+``ArtifactRef`` handles; an entry with live handles is pinned and is never
+evicted, so a session cannot lose an artifact it still shows.
+
+``DiskStore`` has the same interface on a directory, so that several
+processes (the UI and its workers) can share artifacts and completions.
+"""
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import weakref
+import zlib
+from collections import OrderedDict
+
+try:
+    import zstandard
+except ImportError:  # optional, zlib is used otherwise
+    zstandard = None
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+COMPRESS_THRESHOLD = 4096  # values smaller than this are kept uncompressed
+
+
+class ArtifactRef:
+    """Handle to a value in the store. The entry stays pinned while the handle is alive."""
+    __slots__ = ("key", "size", "__weakref__")
+
+    def __init__(self, key, size):
+        self.key = key
+        self.size = size
+
+    def __repr__(self):
+        return f"ArtifactRef({self.key[:12]}, {self.size} bytes)"
+
+
+def _encode(value):
+    if isinstance(value, str):
+        return b"s" + value.encode()
+    return b"p" + pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _decode(data):
+    if data[:1] == b"s":
+        return data[1:].decode()
+    return pickle.loads(data[1:])
+
+
+def _compress(data):
+    if len(data) < COMPRESS_THRESHOLD:
+        return "raw", data
+    if zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor(level=3).compress(data)
+    return "zlib", zlib.compress(data, 6)
+
+
+def _decompress(codec, blob):
+    if codec == "zstd":
+        return zstandard.ZstdDecompressor().decompress(blob)
+    if codec == "zlib":
+        return zlib.decompress(blob)
+    return blob
+
+
+def content_key(*parts):
+    """Hash of the given parts, for keying values by the inputs that produced them."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else str(part).encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class ArtifactStore:
+    """Thread-safe LRU store with a memory cap on the compressed size of its entries."""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> [codec, blob, raw size, pins]
+        self._lock = threading.Lock()
+        self._stored_bytes = 0
+        self.hits = self.misses = self.evictions = 0
+
+    def put(self, value, key=None):
+        """Store ``value`` (under its content hash unless ``key`` is given) and return a pinned ref."""
+        data = _encode(value)
+        key = key or content_key(data)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                codec, blob = _compress(data)
+                entry = self._entries[key] = [codec, blob, len(data), 0]
+                self._stored_bytes += len(blob)
+            self._entries.move_to_end(key)
+            entry[3] += 1
+            self._evict()
+        ref = ArtifactRef(key, entry[2])
+        weakref.finalize(ref, self._unpin, key)
+        return ref
+
+    def cache(self, key, value):
+        """Store ``value`` under ``key`` without pinning it, so it can be evicted."""
+        data = _encode(value)
+        with self._lock:
+            if key not in self._entries:
+                codec, blob = _compress(data)
+                self._entries[key] = [codec, blob, len(data), 0]
+                self._stored_bytes += len(blob)
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def get(self, ref, default=None):
+        """Return the value for a ref or key, or ``default`` if it is not stored."""
+        key = ref.key if isinstance(ref, ArtifactRef) else ref
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            codec, blob = entry[0], entry[1]
+        return _decode(_decompress(codec, blob))
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def discard(self, key):
+        """Drop the entry under ``key``, e.g. a stale answer, unless a session still holds it."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[3] <= 0:
+                self._stored_bytes -= len(self._entries.pop(key)[1])
+
+    def _unpin(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry[3] -= 1
+                self._evict()
+
+    def _evict(self):
+        # Least recently used first, skipping entries that sessions still hold
+        if self._stored_bytes <= self.max_bytes:
+            return
+        for key in [key for key, entry in self._entries.items() if entry[3] <= 0]:
+            self._stored_bytes -= len(self._entries.pop(key)[1])
+            self.evictions += 1
+            if self._stored_bytes <= self.max_bytes:
+                break
+
+    def stats(self):
+        """Memory and hit statistics for display."""
+        with self._lock:
+            entries = list(self._entries.values())
+            return {
+                "entries": len(entries),
+                "pinned_entries": sum(entry[3] > 0 for entry in entries),
+                "stored_bytes": self._stored_bytes,
+                "raw_bytes": sum(entry[2] for entry in entries),
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+class DiskStore:
+    """Artifact store on a directory, shared by every process that opens it.
+
+    Entries are written atomically, one file per key, and the least recently
+    used files are deleted once the directory is over ``max_bytes``. Refs are
+    not pinned: another process may evict an entry, and a later ``get``
+    returns the default.
+    """
+
+    def __init__(self, directory, max_bytes=4 * DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._stored_bytes = sum(size for _, size, _ in self._files())
+        self.hits = self.misses = self.evictions = 0
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def _files(self):
+        for entry in os.scandir(self.directory):
+            if entry.is_dir():
+                for file in os.scandir(entry.path):
+                    stat = file.stat()
+                    yield file.path, stat.st_size, stat.st_mtime
+
+    def _write(self, key, data):
+        path = self._path(key)
+        if os.path.exists(path):
+            os.utime(path)
+            return
+        codec, blob = _compress(data)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temporary = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        with os.fdopen(fd, "wb") as file:
+            file.write(codec.encode().ljust(4) + blob)
+        os.replace(temporary, path)
+        with self._lock:
+            self._stored_bytes += len(blob) + 4
+            if self._stored_bytes > self.max_bytes:
+                self._evict()
+
+    def put(self, value, key=None):
+        """Store ``value`` (under its content hash unless ``key`` is given) and return a ref."""
+        data = _encode(value)
+        key = key or content_key(data)
+        self._write(key, data)
+        return ArtifactRef(key, len(data))
+
+    def cache(self, key, value):
+        """Store ``value`` under ``key``."""
+        self._write(key, _encode(value))
+
+    def get(self, ref, default=None):
+        """Return the value for a ref or key, or ``default`` if it is not stored."""
+        key = ref.key if isinstance(ref, ArtifactRef) else ref
+        try:
+            with open(self._path(key), "rb") as file:
+                header, blob = file.read(4), file.read()
+            os.utime(self._path(key))
+        except FileNotFoundError:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return _decode(_decompress(header.decode().strip(), blob))
+
+    def __contains__(self, key):
+        return os.path.exists(self._path(key))
+
+    def discard(self, key):
+        """Delete the entry under ``key``, if any."""
+        try:
+            size = os.path.getsize(self._path(key))
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            return
+        with self._lock:
+            self._stored_bytes -= size
+
+    def _evict(self):
+        # Recount from disk, other processes write here too; oldest access first
+        files = sorted(self._files(), key=lambda file: file[2])
+        self._stored_bytes = sum(size for _, size, _ in files)
+        for path, size, _ in files:
+            if self._stored_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            self._stored_bytes -= size
+            self.evictions += 1
+
+    def stats(self):
+        """Disk usage and hit statistics for display."""
+        files = list(self._files())
+        return {
+            "entries": len(files),
+            "pinned_entries": 0,
+            "stored_bytes": sum(size for _, size, _ in files),
+            "raw_bytes": sum(size for _, size, _ in files),
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,149 @@
+"""Typed model of the generated artifacts.
+
+The generators answer in markdown. Each object and use case table is parsed
+once, when it is saved, into slotted dataclasses that refer to each other by
+ID (a use case lists the IDs of the actors it names), and downstream steps
+work on the ``Model`` instead of parsing the markdown again. The markdown is
+kept for display, validation and export. Use case specs are read through
+``Spec`` when test cases are generated.
+
+Only what a downstream step reads is modelled. External systems are shown
+and exported but nothing consumes them, the permission matrix is parsed by
+``permissions.PermissionMatrix``, and models are stored with the artifact
+store's pickling, so there is no separate serializer or renderer here.
+"""
+import re
+from dataclasses import dataclass, field, replace
+
+import validators
+
+
+@dataclass(slots=True, frozen=True)
+class DataObject:
+    id: str
+    name: str
+    description: str = ""
+
+
+@dataclass(slots=True, frozen=True)
+class Actor:
+    id: str
+    name: str
+    description: str = ""
+
+
+@dataclass(slots=True, frozen=True)
+class UseCase:
+    id: str
+    name: str
+    description: str = ""
+    actor_ids: tuple = ()  # actors named in the use case
+
+    @property
+    def label(self):
+        return f"{self.id} {self.name}".strip()
+
+    @classmethod
+    def from_record(cls, record):
+        """A use case from a dict keyed by the use case table columns (UC_ID, UC_Name, Description)."""
+        return cls(str(record.get('UC_ID') or ""), str(record.get('UC_Name') or ""), str(record.get('Description') or ""))
+
+
+@dataclass(slots=True, frozen=True)
+class Spec:
+    use_case_id: str
+    rows: tuple = ()  # (field, value) pairs of the spec table, e.g. ("Acceptance Criteria", "...")
+    text: str = ""  # the spec as generated, for display
+
+    def get(self, name, default=""):
+        """The value of a spec field, matched loosely."""
+        wanted = validators.normalize(name)
+        return next((value for key, value in self.rows if validators.normalize(key) == wanted), default)
+
+
+# Session artifact name of each object table downstream steps read -> (Model field, object type)
+OBJECT_TABLES = {'data_objects': ('data_objects', DataObject), 'actor_objects': ('actors', Actor)}
+_ID_PREFIXES = {DataObject: "DO", Actor: "A"}
+
+
+def objects_from_markdown(md_text, cls):
+    """Objects of a data or actor table. IDs come from the item # column, or are numbered."""
+    table = validators.parse_table(md_text)
+    if table is None:
+        return ()
+    number, name, description = table.column("item #"), table.column("object"), table.column("description")
+    if name is None:
+        name = 1 if len(table.header) > 1 else 0
+    objects = []
+    for position, row in enumerate(table.rows, 1):
+        cell = lambda column: row[column] if column is not None and column < len(row) else ""
+        if not cell(name):
+            continue
+        item = re.sub(r"\D", "", cell(number)) or str(position)
+        objects.append(cls(f"{_ID_PREFIXES[cls]}{item}", cell(name), cell(description)))
+    return tuple(objects)
+
+
+def mentioned(text, objects):
+    """IDs of the objects whose name occurs in ``text``."""
+    text = validators.normalize(text)
+    return tuple(item.id for item in objects if validators.normalize(item.name) in text)
+
+
+def use_cases_from_markdown(md_text, actors=()):
+    """Use cases of a use case table, with references to the actors they name."""
+    table = validators.parse_table(md_text)
+    if table is None:
+        return ()
+    columns = [table.column(name) for name in validators.USE_CASE_COLUMNS]
+    if columns[1] is None:
+        return ()
+    use_cases = []
+    for row in table.rows:
+        uc_id, name, description = (row[column] if column is not None and column < len(row) else "" for column in columns)
+        if name:
+            use_cases.append(UseCase(uc_id, name, description, mentioned(f"{name} {description}", actors)))
+    return tuple(use_cases)
+
+
+def spec_from_markdown(use_case_id, md_text):
+    """A spec from its generated table (field name in the first column, value in the others)."""
+    table = validators.parse_table(md_text)
+    rows = []
+    if table is not None:
+        for row in [table.header] + table.rows:
+            if len(row) > 1 and row[0] and validators.normalize(row[0]) not in ("row", "field"):
+                rows.append((row[0].strip("* "), " ".join(row[1:]).strip()))
+    return Spec(use_case_id, tuple(rows), md_text or "")
+
+
+@dataclass(slots=True)
+class Model:
+    data_objects: tuple = ()
+    actors: tuple = ()
+    use_cases: tuple = ()
+    _actors: dict = field(default=None, repr=False, compare=False)  # actor by ID, built on demand
+
+    def update(self, **parts):
+        """A copy with some parts replaced; use cases are relinked to the current actors."""
+        model = replace(self, _actors=None, **parts)
+        if 'actors' in parts or 'use_cases' in parts:
+            model.use_cases = tuple(
+                replace(use_case, actor_ids=mentioned(f"{use_case.name} {use_case.description}", model.actors))
+                for use_case in model.use_cases
+            )
+        return model
+
+    def actors_of(self, use_case):
+        """Actors named in a use case."""
+        if self._actors is None:
+            self._actors = {actor.id: actor for actor in self.actors}
+        return [self._actors[actor_id] for actor_id in use_case.actor_ids if actor_id in self._actors]
+
+    def __getstate__(self):
+        # The actor lookup is rebuilt on demand, not stored
+        return (self.data_objects, self.actors, self.use_cases)
+
+    def __setstate__(self, state):
+        self.data_objects, self.actors, self.use_cases = state
+        self._actors = None
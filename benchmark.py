@@ -0,0 +1,305 @@
+"""Compare model and concurrency settings over the sample meeting transcripts.
+
+Every configuration overrides ``llm.STAGES`` (model, temperature and
+max_tokens per stage) and the concurrency settings (LLM slots, spec and
+test case workers, permission tile size), then runs the headless pipeline
+on each transcript. The report gives per configuration the wall time,
+tokens, truncated calls and a local quality proxy (validity of the tables,
+workflow graph, specs and test cases, and coverage of the actors), ranked
+by Pareto front: a configuration is on front 1 if no other one is at least
+as fast, as cheap and as good, and better in one of them.
+
+Two backends run without network access:
+
+    stand-in  a local model that answers every stage in the expected format, with
+              latency from MODEL_SPEEDS; it honours max_tokens, so truncation,
+              continuations and repairs behave as with the API, but the answers do
+              not differ in substance between models
+    cassette  responses recorded per configuration (``--cassettes DIR`` holds
+              ``<configuration>.jsonl``), replayed with their recorded latency;
+              record them once with ``--backend record``
+
+    python benchmark.py --configs sweep.json --out report.json
+    python benchmark.py --backend record --cassettes cassettes
+    python benchmark.py --backend cassette --cassettes cassettes --speed 0.1
+
+A configurations file is a JSON list of objects like
+    {"name": "mini-tables", "stages": {"table": {"model": "gpt-4o-mini"}}, "slots": 8,
+     "spec_workers": 4, "test_case_workers": 8, "permission_tile_size": 15}
+"""
+import argparse
+import copy
+import glob
+import json
+import os
+import re
+import sys
+import time
+from contextlib import contextmanager
+
+import artifacts
+import diagrams
+import ingest
+import llm
+import main
+import pipeline
+import replay
+import scheduler
+import scoring
+import validators
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+TRANSCRIPTS = "Meeting transcript *.docx"
+STAND_IN, CASSETTE, RECORD = "stand-in", "cassette", "record"
+
+DEFAULT_CONFIGS = [
+    {"name": "baseline"},
+    {"name": "mini-tables", "stages": {stage: {"model": "gpt-4o-mini"} for stage in ("parse_table", "table", "repair", "permission_tile")}},
+    {"name": "mini-all", "stages": {stage: {"model": "gpt-4o-mini"} for stage in llm.STAGES}},
+    {"name": "cold", "stages": {stage: {"temperature": 0.0} for stage in llm.STAGES}},
+    {"name": "short-answers", "stages": {stage: {"max_tokens": 600} for stage in llm.STAGES}},
+    {"name": "wide", "slots": 16, "spec_workers": 8, "test_case_workers": 16, "permission_tile_size": 30},
+]
+
+# Stand-in latency per model: seconds to the first token, per output token and per prompt token.
+# Rough public throughput figures, only meant to keep the models in proportion.
+MODEL_SPEEDS = {
+    "gpt-4o": (0.35, 0.012, 0.00002),
+    "gpt-4o-mini": (0.25, 0.006, 0.00001),
+    "gpt-4-turbo-preview": (0.6, 0.03, 0.00004),
+}
+DEFAULT_SPEED = (0.5, 0.02, 0.00003)
+SPEC_FIELDS = ["Objective", "Actor(s)", "Trigger", "Pre-condition", "User-Workflow", "Post-condition", "Acceptance Criteria"]
+
+
+# --- local stand-in model --------------------------------------------------------------
+
+def _terms(text, limit=12):
+    """Distinct capitalized terms of a prompt, as names for the stand-in's objects."""
+    seen = []
+    for term in re.findall(r"\b[A-Z][a-z]{3,}(?: [A-Z][a-z]{3,})?\b", text):
+        if term not in seen:
+            seen.append(term)
+    return seen[:limit] or ["Record", "Report", "User"]
+
+
+def _table(header, rows):
+    return validators.Table(header, rows).render()
+
+
+def _graph(lanes, steps):
+    nodes = [{"id": f"n{index}", "label": step, "lane": lanes[index % len(lanes)], "kind": kind}
+             for index, (step, kind) in enumerate(steps)]
+    edges = [{"source": f"n{index}", "target": f"n{index + 1}", "guard": ""} for index in range(len(nodes) - 1)]
+    return "```json\n" + json.dumps({"lanes": lanes, "nodes": nodes, "edges": edges}) + "\n```"
+
+
+def stand_in_answer(messages):
+    """The stand-in's answer to a request, in the format the requesting stage expects."""
+    system, user = messages[0]["content"], messages[-1]["content"]
+    terms = _terms(user)
+    if "Title, Steps, Expected Result" in system:
+        return _table(["Title", "Steps", "Expected Result"], [
+            [f"{term} accepted", f"1. Open {term}<br>2. Submit valid data", f"{term} is saved"] for term in terms[:3]
+        ])
+    if "specifications table" in system:
+        return _table(["Row", "Value"], [[name, f"{name} of {' '.join(terms[:2])}"] for name in SPEC_FIELDS])
+    if "exactly the columns:" in system and "Use Cases:\n" in user:
+        columns = [column.strip() for column in re.search(r"exactly the columns: (.*?)\.\n", system + "\n").group(1).split("|")]
+        labels = [label for label in user.split("Use Cases:\n", 1)[1].splitlines() if label.strip()]
+        return _table(columns, [[label] + ["O" if (row + column) % 2 else "X" for column in range(len(columns) - 1)] for row, label in enumerate(labels)])
+    if "You repair rows" in system or "Return a markdown table with the columns:" in system:
+        columns = re.search(r"columns: (.*?)[.\n]", system).group(1).split(" | ")
+        return _table([column.strip() for column in columns], [])
+    if "Parse the table" in system:
+        table = validators.parse_table(user)
+        return json.dumps({"use_cases": table.records() if table is not None else []})
+    if "use case table" in system:
+        actors = validators.object_names(user.split("Actor Objects:", 1)[-1]) or terms[:2]
+        return _table(validators.USE_CASE_COLUMNS, [
+            [f"UC_{index:02d}", f"Manage {term}", f"{actors[index % len(actors)]} creates, reviews and updates {term}."]
+            for index, term in enumerate(terms, 1)
+        ])
+    if "three columns" in system:
+        return _table(validators.OBJECT_COLUMNS, [[str(index), term, f"The {term} of the system."] for index, term in enumerate(terms, 1)])
+    if "user workflow" in system:
+        actors = validators.object_names(user.split("Actor Objects:", 1)[-1]) or terms[:2]
+        steps = [("Start", "start")] + [(f"Handle {term}", "action") for term in terms[:6]] + [("Done", "end")]
+        prose = "\n".join(f"{index}. {actors[index % len(actors)]}: {step}" for index, (step, _) in enumerate(steps, 1))
+        return f"{prose}\n\n{_graph(actors, steps)}"
+    if "state transition" in system:
+        steps = [("Draft", "start"), ("Submitted", "action"), ("Approved", "action"), ("Closed", "end")]
+        return "\n".join(f"- {step}" for step, _ in steps) + "\n\n" + _graph(terms[:2], steps)
+    components = "\n\n".join(f"## {term}\nObjective: Manage {term}.\nRequirements:\n- Record {term}\n- Report on {term}" for term in terms)
+    return f"# Requirements Plan\n\n{components}"
+
+
+def _stand_in_send(**request):
+    messages = request["messages"]
+    if messages[-1]["content"] == llm.CONTINUE_PROMPT:
+        written = messages[-2]["content"]
+        answer = stand_in_answer(messages[:-2])[len(written):]
+    else:
+        answer = stand_in_answer(messages)
+    limit = request["max_tokens"] * 4
+    finish_reason = "length" if len(answer) > limit else "stop"
+    answer = answer[:limit]
+    prompt_tokens = sum(len(message["content"]) for message in messages) // 4
+    completion_tokens = len(answer) // 4
+    first, per_output, per_prompt = MODEL_SPEEDS.get(request["model"], DEFAULT_SPEED)
+    time.sleep((first + per_output * completion_tokens + per_prompt * prompt_tokens) * float(os.environ.get("AGENT_SIMON_BENCHMARK_TIME_SCALE", 1.0)))
+    choices = [{"content": answer, "finish_reason": finish_reason} for _ in range(request.get("n") or 1)]
+    return {"choices": choices, "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens * len(choices)}}
+
+
+# --- configurations --------------------------------------------------------------------
+
+@contextmanager
+def configured(config, backend, cassettes=None, speed=1.0):
+    """Apply a configuration to ``llm`` and ``main`` for the duration of the block, with fresh telemetry."""
+    saved = (copy.deepcopy(llm.STAGES), llm.queue, llm.cache, llm.cassette, llm._send,
+             main.SPEC_WORKERS, main.TEST_CASE_WORKERS, main.PERMISSION_TILE_SIZE)
+    try:
+        for stage, overrides in config.get("stages", {}).items():
+            llm.STAGES[stage].update(overrides)
+        llm.queue = scheduler.Scheduler(slots=config.get("slots", 8))
+        llm.cache = None  # every configuration sends its own requests
+        llm.cassette = None
+        if backend == STAND_IN:
+            llm._send = _stand_in_send
+        else:
+            path = os.path.join(cassettes, f"{config['name']}.jsonl")
+            llm.cassette = replay.Cassette(path, mode=replay.RECORD if backend == RECORD else replay.REPLAY, speed=speed)
+        main.SPEC_WORKERS = config.get("spec_workers", main.SPEC_WORKERS)
+        main.TEST_CASE_WORKERS = config.get("test_case_workers", main.TEST_CASE_WORKERS)
+        main.PERMISSION_TILE_SIZE = config.get("permission_tile_size", main.PERMISSION_TILE_SIZE)
+        llm._output_tokens.clear()
+        llm.telemetry.clear()
+        yield
+    finally:
+        stages, llm.queue, llm.cache, llm.cassette, llm._send, main.SPEC_WORKERS, main.TEST_CASE_WORKERS, main.PERMISSION_TILE_SIZE = saved
+        llm.STAGES.clear()
+        llm.STAGES.update(stages)
+
+
+# --- quality proxy ---------------------------------------------------------------------
+
+def quality(outputs):
+    """Quality proxy of one pipeline run between 0 and 1: the mean of local checks on its artifacts."""
+    actor_objects = outputs.get('actor_objects') or ""
+    checks = {
+        name: float(not validators.validate_object_table(outputs.get(name) or "")[1])
+        for name in ("data_objects", "actor_objects", "external_systems")
+    }
+    use_case_table = outputs.get('use_case_table') or ""
+    use_case_score = scoring.score_use_case_table(use_case_table, actor_objects, outputs.get('data_objects') or "")
+    checks["use_case_table"] = (use_case_score["validity"] + use_case_score["actor_coverage"]) / 2
+    graph = outputs.get('workflow_graph')
+    workflow = diagrams.join_graph(outputs.get('workflow') or "", diagrams.Graph(**graph) if graph else None)
+    workflow_score = scoring.score_workflow(workflow, actor_objects)
+    checks["workflow"] = (workflow_score["validity"] + workflow_score["actor_coverage"]) / 2
+    checks["permission_matrix"] = float(not validators.validate_permission_matrix(outputs.get('permission_matrix') or "", actor_objects, use_case_table)[1])
+    use_cases = artifacts.use_cases_from_markdown(use_case_table)
+    specs = outputs.get('use_case_specs') or {}
+    complete = [
+        sum(bool(spec.get(name)) for name in SPEC_FIELDS) / len(SPEC_FIELDS)
+        for spec in (artifacts.spec_from_markdown(uc_id, result.get('value')) for uc_id, result in specs.items())
+    ]
+    checks["use_case_specs"] = sum(complete) / len(use_cases) if use_cases else 0.0
+    tested = {row["UC_ID"] for row in outputs.get('test_cases') or []}
+    checks["test_cases"] = len(tested) / len(use_cases) if use_cases else 0.0
+    return sum(checks.values()) / len(checks), checks
+
+
+# --- runs and report -------------------------------------------------------------------
+
+def run_config(config, transcripts, backend, cassettes=None, speed=1.0):
+    """Run the pipeline on every transcript with one configuration and summarize it."""
+    runs = []
+    with configured(config, backend, cassettes, speed):
+        for name, text in transcripts:
+            start = time.perf_counter()
+            try:
+                with scheduler.context(priority=scheduler.BATCH, session="benchmark"):
+                    result = pipeline.run_pipeline(text)
+            except Exception as e:
+                runs.append({"transcript": name, "error": f"{type(e).__name__}: {e}", "seconds": time.perf_counter() - start, "quality": 0.0, "checks": {}})
+                continue
+            score, checks = quality(result["artifacts"])
+            runs.append({"transcript": name, "seconds": time.perf_counter() - start, "quality": score, "checks": checks, "timings": result["timings"]})
+        records = list(llm.telemetry)
+    count = max(1, len(runs))
+    return {
+        "name": config["name"],
+        "config": config,
+        "seconds": sum(run["seconds"] for run in runs) / count,
+        "tokens": sum(record["prompt_tokens"] + record["completion_tokens"] for record in records) / count,
+        "completion_tokens": sum(record["completion_tokens"] for record in records) / count,
+        "calls": len(records) / count,
+        "truncated": sum(record["finish_reason"] == "length" for record in records),
+        "quality": sum(run["quality"] for run in runs) / count,
+        "errors": sum("error" in run for run in runs),
+        "runs": runs,
+    }
+
+
+def dominates(a, b):
+    """True if ``a`` is at least as fast, as cheap and as good as ``b``, and better in one of them."""
+    at_least = a["seconds"] <= b["seconds"] and a["tokens"] <= b["tokens"] and a["quality"] >= b["quality"]
+    better = a["seconds"] < b["seconds"] or a["tokens"] < b["tokens"] or a["quality"] > b["quality"]
+    return at_least and better
+
+
+def pareto_rank(results):
+    """Set ``front`` on every result: 1 for the non-dominated ones, 2 for those dominated only by front 1, and so on."""
+    remaining, front = list(results), 1
+    while remaining:
+        current = [result for result in remaining if not any(dominates(other, result) for other in remaining)]
+        for result in current:
+            result["front"] = front
+        remaining = [result for result in remaining if result not in current]
+        front += 1
+    return sorted(results, key=lambda result: (result["front"], result["seconds"]))
+
+
+def load_transcripts(paths):
+    return [(os.path.basename(path), ingest.read_transcript(path)) for path in paths]
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("transcripts", nargs="*", help=f"transcripts to run (default: {TRANSCRIPTS})")
+    parser.add_argument("--configs", help="JSON file with a list of configurations (default: a built-in sweep)")
+    parser.add_argument("--backend", choices=[STAND_IN, CASSETTE, RECORD], default=STAND_IN)
+    parser.add_argument("--cassettes", default="cassettes", help="directory of <configuration>.jsonl cassettes")
+    parser.add_argument("--speed", type=float, default=1.0, help="cassette replay latency scale: 1 = as recorded, 0 = no delay")
+    parser.add_argument("--time-scale", type=float, default=0.05, help="stand-in latency scale, to keep the sweep short")
+    parser.add_argument("--out", help="write the full report to this JSON file")
+    return parser.parse_args(argv)
+
+
+def run(argv=None):
+    args = parse_args(argv)
+    os.environ["AGENT_SIMON_BENCHMARK_TIME_SCALE"] = str(args.time_scale)
+    configs = DEFAULT_CONFIGS
+    if args.configs:
+        with open(args.configs) as file:
+            configs = json.load(file)
+    if args.backend == RECORD:
+        os.makedirs(args.cassettes, exist_ok=True)
+    transcripts = load_transcripts(args.transcripts or sorted(glob.glob(os.path.join(HERE, TRANSCRIPTS))))
+    results = pareto_rank([run_config(config, transcripts, args.backend, args.cassettes, args.speed) for config in configs])
+    print(f"{'front':>5s} {'configuration':20s} {'seconds':>8s} {'tokens':>8s} {'calls':>6s} {'truncated':>9s} {'quality':>7s} {'errors':>6s}")
+    for result in results:
+        print(f"{result['front']:5d} {result['name']:20s} {result['seconds']:8.2f} {result['tokens']:8.0f} {result['calls']:6.1f} "
+              f"{result['truncated']:9d} {result['quality']:7.3f} {result['errors']:6d}")
+    if args.backend == STAND_IN:
+        print("\nStand-in answers do not differ in substance between models; quality reflects structure and truncation only.")
+    if args.out:
+        with open(args.out, "w") as file:
+            json.dump(results, file, indent=2, default=str)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(run())
@@ -0,0 +1,177 @@
+"""Prompt-size budgeting before a request is sent.
+
+Prompts are counted locally, with tiktoken when it is installed and can load
+its encoding (exact), and about four characters per token otherwise. A prompt must fit both the
+model's context window (minus the tokens reserved for the answer) and the
+per-call budget of its stage. ``fit`` picks how a long input is sent:
+
+- send: as it is;
+- compress: with timestamps, filler words and repeated whitespace removed;
+- retrieve: only the passages most relevant to a query, in their original order;
+- chunk: split into pieces that are processed one by one (e.g. folded like meetings).
+
+The chosen strategy is passed to ``llm.complete`` and recorded in its
+telemetry. ``check`` runs on every request and refuses one over its budget.
+"""
+import math
+import os
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+
+import transcripts
+
+SEND, COMPRESS, RETRIEVE, CHUNK = "send", "compress", "retrieve", "chunk"
+
+CONTEXT_WINDOWS = {"gpt-4o": 128000, "gpt-4o-mini": 128000, "gpt-4-turbo-preview": 128000}
+DEFAULT_CONTEXT_WINDOW = 8192
+# Prompt tokens allowed per call, so one huge input cannot take a whole context window of cost
+DEFAULT_PROMPT_BUDGET = int(os.environ.get("AGENT_SIMON_PROMPT_BUDGET", 24000))
+PROMPT_BUDGETS = {}  # stage -> tokens, overrides the default
+CHARS_PER_TOKEN = 4  # estimate when tiktoken is not installed
+MESSAGE_OVERHEAD = 3  # tokens around every chat message
+REPLY_OVERHEAD = 3  # tokens priming the reply
+
+_FILLERS = re.compile(r"\b(?:um+|uh+|erm|hmm+|you know|i mean|sort of|kind of)\b,?\s*", re.I)
+_TIMESTAMP = re.compile(r"^\[?\d{1,2}:\d{2}(?::\d{2})?(?:[.,]\d+)?\]?\s*", re.M)
+
+
+class PromptTooLarge(ValueError):
+    """The prompt does not fit the model's context window, even with the answer cut short, or its stage's per-call budget."""
+
+
+@lru_cache(maxsize=None)
+def _encoding(model):
+    """The tiktoken encoding of ``model``, or None to estimate. Cached, so a failed load is not retried on every count."""
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        return None  # e.g. offline, so the encoding file cannot be downloaded
+
+
+def count_tokens(text, model):
+    """Tokens of ``text`` for ``model``: exact with tiktoken, estimated without it."""
+    encoding = _encoding(model)
+    if encoding is None:
+        return math.ceil(len(text) / CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def message_tokens(messages, model):
+    """Prompt tokens of a list of chat messages."""
+    return sum(MESSAGE_OVERHEAD + count_tokens(message["content"], model) for message in messages) + REPLY_OVERHEAD
+
+
+def limit(stage, model, max_tokens):
+    """Prompt tokens a call of ``stage`` may use when ``max_tokens`` are reserved for the answer."""
+    window = CONTEXT_WINDOWS.get(model, DEFAULT_CONTEXT_WINDOW)
+    return min(PROMPT_BUDGETS.get(stage, DEFAULT_PROMPT_BUDGET), window - max_tokens)
+
+
+def check(messages, model, max_tokens, stage=None):
+    """Prompt tokens of ``messages``; raises PromptTooLarge if they exceed the per-call budget of ``stage`` or cannot fit the context window at all.
+
+    Returns ``(prompt_tokens, max_tokens)``, with ``max_tokens`` lowered if
+    the answer would not fit otherwise. Inputs that may be long should be
+    ``fit`` first, so they are compressed, retrieved or chunked instead.
+    """
+    prompt_tokens = message_tokens(messages, model)
+    if stage is not None and prompt_tokens > PROMPT_BUDGETS.get(stage, DEFAULT_PROMPT_BUDGET):
+        raise PromptTooLarge(f"The {stage} prompt of {prompt_tokens} tokens is over its budget of {PROMPT_BUDGETS.get(stage, DEFAULT_PROMPT_BUDGET)} tokens")
+    room = CONTEXT_WINDOWS.get(model, DEFAULT_CONTEXT_WINDOW) - prompt_tokens
+    if room < min(max_tokens, 256):
+        raise PromptTooLarge(f"Prompt of {prompt_tokens} tokens does not fit the context window of {model}")
+    return prompt_tokens, min(max_tokens, room)
+
+
+def compress(text):
+    """``text`` without timestamps, filler words, repeated lines and repeated whitespace."""
+    text = _FILLERS.sub("", _TIMESTAMP.sub("", text))
+    lines, previous = [], None
+    for line in text.splitlines():
+        line = re.sub(r"[ \t]+", " ", line).strip()
+        if line and line != previous:
+            lines.append(line)
+        previous = line
+    return "\n".join(lines)
+
+
+def passages(text):
+    """Paragraphs of ``text``, or its lines if it has no blank lines."""
+    parts = [part.strip() for part in re.split(r"\n\s*\n", text) if part.strip()]
+    return parts if len(parts) > 1 else [line for line in text.splitlines() if line.strip()]
+
+
+def retrieve(text, query, tokens, model):
+    """The passages of ``text`` most relevant to ``query`` that fit in ``tokens``, in their original order."""
+    parts = passages(text)
+    index = transcripts.TranscriptIndex([transcripts.Utterance(position, None, part) for position, part in enumerate(parts)])
+    ranked = [utterance.index for _, utterance in index.search(query, k=len(parts))]
+    relevant = set(ranked)
+    ranked += [position for position in range(len(parts)) if position not in relevant]  # then fill up in order
+    chosen, used = set(), 0
+    for position in ranked:
+        size = count_tokens(parts[position], model) + 1
+        if used + size <= tokens:
+            chosen.add(position)
+            used += size
+    return "\n\n".join(part for position, part in enumerate(parts) if position in chosen)
+
+
+def chunk(text, tokens, model):
+    """``text`` split at line boundaries into pieces of at most ``tokens`` (a longer single line is cut)."""
+    pieces, lines, used = [], [], 0
+    for line in text.splitlines():
+        size = count_tokens(line, model) + 1
+        while size > tokens:  # a single line longer than a chunk
+            cut = max(1, len(line) * tokens // size)
+            pieces.append(line[:cut])
+            line = line[cut:]
+            size = count_tokens(line, model) + 1
+        if used + size > tokens and lines:
+            pieces.append("\n".join(lines))
+            lines, used = [], 0
+        lines.append(line)
+        used += size
+    if lines:
+        pieces.append("\n".join(lines))
+    return pieces
+
+
+@dataclass
+class Decision:
+    strategy: str
+    text: str = None  # the input to send, for send, compress and retrieve
+    chunks: list = field(default_factory=list)  # the pieces, for chunk
+    prompt_tokens: int = 0  # of the input before fitting
+    limit: int = 0
+
+
+def fit(stage, model, messages, text, max_tokens, query=None):
+    """Decide how to send ``text`` as part of ``messages`` (which hold the rest of the prompt) within budget.
+
+    With a ``query`` the relevant passages are retrieved; without one the
+    text is chunked when compression is not enough.
+    """
+    room = limit(stage, model, max_tokens) - message_tokens(messages, model)
+    tokens = count_tokens(text, model)
+    decision = Decision(SEND, text, prompt_tokens=tokens, limit=room)
+    if tokens <= room:
+        return decision
+    if room <= 0:
+        raise PromptTooLarge(f"The {stage} prompt leaves no room for its input within {limit(stage, model, max_tokens)} tokens")
+    compressed = compress(text)
+    if count_tokens(compressed, model) <= room:
+        decision.strategy, decision.text = COMPRESS, compressed
+    elif query is not None:
+        decision.strategy, decision.text = RETRIEVE, retrieve(compressed, query, room, model)
+    else:
+        decision.strategy, decision.text, decision.chunks = CHUNK, None, chunk(compressed, room, model)
+    return decision
@@ -0,0 +1,171 @@
+"""Workflow and state transition diagrams.
+
+The workflow and state transition generators append a JSON graph (lanes,
+nodes, edges with guards) to their prose. This module splits it off and
+renders it locally: Mermaid text, Graphviz DOT, and SVG/PNG through the
+Graphviz ``dot`` binary. Rendered images are cached by graph hash, so
+Streamlit reruns do not re-render unchanged diagrams.
+"""
+import hashlib
+import json
+import re
+import shutil
+import subprocess
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+GRAPH_INSTRUCTION = """\n
+    After the description, add a single ```json code block describing the same flow as a graph:
+    {"lanes": ["<%s>", ...],
+     "nodes": [{"id": "n1", "label": "<short step or state name>", "lane": "<one of the lanes>", "kind": "start|action|decision|end"}, ...],
+     "edges": [{"source": "n1", "target": "n2", "guard": "<condition, or empty>"}, ...]}
+    """
+WORKFLOW_GRAPH_INSTRUCTION = GRAPH_INSTRUCTION % "actor"
+STATE_GRAPH_INSTRUCTION = GRAPH_INSTRUCTION % "data object"
+
+RENDER_CACHE_SIZE = 64
+RENDER_TIMEOUT = 30
+
+_JSON_BLOCK = re.compile(r"```json\s*(\{.*?\})\s*```", re.S)
+_render_cache = OrderedDict()
+_render_lock = threading.Lock()
+
+
+@dataclass
+class Graph:
+    lanes: list = field(default_factory=list)
+    nodes: list = field(default_factory=list)
+    edges: list = field(default_factory=list)
+
+    def digest(self):
+        """Hash of the graph content, used as the render cache key."""
+        content = json.dumps([self.lanes, self.nodes, self.edges], sort_keys=True)
+        return hashlib.sha256(content.encode()).hexdigest()
+
+
+def split_graph(text):
+    """Split generator output into its prose and the Graph in its JSON block (None if missing or invalid)."""
+    match = _JSON_BLOCK.search(text or "")
+    if match is None:
+        return text, None
+    prose = (text[:match.start()] + text[match.end():]).strip()
+    try:
+        data = json.loads(match.group(1))
+    except json.JSONDecodeError:
+        return prose, None
+    nodes = [node for node in data.get("nodes", []) if isinstance(node, dict) and node.get("id")]
+    ids = {str(node["id"]) for node in nodes}
+    edges = [
+        edge for edge in data.get("edges", [])
+        if isinstance(edge, dict) and str(edge.get("source")) in ids and str(edge.get("target")) in ids
+    ]
+    lanes = list(data.get("lanes", []))
+    for node in nodes:
+        if node.get("lane") and node["lane"] not in lanes:
+            lanes.append(node["lane"])
+    return prose, Graph(lanes, nodes, edges)
+
+
+def join_graph(prose, graph):
+    """Inverse of ``split_graph``: the prose followed by the graph as a JSON block."""
+    if graph is None:
+        return prose
+    data = {"lanes": graph.lanes, "nodes": graph.nodes, "edges": graph.edges}
+    return f"{prose}\n\n```json\n{json.dumps(data, indent=1)}\n```"
+
+
+def _node_id(value):
+    return "n_" + re.sub(r"\W", "_", str(value))
+
+
+def _label(value, quote='"'):
+    return str(value).replace(quote, "'").replace("\n", " ")
+
+
+def _mermaid_node(node):
+    node_id, label = _node_id(node["id"]), _label(node.get("label", node["id"]))
+    kind = node.get("kind")
+    if kind == "decision":
+        return f'{node_id}{{"{label}"}}'
+    if kind in ("start", "end"):
+        return f'{node_id}(["{label}"])'
+    return f'{node_id}["{label}"]'
+
+
+def to_mermaid(graph, state_diagram=False):
+    """Render a graph as Mermaid text: a swimlane flowchart, or a stateDiagram-v2 for state transitions."""
+    if state_diagram:
+        lines = ["stateDiagram-v2"]
+        for node in graph.nodes:
+            lines.append(f'    state "{_label(node.get("label", node["id"]))}" as {_node_id(node["id"])}')
+            if node.get("kind") == "start":
+                lines.append(f"    [*] --> {_node_id(node['id'])}")
+            elif node.get("kind") == "end":
+                lines.append(f"    {_node_id(node['id'])} --> [*]")
+        for edge in graph.edges:
+            guard = f" : {_label(edge['guard'])}" if edge.get("guard") else ""
+            lines.append(f"    {_node_id(edge['source'])} --> {_node_id(edge['target'])}{guard}")
+        return "\n".join(lines)
+
+    lines = ["flowchart TD"]
+    for index, lane in enumerate(graph.lanes):
+        lines.append(f'    subgraph lane_{index}["{_label(lane)}"]')
+        lines += [f"        {_mermaid_node(node)}" for node in graph.nodes if node.get("lane") == lane]
+        lines.append("    end")
+    lines += [f"    {_mermaid_node(node)}" for node in graph.nodes if node.get("lane") not in graph.lanes]
+    for edge in graph.edges:
+        guard = f'|"{_label(edge["guard"])}"|' if edge.get("guard") else ""
+        lines.append(f"    {_node_id(edge['source'])} -->{guard} {_node_id(edge['target'])}")
+    return "\n".join(lines)
+
+
+def _dot_node(node):
+    shape = {"decision": "diamond", "start": "oval", "end": "doublecircle"}.get(node.get("kind"), "box")
+    return f'{_node_id(node["id"])} [label="{_label(node.get("label", node["id"]))}", shape={shape}];'
+
+
+def to_dot(graph):
+    """Render a graph as Graphviz DOT, with one cluster per lane."""
+    lines = ["digraph G {", "    rankdir=TB;", '    node [style=rounded, fontname="Helvetica"];']
+    for index, lane in enumerate(graph.lanes):
+        lines.append(f"    subgraph cluster_{index} {{")
+        lines.append(f'        label="{_label(lane)}";')
+        lines += [f"        {_dot_node(node)}" for node in graph.nodes if node.get("lane") == lane]
+        lines.append("    }")
+    lines += [f"    {_dot_node(node)}" for node in graph.nodes if node.get("lane") not in graph.lanes]
+    for edge in graph.edges:
+        guard = f' [label="{_label(edge["guard"])}"]' if edge.get("guard") else ""
+        lines.append(f"    {_node_id(edge['source'])} -> {_node_id(edge['target'])}{guard};")
+    lines.append("}")
+    return "\n".join(lines)
+
+
+def graphviz_available():
+    return shutil.which("dot") is not None
+
+
+def render(graph, fmt="svg"):
+    """Render a graph to SVG or PNG bytes with the local Graphviz binary.
+
+    Results are cached by graph hash. Returns None if Graphviz is not installed
+    or fails on the graph.
+    """
+    key = (graph.digest(), fmt)
+    with _render_lock:
+        if key in _render_cache:
+            _render_cache.move_to_end(key)
+            return _render_cache[key]
+    if not graphviz_available():
+        return None
+    try:
+        result = subprocess.run(
+            ["dot", f"-T{fmt}"], input=to_dot(graph).encode(), capture_output=True, timeout=RENDER_TIMEOUT, check=True
+        )
+    except (subprocess.SubprocessError, OSError):
+        return None
+    with _render_lock:
+        _render_cache[key] = result.stdout
+        while len(_render_cache) > RENDER_CACHE_SIZE:
+            _render_cache.popitem(last=False)
+    return result.stdout
@@ -0,0 +1,115 @@
+"""Background fan-out of one generator over many items, with per-item checkpoints.
+
+A ``FanOutRun`` calls a function for each item on a thread pool and records
+every result (or failure) as soon as it finishes. It can be cancelled, and
+started again to process only the items that are missing or failed, so an
+interrupted run never loses finished work.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import llm
+
+DONE, FAILED, CANCELLED = "done", "failed", "cancelled"
+
+
+class FanOutRun:
+    """Run ``fn(item)`` for every item. ``key(item)`` identifies an item in the checkpoints."""
+
+    def __init__(self, fn, items, key=lambda item: item, workers=4):
+        self.fn = fn
+        self.items = list(items)
+        self.key = key
+        self.workers = workers
+        self.results = {}  # key -> {"status", "value", "error", "seconds"}
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+        self._executor = None
+        self._futures = []
+
+    def start(self):
+        """Process every item that is not done yet. Does nothing if the run is already running."""
+        if self.running():
+            return
+        self._cancel.clear()
+        pending = [item for item in self.items if self.status(item) != DONE]
+        self._executor = ThreadPoolExecutor(max_workers=self.workers)
+        self._futures = [self._executor.submit(self._run_one, item) for item in pending]
+        self._executor.shutdown(wait=False)
+
+    def _run_one(self, item):
+        if self._cancel.is_set():
+            self._checkpoint(item, {"status": CANCELLED})
+            return
+        start = time.perf_counter()
+        try:
+            with llm.cancel_on(self._cancel):
+                value = self.fn(item)
+        except llm.Cancelled:
+            self._checkpoint(item, {"status": CANCELLED})
+        except Exception as e:
+            self._checkpoint(item, {"status": FAILED, "error": str(e), "seconds": time.perf_counter() - start})
+        else:
+            if self._cancel.is_set():
+                # Finished after the cancel: possibly for inputs that changed since, so not kept
+                self._checkpoint(item, {"status": CANCELLED})
+            else:
+                self._checkpoint(item, {"status": DONE, "value": value, "seconds": time.perf_counter() - start})
+
+    def _checkpoint(self, item, result):
+        with self._lock:
+            self.results[self.key(item)] = result
+
+    def cancel(self):
+        """Stop the run. Queued items are dropped, streaming requests are closed, and nothing finished after this is kept."""
+        self._cancel.set()
+        for future in self._futures:
+            future.cancel()
+
+    def update(self, items, stale=()):
+        """Replace the items, e.g. after their inputs changed.
+
+        Checkpoints of items that are gone or whose key is in ``stale`` are
+        dropped, so the next ``start`` runs only those items again.
+        """
+        self.cancel()
+        self.wait()
+        self.items = list(items)
+        keys = {self.key(item) for item in self.items} - set(stale)
+        with self._lock:
+            self.results = {key: result for key, result in self.results.items() if key in keys}
+
+    def running(self):
+        return any(not future.done() for future in self._futures)
+
+    def wait(self, timeout=None):
+        """Block until the run finishes or ``timeout`` seconds pass. Returns True if it finished."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.running():
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def status(self, item):
+        with self._lock:
+            return self.results.get(self.key(item), {}).get("status")
+
+    def result(self, item):
+        with self._lock:
+            return self.results.get(self.key(item))
+
+    def done(self):
+        """Items that finished, in item order."""
+        return [item for item in self.items if self.status(item) == DONE]
+
+    def failed(self):
+        return [item for item in self.items if self.status(item) == FAILED]
+
+    def missing(self):
+        """Items that still need to run: never started, cancelled or failed."""
+        return [item for item in self.items if self.status(item) != DONE]
+
+    def values(self):
+        """Results of the finished items, in item order."""
+        return [self.result(item)["value"] for item in self.done()]
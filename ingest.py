@@ -0,0 +1,181 @@
+"""Streaming transcript ingestion for every format meeting tools export.
+
+``read_utterances`` detects the format of an uploaded file from its first
+bytes (not its name) and parses it into ``transcripts.Utterance`` objects one
+at a time, so memory stays flat however long the meeting was:
+
+    docx  Word / Teams export; document.xml is streamed out of the zip with iterparse
+    vtt   WebVTT (Teams); "<v Speaker>" voice tags become speakers
+    srt   SubRip subtitles
+    txt   UTF-8 plain text, "Speaker: text" lines
+    pdf   page by page, needs the optional pypdf package
+
+Further formats plug in with ``register``.
+"""
+import codecs
+import io
+import re
+import zipfile
+from xml.etree.ElementTree import iterparse
+
+import transcripts
+
+SNIFF_BYTES = 1024
+
+_WORD = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_CUE_TIMING = re.compile(r"^(?P<start>(?:\d+:)?\d{2}:\d{2}[.,]\d{3})\s*-->\s*(?:\d+:)?\d{2}:\d{2}[.,]\d{3}")
+_VOICE = re.compile(r"<v(?:\.[^ >]*)?\s+(?P<speaker>[^>]+)>")
+_TAG = re.compile(r"</?[^>]+>")
+_SRT_START = re.compile(r"\d+\s*\n(?:\d+:)?\d{2}:\d{2},\d{3}\s*-->")
+
+# name -> (sniff(head bytes) -> bool, parse(binary stream, source) -> iterator of Utterance), in detection order
+PARSERS = {}
+
+
+class UnsupportedFormat(ValueError):
+    """Raised when a file's format cannot be read."""
+
+
+def register(name, sniff):
+    """Decorator adding a parser for a format. ``sniff`` gets the first bytes of the file."""
+    def decorator(parse):
+        PARSERS[name] = (sniff, parse)
+        return parse
+    return decorator
+
+
+def _text_lines(stream):
+    """Decoded lines of a binary stream, read lazily."""
+    return io.TextIOWrapper(stream, encoding="utf-8-sig", errors="replace", newline=None)
+
+
+def _head_text(head):
+    return head.decode("utf-8-sig", errors="replace").lstrip()
+
+
+def _is_text(head):
+    """Whether the first bytes of a file look like UTF-8 text (no NUL bytes, no invalid sequences)."""
+    if b"\0" in head:
+        return False
+    try:
+        # Incremental, so a character cut off at the end of the head is not an error
+        codecs.getincrementaldecoder("utf-8")().decode(head, final=False)
+    except UnicodeDecodeError:
+        return False
+    return True
+
+
+@register("docx", lambda head: head.startswith(b"PK\x03\x04"))
+def parse_docx(stream, source=None):
+    with zipfile.ZipFile(stream) as archive:
+        if "word/document.xml" not in archive.namelist():
+            raise UnsupportedFormat("Zip file is not a Word document.")
+        with archive.open("word/document.xml") as document:
+            yield from transcripts.utterances_from_lines(_docx_paragraphs(document), source)
+
+
+def _docx_paragraphs(document):
+    parents = []
+    for event, element in iterparse(document, events=("start", "end")):
+        if event == "start":
+            parents.append(element)
+            continue
+        parents.pop()
+        if element.tag == _WORD + "p":
+            yield "".join(node.text or "" for node in element.iter(_WORD + "t"))
+            if parents:
+                parents[-1].remove(element)  # drop the parsed paragraph to keep memory flat
+
+
+@register("pdf", lambda head: head.startswith(b"%PDF"))
+def parse_pdf(stream, source=None):
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise UnsupportedFormat("Reading PDF transcripts needs the pypdf package (pip install pypdf).")
+    pages = (page.extract_text() or "" for page in PdfReader(stream).pages)
+    yield from transcripts.utterances_from_lines((line for page in pages for line in page.splitlines()), source)
+
+
+@register("vtt", lambda head: _head_text(head).startswith("WEBVTT"))
+def parse_vtt(stream, source=None):
+    yield from _merge_cues(_vtt_cues(_text_lines(stream)), source)
+
+
+@register("srt", lambda head: _SRT_START.match(_head_text(head).replace("\r\n", "\n")) is not None)
+def parse_srt(stream, source=None):
+    yield from _merge_cues(_vtt_cues(_text_lines(stream)), source)
+
+
+@register("txt", _is_text)
+def parse_txt(stream, source=None):
+    yield from transcripts.utterances_from_lines(_text_lines(stream), source)
+
+
+def _vtt_cues(lines):
+    """(timestamp, speaker, text) of each cue in WebVTT or SubRip lines."""
+    start, text = None, []
+    for line in lines:
+        line = line.strip()
+        match = _CUE_TIMING.match(line)
+        if match:
+            start, text = match.group("start").replace(",", "."), []
+        elif not line:
+            if start is not None and text:
+                yield _cue(start, text)
+            start, text = None, []
+        elif start is not None:
+            text.append(line)
+    if start is not None and text:
+        yield _cue(start, text)
+
+
+def _cue(start, lines):
+    text = " ".join(lines)
+    match = _VOICE.search(text)
+    speaker = match.group("speaker").strip() if match else None
+    text = _TAG.sub("", text).strip()
+    if speaker is None:
+        speaker, text = transcripts.split_speaker(text) or ("", text)
+    return start, speaker, text
+
+
+def _merge_cues(cues, source):
+    """Join consecutive cues of the same speaker into one utterance."""
+    current = None
+    index = 0
+    for timestamp, speaker, text in cues:
+        if current is not None and speaker == current.speaker:
+            current.text += " " + text
+            continue
+        if current is not None:
+            yield current
+            index += 1
+        current = transcripts.Utterance(index, speaker, text, timestamp, source)
+    if current is not None:
+        yield current
+
+
+def detect_format(stream):
+    """Name of the format of a seekable binary stream, from its first bytes."""
+    position = stream.tell()
+    head = stream.read(SNIFF_BYTES)
+    stream.seek(position)
+    for name, (sniff, _) in PARSERS.items():
+        if sniff(head):
+            return name
+    raise UnsupportedFormat("Unknown transcript format.")
+
+
+def read_utterances(stream, source=None):
+    """Parse a seekable binary stream (uploaded file, open file) into utterances, lazily."""
+    _, parse = PARSERS[detect_format(stream)]
+    return parse(stream, source)
+
+
+def read_transcript(path_or_stream, source=None):
+    """Whole transcript text of a file path or binary stream, in ``transcripts.to_text`` form."""
+    if isinstance(path_or_stream, str) or hasattr(path_or_stream, "__fspath__"):
+        with open(path_or_stream, "rb") as file:
+            return transcripts.to_text(read_utterances(file, source))
+    return transcripts.to_text(read_utterances(path_or_stream, source))
@@ -0,0 +1,98 @@
+"""Throughput and memory of each transcript parser in ``ingest``.
+
+Every format is benchmarked on a synthetic meeting of ``--utterances``
+utterances, and any files given on the command line are benchmarked as well:
+
+    python ingest_benchmark.py --utterances 20000
+    python ingest_benchmark.py "Meeting transcript 02 - Sausage QCS.docx" meeting.vtt
+"""
+import argparse
+import io
+import os
+import sys
+import time
+import tracemalloc
+import ingest
+
+SPEAKERS = ["Business Analyst - Jane (Side A)", "Quality Lead - Charlie (Side B)", "Account Manager - Mike (Side A)"]
+SENTENCE = "We need the system to track every raw material lot from the supplier through grinding, blending and packing."
+
+
+def _timestamp(seconds, separator="."):
+    return f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}{separator}000"
+
+
+def synthetic(fmt, count):
+    """Bytes of a synthetic transcript with ``count`` utterances in format ``fmt``."""
+    turns = [(SPEAKERS[index % len(SPEAKERS)], f"{SENTENCE} Point {index}.") for index in range(count)]
+    if fmt == "txt":
+        return "\n".join(f"{speaker}: {text}" for speaker, text in turns).encode()
+    if fmt == "vtt":
+        cues = [f"{_timestamp(i * 5)} --> {_timestamp(i * 5 + 4)}\n<v {speaker}>{text}</v>\n" for i, (speaker, text) in enumerate(turns)]
+        return ("WEBVTT\n\n" + "\n".join(cues)).encode()
+    if fmt == "srt":
+        cues = [f"{i + 1}\n{_timestamp(i * 5, ',')} --> {_timestamp(i * 5 + 4, ',')}\n{speaker}: {text}\n" for i, (speaker, text) in enumerate(turns)]
+        return "\n".join(cues).encode()
+    if fmt == "docx":
+        from docx import Document
+        document = Document()
+        for speaker, text in turns:
+            document.add_paragraph(f"{speaker}: {text}")
+        buffer = io.BytesIO()
+        document.save(buffer)
+        return buffer.getvalue()
+    raise ValueError(f"No synthetic {fmt} transcript")
+
+
+def measure(data, repeat=3):
+    """Best-of-``repeat`` parse time, utterance count and peak traced memory for one transcript."""
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = sum(1 for _ in ingest.read_utterances(io.BytesIO(data)))
+        seconds.append(time.perf_counter() - start)
+    tracemalloc.start()
+    for _ in ingest.read_utterances(io.BytesIO(data)):
+        pass
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    best = min(seconds)
+    return {
+        "format": ingest.detect_format(io.BytesIO(data)),
+        "bytes": len(data),
+        "utterances": count,
+        "seconds": best,
+        "mb_per_second": len(data) / 1e6 / best if best else float("inf"),
+        "utterances_per_second": count / best if best else float("inf"),
+        "peak_bytes": peak,
+    }
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="*", help="transcript files to benchmark as well")
+    parser.add_argument("--utterances", type=int, default=5000, help="size of the synthetic transcripts")
+    parser.add_argument("--repeat", type=int, default=3)
+    return parser.parse_args(argv)
+
+
+def run(argv=None):
+    args = parse_args(argv)
+    inputs = [(f"synthetic .{fmt}", synthetic(fmt, args.utterances)) for fmt in ("txt", "vtt", "srt", "docx")]
+    for path in args.files:
+        with open(path, "rb") as file:
+            inputs.append((os.path.basename(path), file.read()))
+    print(f"{'input':40s} {'format':6s} {'MB':>7s} {'utterances':>10s} {'MB/s':>8s} {'utt/s':>10s} {'peak MB':>8s}")
+    for name, data in inputs:
+        try:
+            result = measure(data, args.repeat)
+        except ingest.UnsupportedFormat as e:
+            print(f"{name[:40]:40s} skipped: {e}")
+            continue
+        print(f"{name[:40]:40s} {result['format']:6s} {result['bytes'] / 1e6:7.2f} {result['utterances']:10d} "
+              f"{result['mb_per_second']:8.1f} {result['utterances_per_second']:10.0f} {result['peak_bytes'] / 1e6:8.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(run())
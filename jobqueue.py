@@ -0,0 +1,139 @@
+"""Work queue on a SQLite file, shared by the UI process and worker processes.
+
+The UI enqueues a job (a kind and JSON arguments) and waits for it; workers
+(``worker.py``) claim jobs, run them and put the result in the shared
+``artifact_store.DiskStore`` under the job's ``result_key``. A claim is a
+lease: if a worker dies, its job is handed to another worker once the lease
+runs out, up to MAX_ATTEMPTS times.
+"""
+import json
+import sqlite3
+import time
+import uuid
+from contextlib import closing
+
+import artifact_store
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+LEASE_SECONDS = 600
+MAX_ATTEMPTS = 3
+POLL_SECONDS = 0.1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    args TEXT NOT NULL,
+    result_key TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    error TEXT,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    lease_until REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, priority, created);
+"""
+
+
+def result_key(kind, args):
+    """Store key of a job's result: jobs with the same kind and arguments share it."""
+    return "job:" + artifact_store.content_key(kind, json.dumps(args, sort_keys=True))
+
+
+class JobQueue:
+    def __init__(self, path):
+        self.path = path
+        with self._connect() as connection:
+            connection.executescript(SCHEMA)
+
+    def _connect(self):
+        # One connection per call keeps the queue safe to use from any thread or process
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return closing(connection)
+
+    def enqueue(self, kind, args, priority=0):
+        """Add a job and return its id. Lower ``priority`` values run first."""
+        job_id = uuid.uuid4().hex
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT INTO jobs (id, kind, args, result_key, priority, status, created) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, json.dumps(args), result_key(kind, args), priority, QUEUED, time.time()),
+            )
+        return job_id
+
+    def claim(self, worker):
+        """Lease the next job to ``worker`` and return it, or None if there is nothing to do."""
+        now = time.time()
+        with self._connect() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                connection.execute(
+                    "UPDATE jobs SET status = ?, error = 'Gave up after the worker was lost', finished = ? "
+                    "WHERE status = ? AND lease_until < ? AND attempts >= ?",
+                    (FAILED, now, RUNNING, now, MAX_ATTEMPTS),
+                )
+                row = connection.execute(
+                    "SELECT * FROM jobs WHERE status = ? OR (status = ? AND lease_until < ?) ORDER BY priority, created LIMIT 1",
+                    (QUEUED, RUNNING, now),
+                ).fetchone()
+                if row is not None:
+                    connection.execute(
+                        "UPDATE jobs SET status = ?, worker = ?, attempts = attempts + 1, started = ?, lease_until = ? WHERE id = ?",
+                        (RUNNING, worker, now, now + LEASE_SECONDS, row["id"]),
+                    )
+                    row = connection.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone()  # as leased
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+        return _job(row) if row is not None else None
+
+    def finish(self, job_id):
+        with self._connect() as connection:
+            connection.execute("UPDATE jobs SET status = ?, finished = ? WHERE id = ?", (DONE, time.time(), job_id))
+
+    def fail(self, job_id, error):
+        with self._connect() as connection:
+            connection.execute("UPDATE jobs SET status = ?, error = ?, finished = ? WHERE id = ?", (FAILED, error, time.time(), job_id))
+
+    def get(self, job_id):
+        with self._connect() as connection:
+            row = connection.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _job(row) if row is not None else None
+
+    def wait(self, job_id, timeout=None):
+        """Block until the job is done or failed and return it, or None after ``timeout`` seconds."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            if job is None or job["status"] in (DONE, FAILED):
+                return job
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            time.sleep(POLL_SECONDS)
+
+    def stats(self):
+        """Jobs per status and the mean wait and run time of finished jobs, for display."""
+        with self._connect() as connection:
+            counts = dict(connection.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+            waited, ran = connection.execute(
+                "SELECT AVG(started - created), AVG(finished - started) FROM jobs WHERE status = ?", (DONE,)
+            ).fetchone()
+        return {
+            **{status: counts.get(status, 0) for status in (QUEUED, RUNNING, DONE, FAILED)},
+            "mean_wait": waited or 0.0,
+            "mean_run": ran or 0.0,
+        }
+
+
+def _job(row):
+    job = dict(row)
+    job["args"] = json.loads(job["args"])
+    return job
@@ -0,0 +1,340 @@
+"""Client layer for every chat completion the app makes.
+
+Generators call ``complete`` with a stage name instead of talking to OpenAI
+directly. The stage decides the model and temperature, ``max_tokens`` is sized
+from the output lengths previously seen for that stage, and a completion that
+is cut off at the length limit is continued and stitched together. Requests
+wait for a slot in ``queue`` by the priority class of their stage. Every call
+is recorded in ``telemetry``, with the prompt size counted before sending
+and the ``budget`` strategy the caller used to fit it. Requests made under
+``cancel_on(event)`` stop streaming and raise Cancelled once the event is set.
+"""
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+import budget
+import progress
+import replay
+import scheduler
+
+# Model settings per pipeline stage. ``max_tokens`` is the ceiling for a single request.
+STAGES = {
+    "parse_table": {"model": "gpt-4-turbo-preview", "temperature": 0.5, "max_tokens": 2000},
+    "plan": {"model": "gpt-4o", "temperature": 0.5, "max_tokens": 2500},
+    "meeting_summary": {"model": "gpt-4o", "temperature": 0.5, "max_tokens": 1500},
+    "plan_merge": {"model": "gpt-4o", "temperature": 0.5, "max_tokens": 2500},
+    "table": {"model": "gpt-4o", "temperature": 0.5, "max_tokens": 2000},
+    "workflow": {"model": "gpt-4o", "temperature": 0.5, "max_tokens": 2000},
+    "state_transitions": {"model": "gpt-4o", "temperature": 0.5, "max_tokens": 2000},
+    "use_case_table": {"model": "gpt-4o", "temperature": 0.5, "max_tokens": 2000},
+    "permission_matrix": {"model": "gpt-4o", "temperature": 0.5, "max_tokens": 2000},
+    "permission_tile": {"model": "gpt-4o", "temperature": 0.5, "max_tokens": 2000},
+    "repair": {"model": "gpt-4o", "temperature": 0.5, "max_tokens": 1000},
+    "patch": {"model": "gpt-4o", "temperature": 0.5, "max_tokens": 2000},
+    "use_case_specs": {"model": "gpt-4o", "temperature": 0.5, "max_tokens": 2000},
+    "test_cases": {"model": "gpt-4o", "temperature": 0.5, "max_tokens": 2000},
+}
+
+MIN_MAX_TOKENS = 256
+MIN_HISTORY = 5  # calls seen before max_tokens is sized from history
+HISTORY_SIZE = 50
+HEADROOM = 1.25  # reserve this much above the 95th percentile of past outputs
+MAX_CONTINUATIONS = 3
+CONTINUE_PROMPT = "Continue exactly where you stopped. Do not repeat anything you have already written."
+
+# Set to an artifact_store.ArtifactStore to share completions across sessions
+cache = None
+# Set to a replay.Cassette to record requests or serve them back without network
+cassette = replay.from_env()
+# Called on the first request for the API key unless OPENAI_API_KEY is set
+resolve_api_key = None
+# Requests in flight at once, shared by every session of the process
+queue = scheduler.Scheduler(slots=int(os.environ.get("AGENT_SIMON_LLM_SLOTS", 8)))
+
+_lock = threading.Lock()
+_local = threading.local()  # the cancel event of the current thread's requests
+_output_tokens = defaultdict(lambda: deque(maxlen=HISTORY_SIZE))
+telemetry = deque(maxlen=1000)
+
+
+class Cancelled(Exception):
+    """Raised by a request whose ``cancel_on`` event was set before or while it streamed."""
+
+
+@contextmanager
+def cancel_on(event):
+    """Cancel the requests made in the block once ``event`` (a threading.Event) is set."""
+    previous = getattr(_local, "cancel", None)
+    _local.cancel = event
+    try:
+        yield
+    finally:
+        _local.cancel = previous
+
+
+def _cancelled():
+    event = getattr(_local, "cancel", None)
+    return event is not None and event.is_set()
+
+
+def max_tokens_for(stage):
+    """Size ``max_tokens`` for a stage from the output lengths of its previous calls."""
+    ceiling = STAGES[stage]["max_tokens"]
+    with _lock:
+        history = sorted(_output_tokens[stage])
+    if len(history) < MIN_HISTORY:
+        return ceiling
+    p95 = history[math.ceil(0.95 * (len(history) - 1))]
+    return max(MIN_MAX_TOKENS, min(ceiling, math.ceil(p95 * HEADROOM)))
+
+
+def _create(**request):
+    """Send one request (or replay it from the cassette) and return the response as plain dicts."""
+    if _cancelled():
+        raise Cancelled()
+    text = None
+    if cassette is not None and cassette.mode == replay.REPLAY:
+        response = cassette.replay(request)
+        streamed, text = 0, response["choices"][0]["content"]  # reported at once, as if streamed
+    else:
+        start = time.perf_counter()
+        response = _send(**request)
+        streamed = response.pop("streamed", 0)
+        if cassette is not None:
+            cassette.record(request, response, time.perf_counter() - start)
+    # Tokens that were not already reported while streaming
+    progress.add_tokens(response["usage"]["completion_tokens"] - streamed, text)
+    return response
+
+
+def _openai():
+    """The openai module, imported on the first request so that startup does not pay for it."""
+    import openai
+    if not openai.api_key and not os.environ.get("OPENAI_API_KEY") and resolve_api_key is not None:
+        openai.api_key = resolve_api_key()
+    return openai
+
+
+def _send(**request):
+    """Stream one request, reporting tokens to ``progress`` as they arrive."""
+    stream = _openai().chat.completions.create(stream=True, stream_options={"include_usage": True}, **request)
+    contents, finish_reasons, usage, streamed = defaultdict(list), {}, None, 0
+    for chunk in stream:
+        if _cancelled():
+            stream.close()  # stop generating the rest of the answer
+            raise Cancelled()
+        if chunk.usage is not None:
+            usage = chunk.usage
+        for choice in chunk.choices:
+            if choice.delta.content:
+                contents[choice.index].append(choice.delta.content)
+                streamed += 1  # one content delta is about one token
+                progress.add_tokens(1, choice.delta.content if choice.index == 0 else None)  # the text of the first choice
+            if choice.finish_reason:
+                finish_reasons[choice.index] = choice.finish_reason
+    completion_tokens = usage.completion_tokens if usage else streamed
+    return {
+        "choices": [
+            {"content": "".join(contents[index]), "finish_reason": finish_reasons.get(index)}
+            for index in range(request.get("n") or 1)
+        ],
+        "usage": {
+            "prompt_tokens": usage.prompt_tokens if usage else 0,
+            "completion_tokens": completion_tokens,
+        },
+        "streamed": min(streamed, completion_tokens),
+    }
+
+
+def request_key(stage, messages, **options):
+    """Cache key for a request: everything that determines the answer except ``max_tokens``."""
+    config = STAGES[stage]
+    content = json.dumps([config["model"], config["temperature"], messages, options], sort_keys=True, default=str)
+    return "llm:" + hashlib.sha256(content.encode()).hexdigest()
+
+
+def _record_cache_hit(stage, strategy):
+    """Record a request answered from ``cache`` in ``telemetry``."""
+    with _lock:
+        telemetry.append({
+            "stage": stage, "model": STAGES[stage]["model"], "max_tokens": 0, "adaptive": False, "cached": True,
+            "continuations": 0, "reserved_tokens": 0, "prompt_tokens": 0, "completion_tokens": 0,
+            "finish_reason": "cached", "latency": 0.0, "priority": None, "queue_wait": 0.0,
+            "prompt_estimate": 0, "strategy": strategy,
+        })
+
+
+def complete(stage, messages, max_tokens=None, strategy=budget.SEND, refresh=False, **options):
+    """Run a chat completion for ``stage`` and return its text.
+
+    ``max_tokens`` overrides the adaptive size; other keyword arguments (e.g.
+    ``response_format``) are passed through to the API. If ``cache`` is set,
+    an identical earlier request is answered from it, unless ``refresh`` is
+    set (a retry or a regenerate): then a new answer is requested and
+    replaces the cached one. A prompt over the stage's per-call budget or
+    too large for the model raises budget.PromptTooLarge without a request.
+    An answer cut off at the length limit is continued unless it is JSON
+    (``response_format`` of type ``json_object``) or the continuation would
+    not fit the context window; then it is returned as it is.
+    """
+    config = STAGES[stage]
+    key = None
+    if cache is not None:
+        key = request_key(stage, messages, **options)
+        text = None if refresh else cache.get(key)
+        if text is not None:
+            _record_cache_hit(stage, strategy)
+            return text
+    adaptive = max_tokens is None
+    if adaptive:
+        max_tokens = max_tokens_for(stage)
+    prompt_estimate, max_tokens = budget.check(messages, config["model"], max_tokens, stage)
+    record = {
+        "stage": stage,
+        "model": config["model"],
+        "max_tokens": max_tokens,
+        "adaptive": adaptive,
+        "cached": False,
+        "continuations": 0,
+        "reserved_tokens": 0,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "priority": scheduler.CLASS_NAMES[scheduler.priority_for(stage)],
+        "prompt_estimate": prompt_estimate,
+        "strategy": strategy,
+    }
+    text = ""
+    request_messages = list(messages)
+    # Two halves of a JSON answer do not make a valid document, so JSON mode is not continued
+    continued = (options.get("response_format") or {}).get("type") != "json_object"
+    with queue.slot(scheduler.priority_for(stage), scheduler.current()[1]) as wait:
+        start = time.perf_counter()
+        while True:
+            response = _create(
+                model=config["model"],
+                temperature=config["temperature"],
+                messages=request_messages,
+                max_tokens=max_tokens,
+                **options,
+            )
+            choice = response["choices"][0]
+            text += choice["content"]
+            record["reserved_tokens"] += max_tokens
+            record["prompt_tokens"] += response["usage"]["prompt_tokens"]
+            record["completion_tokens"] += response["usage"]["completion_tokens"]
+            record["finish_reason"] = choice["finish_reason"]
+            if choice["finish_reason"] != "length" or record["continuations"] == MAX_CONTINUATIONS or not continued:
+                break
+            # Cut off at the length limit: ask for the rest with the full stage budget
+            request_messages = list(messages) + [
+                {"role": "assistant", "content": text},
+                {"role": "user", "content": CONTINUE_PROMPT},
+            ]
+            try:
+                # The answer so far is part of the prompt now, so only the context window is checked
+                max_tokens = budget.check(request_messages, config["model"], config["max_tokens"])[1]
+            except budget.PromptTooLarge:
+                break
+            record["continuations"] += 1
+        record["latency"] = time.perf_counter() - start
+    record["queue_wait"] = wait
+    with _lock:
+        _output_tokens[stage].append(record["completion_tokens"])
+        telemetry.append(record)
+    if key is not None:
+        if refresh:
+            cache.discard(key)  # the store keeps the first value written under a key
+        cache.cache(key, text)
+    return text
+
+
+def complete_candidates(stage, messages, n, max_tokens=None, refresh=False, **options):
+    """Ask for ``n`` alternative completions in one request and return their texts.
+
+    Candidates cut off at the length limit are returned as they are, not
+    continued; the caller's scoring is expected to rank them down. ``refresh``
+    skips the cache as for ``complete``.
+    """
+    config = STAGES[stage]
+    key = None
+    if cache is not None:
+        key = request_key(stage, messages, n=n, **options)
+        texts = None if refresh else cache.get(key)
+        if texts is not None:
+            _record_cache_hit(stage, budget.SEND)
+            return texts
+    adaptive = max_tokens is None
+    if adaptive:
+        max_tokens = max_tokens_for(stage)
+    prompt_estimate, max_tokens = budget.check(messages, config["model"], max_tokens, stage)
+    with queue.slot(scheduler.priority_for(stage), scheduler.current()[1]) as wait:
+        start = time.perf_counter()
+        response = _create(
+            model=config["model"],
+            temperature=config["temperature"],
+            messages=list(messages),
+            max_tokens=max_tokens,
+            n=n,
+            **options,
+        )
+        latency = time.perf_counter() - start
+    texts = [choice["content"] for choice in response["choices"]]
+    completion_tokens = response["usage"]["completion_tokens"]
+    with _lock:
+        _output_tokens[stage].append(completion_tokens // max(1, len(texts)))
+        telemetry.append({
+            "stage": stage,
+            "model": config["model"],
+            "max_tokens": max_tokens,
+            "adaptive": adaptive,
+            "cached": False,
+            "continuations": 0,
+            "reserved_tokens": max_tokens * n,
+            "prompt_tokens": response["usage"]["prompt_tokens"],
+            "completion_tokens": completion_tokens,
+            "finish_reason": "length" if any(choice["finish_reason"] == "length" for choice in response["choices"]) else "stop",
+            "latency": latency,
+            "priority": scheduler.CLASS_NAMES[scheduler.priority_for(stage)],
+            "queue_wait": wait,
+            "prompt_estimate": prompt_estimate,
+            "strategy": budget.SEND,
+            "candidates": len(texts),
+        })
+    if key is not None:
+        if refresh:
+            cache.discard(key)
+        cache.cache(key, texts)
+    return texts
+
+
+def fit(stage, messages, text, query=None):
+    """``budget.fit`` for ``text`` in a ``stage`` prompt whose other messages are ``messages``."""
+    return budget.fit(stage, STAGES[stage]["model"], messages, text, max_tokens_for(stage), query)
+
+
+def telemetry_summary():
+    """Per-stage totals of the recorded calls, for display."""
+    with _lock:
+        records = list(telemetry)
+    summary = {}
+    for record in records:
+        stage = summary.setdefault(record["stage"], {
+            "calls": 0, "cache_hits": 0, "reserved_tokens": 0, "completion_tokens": 0, "continuations": 0, "truncated": 0, "latency": 0.0, "queue_wait": 0.0,
+            "prompt_estimate": 0, "fitted": 0,
+        })
+        stage["calls"] += 1
+        stage["cache_hits"] += record["cached"]
+        stage["reserved_tokens"] += record["reserved_tokens"]
+        stage["completion_tokens"] += record["completion_tokens"]
+        stage["continuations"] += record["continuations"]
+        stage["truncated"] += record["finish_reason"] == "length"
+        stage["latency"] += record["latency"]
+        stage["queue_wait"] += record["queue_wait"]
+        stage["prompt_estimate"] += record["prompt_estimate"]
+        stage["fitted"] += record["strategy"] != budget.SEND
+    return summary
@@ -1,299 +1,1288 @@
 import streamlit as st
-from docx import Document
 from io import BytesIO
-import openai
+import copy
 import json
+import hashlib
+import math
+import os
+import re
+import time
+import artifact_store
+import artifacts
+import budget
+import llm
+from concurrent.futures import ThreadPoolExecutor
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+import diagrams
+import fanout
+import ingest
+import jobqueue
+import permissions
+import plan_diff
+import prefetch
+import profiling
+import progress
+import scheduler
+import scoring
+import test_cases
+import transcripts
+import validators
 
-# Connect to OpenAI key
-openai.api_key = st.secrets["OPENAI_API_KEY"]
+def connect_openai():
+    """Use the OpenAI key from Streamlit secrets unless one is set in the environment.
 
-def read_docx(file):
-    """Read and parse a docx file, returning the text content."""
-    doc = Document(file)
-    full_text = []
-    for para in doc.paragraphs:
-        full_text.append(para.text)
-    return '\n'.join(full_text)
+    The secrets are read on the first request, not at startup.
+    """
+    llm.resolve_api_key = lambda: st.secrets["OPENAI_API_KEY"]
+
+LOGO_PATH = "bavista_logo.png"
+
+@st.cache_resource
+def logo():
+    """Logo image bytes, read from disk once per process."""
+    with open(LOGO_PATH, "rb") as file:
+        return file.read()
+
+def profiling_enabled():
+    """Profiling is on with AGENT_SIMON_PROFILE=1 or the hidden ?profile=1 query parameter."""
+    return profiling.ENABLED or st.query_params.get("profile") == "1"
+
+@st.cache_resource
+def shared_store():
+    """One artifact store per server process, shared by all sessions."""
+    return artifact_store.ArtifactStore(max_bytes=int(os.environ.get("AGENT_SIMON_STORE_MB", 256)) * 1024 * 1024)
+
+def save_artifact(name, value):
+    """Put an artifact in the shared store; session state keeps only the reference."""
+    st.session_state[name] = shared_store().put(value)
+
+def load_model():
+    """This session's typed artifact model (empty before any table is saved)."""
+    return load_artifact('model') or artifacts.Model()
+
+def update_model(**parts):
+    """Replace parts of this session's typed artifact model."""
+    save_artifact('model', load_model().update(**parts))
+
+def load_artifact(name):
+    """Return an artifact of this session, or None if it has not been generated."""
+    ref = st.session_state.get(name)
+    if not isinstance(ref, artifact_store.ArtifactRef):
+        return ref  # set directly, not through save_artifact
+    return shared_store().get(ref)
+
+@st.cache_resource
+def job_queue():
+    """Work queue of the worker processes (worker.py) if AGENT_SIMON_QUEUE is set, otherwise None."""
+    path = os.environ.get("AGENT_SIMON_QUEUE")
+    return jobqueue.JobQueue(path) if path else None
+
+@st.cache_resource
+def disk_store():
+    """Artifact store on disk that this process shares with the worker processes."""
+    return artifact_store.DiskStore(os.environ.get("AGENT_SIMON_DISK_STORE", "artifacts"), max_bytes=int(os.environ.get("AGENT_SIMON_DISK_STORE_MB", 1024)) * 1024 * 1024)
+
+def show_memory_usage():
+    """Gauge of this session's and the whole process's artifact memory."""
+    stats = shared_store().stats()
+    session_bytes = sum(value.size for value in st.session_state.values() if isinstance(value, artifact_store.ArtifactRef))
+    with st.expander("Memory"):
+        st.progress(min(1.0, stats['stored_bytes'] / stats['max_bytes']), text=f"Shared store: {stats['stored_bytes'] / 1e6:.1f} of {stats['max_bytes'] / 1e6:.0f} MB")
+        st.write(f"This session: {session_bytes / 1e3:.1f} KB in {sum(isinstance(value, artifact_store.ArtifactRef) for value in st.session_state.values())} artifacts")
+        st.write(f"{stats['entries']} entries ({stats['pinned_entries']} in use), {stats['raw_bytes'] / 1e6:.1f} MB before compression, {stats['hits']} hits, {stats['evictions']} evictions")
+
+TRANSCRIPT_CACHE_ENTRIES = 16
+TRANSCRIPT_PAGE_LINES = 80
+TRANSCRIPT_TYPES = ['docx', 'vtt', 'srt', 'txt', 'pdf']
+
+@st.cache_data(max_entries=TRANSCRIPT_CACHE_ENTRIES, show_spinner=False)
+def load_transcript(digest, _bytes_data):
+    """Parse an uploaded transcript once per file content. ``digest`` is the cache key; the bytes are not hashed."""
+    if job_queue() is not None:
+        return run_job("transcript", {"content": disk_store().put(_bytes_data).key})
+    with profiling.profiled("ingest", profiling_enabled()):
+        return ingest.read_transcript(BytesIO(_bytes_data))
+
+@st.cache_resource(max_entries=TRANSCRIPT_CACHE_ENTRIES, show_spinner=False)
+def transcript_index(digests, _transcripts):
+    """Utterance index of the uploaded transcripts, built once per set of files. ``digests`` is the cache key."""
+    return transcripts.TranscriptIndex.from_transcripts(_transcripts)
 
 def parse_markdown_table(md_table):
-    """Generate a response from OpenAI in JSON format."""
+    """Generate a response from OpenAI in JSON format. Errors are raised, so a job records them."""
     instruction_message = "Parse the table in markdown table to Json format"
-    try:
-        openai_response = openai.chat.completions.create(
-            model="gpt-4-turbo-preview",
-            response_format={"type": "json_object"},
-            messages=[
-                {"role": "system", "content": instruction_message},
-                {"role": "user", "content": md_table}
-            ],
-            temperature=0.5,
-            max_tokens=2000,
-        )
-
-        data_dicts =  json.loads(openai_response.choices[0].message.content)
-        return data_dicts
-        
-    except Exception as e:
-        st.error(f"Error in generating JSON response from OpenAI: {e}")
-        return None
+    openai_response = llm.complete("parse_table", [
+        {"role": "system", "content": instruction_message},
+        {"role": "user", "content": md_table}
+    ], response_format={"type": "json_object"})
+    return json.loads(openai_response)
+
+PLAN_INSTRUCTION = "Generate a high-level software requirements document based on the transcript text. The plan describes the overview of the system functions or business processes. Besure to include Ojective and Requirements for each component. Keep the plan concise and relevant to software functions."
+TRANSCRIPT_PROMPT = "Below is the transcript from the meeting:\n {}"
+
+def generate_plan(transcript_text, refresh=False, raise_errors=False):
+    """Generate a requirement plan using OpenAI. ``refresh`` asks for a new plan instead of the cached one.
 
-def generate_plan(transcript_text):
-    """Generate a requirement plan using OpenAI."""
+    Errors are shown and None is returned, unless ``raise_errors``.
+    """
     try:
-        openai_response = openai.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": "Generate a high-level software requirements document based on the transcript text. The plan describes the overview of the system functions or business processes. Besure to include Ojective and Requirements for each component. Keep the plan concise and relevant to software functions."},
-                {"role": "user", "content": "Below is the transcript from the meeting:\n {}".format(transcript_text)}
-            ],
-            temperature=0.5,
-            max_tokens=2500
-        )
-        generated_text = openai_response.choices[0].message.content
+        messages = [{"role": "system", "content": PLAN_INSTRUCTION}, {"role": "user", "content": TRANSCRIPT_PROMPT.format("")}]
+        decision = llm.fit("plan", messages, transcript_text)
+        if decision.strategy == budget.CHUNK:
+            # Too long for one request: fold the parts like a series of meetings
+            parts = [(hashlib.sha256(part.encode()).hexdigest(), f"part {index + 1}", part) for index, part in enumerate(decision.chunks)]
+            return fold_meetings(parts, {}, strategy=budget.CHUNK)
+        generated_text = llm.complete("plan", [
+            {"role": "system", "content": PLAN_INSTRUCTION},
+            {"role": "user", "content": TRANSCRIPT_PROMPT.format(decision.text)}
+        ], strategy=decision.strategy, refresh=refresh)
         return generated_text
     except Exception as e:
+        if raise_errors:
+            raise
         st.error(f"An error occurred with the OpenAI API: {e}")
         return None
 
-def generate_table(plan, nl_instruction):
+MEETING_WORKERS = 4
+MEETING_SUMMARY_INSTRUCTION = "Summarize the meeting transcript for a business analyst. Keep every decision, requirement, actor, data object, external system and open question that concerns the software system; drop small talk."
+
+def generate_meeting_summary(transcript_text, strategy=budget.SEND):
+    """Summarize one meeting transcript so it can be merged into a plan spanning several meetings."""
+    messages = [{"role": "system", "content": MEETING_SUMMARY_INSTRUCTION}, {"role": "user", "content": TRANSCRIPT_PROMPT.format("")}]
+    decision = llm.fit("meeting_summary", messages, transcript_text)
+    if decision.strategy == budget.CHUNK:
+        # A meeting too long for one request is summarized part by part
+        return "\n\n".join(generate_meeting_summary(part, budget.CHUNK) for part in decision.chunks)
+    return llm.complete("meeting_summary", [
+        {"role": "system", "content": MEETING_SUMMARY_INSTRUCTION},
+        {"role": "user", "content": TRANSCRIPT_PROMPT.format(decision.text)}
+    ], strategy=decision.strategy if decision.strategy != budget.SEND else strategy)
+
+def fit_plan(stage, messages, plan, query):
+    """The messages built by ``messages(plan)``, with a plan over the per-call budget of ``stage``
+    compressed or cut to the parts most relevant to ``query``. Returns the messages and the strategy."""
+    decision = llm.fit(stage, messages(""), plan, query=query)
+    return messages(decision.text), decision.strategy
+
+MERGE_PLAN_INSTRUCTION = "You maintain a high-level software requirements document across a series of meetings. Update the plan with the new meeting summary: add new components, refine or correct existing ones when the meeting changes them, and keep everything else unchanged. Keep the Objective and Requirements for each component. Return the complete updated plan."
+
+def merge_plan(plan, meeting_summary):
+    """Fold the summary of one more meeting into an existing requirement plan. Errors are raised, so a job records them."""
+    messages, strategy = fit_plan("plan_merge", lambda text: [
+        {"role": "system", "content": MERGE_PLAN_INSTRUCTION},
+        {"role": "user", "content": f"Current Requirement Plan:\n{text}\nSummary of the next meeting:\n{meeting_summary}"}
+    ], plan, meeting_summary)
+    return llm.complete("plan_merge", messages, strategy=strategy)
+
+def read_meetings(files):
+    """Read uploaded transcripts concurrently. Returns (digest, name, text) tuples in upload order, skipping unreadable files."""
+    contents = [(hashlib.sha256(file.getvalue()).hexdigest(), file.name, file.getvalue()) for file in files]
+    ctx = get_script_run_ctx()
+    def read(content):
+        try:
+            return load_transcript(content[0], content[2])
+        except ingest.UnsupportedFormat as e:
+            return e
+    with ThreadPoolExecutor(max_workers=MEETING_WORKERS, initializer=lambda: add_script_run_ctx(ctx=ctx)) as pool:
+        texts = list(pool.map(read, contents))
+    meetings = []
+    for (digest, name, _), text in zip(contents, texts):
+        if isinstance(text, ingest.UnsupportedFormat):
+            st.error(f"Cannot read {name}: {text}")
+        else:
+            meetings.append((digest, name, text))
+    return meetings
+
+def fold_meetings(meetings, merge_state, strategy=budget.SEND):
+    """Build one plan from a series of meetings, reusing the work already done.
+
+    ``merge_state`` keeps the summary of every meeting seen so far, the meetings
+    already folded into the plan, and the plan itself. Only new meetings are
+    summarized (concurrently), and each new meeting costs one merge call. If a
+    folded meeting is removed, the plan is refolded from the cached summaries.
+    Errors are raised; ``merge_state`` keeps the meetings folded before one.
+    """
+    summaries = merge_state.setdefault('summaries', {})
+    new = [(digest, text) for digest, _, text in meetings if digest not in summaries]
+    with ThreadPoolExecutor(max_workers=MEETING_WORKERS) as pool:
+        for (digest, _), summary in zip(new, pool.map(progress.bind(scheduler.bind(lambda text: generate_meeting_summary(text, strategy))), [text for _, text in new])):
+            summaries[digest] = summary
+
+    digests = [digest for digest, _, _ in meetings]
+    folded = merge_state.get('folded', [])
+    plan = merge_state.get('plan')
+    if folded != digests[:len(folded)]:
+        folded, plan = [], None
+    for digest in digests[len(folded):]:
+        plan = generate_plan(summaries[digest], raise_errors=True) if plan is None else merge_plan(plan, summaries[digest])
+        folded = folded + [digest]
+        merge_state['folded'], merge_state['plan'] = folded, plan
+    return plan
+
+OBJECT_TABLE_INSTRUCTIONS = {
+    'data_objects': "List all data objects within the software system...",
+    'actor_objects': "List all actors that directly interact with the software...",
+    'external_systems': "List all external systems or services...",
+}
+
+def generate_table(plan, nl_instruction, refresh=False):
     """Generate tables based on the requirement plan."""
     instruction_message = f"""Generate a table with three columns: item #, object, description, based on the requirement plan. {nl_instruction}"""
-    openai_response = openai.chat.completions.create(
-        model="gpt-4o",
-        messages=[
-            {"role": "system", "content": instruction_message},
-            {"role": "user", "content": plan}
-        ],
-        temperature=0.5,
-        max_tokens=2000
-    )
-    descriptions = openai_response.choices[0].message.content
+    messages, strategy = fit_plan("table", lambda text: [
+        {"role": "system", "content": instruction_message},
+        {"role": "user", "content": text}
+    ], plan, nl_instruction)
+    descriptions = llm.complete("table", messages, strategy=strategy, refresh=refresh)
 
     return descriptions
 
-def generate_workflow(plan, actor_objects):
-    """Generate a user workflow based on the requirement plan and actor objects table."""
-    instruction_message = """Generate a detailed user workflow combining the requirements and actor interactions.\n
+WORKFLOW_INSTRUCTION = """Generate a detailed user workflow combining the requirements and actor interactions.\n
     This section shows the flow of tasks or steps taken by the main actor(s) - the user of the software system,  to complete a business process.\n
     The actor’s actions are shown in each business process stage of the system along with the conditions (if/else) under which it can move to the next stage or revert to the previous.\n
-    """
-    openai_response = openai.chat.completions.create(
-        model="gpt-4o",
-        messages=[
-            {"role": "system", "content": instruction_message},
-            {"role": "user", "content": f"Requirements Plan:\n{plan}\nActor Objects:\n{actor_objects}"}
-        ],
-        temperature=0.5,
-        max_tokens=2000
-    )
-    workflow = openai_response.choices[0].message.content
+    """ + diagrams.WORKFLOW_GRAPH_INSTRUCTION
+
+def workflow_messages(plan, actor_objects):
+    """The workflow prompt and the budget strategy its plan needed."""
+    return fit_plan("workflow", lambda text: [
+        {"role": "system", "content": WORKFLOW_INSTRUCTION},
+        {"role": "user", "content": f"Requirements Plan:\n{text}\nActor Objects:\n{actor_objects}"}
+    ], plan, actor_objects)
+
+def generate_workflow(plan, actor_objects, refresh=False):
+    """Generate a user workflow based on the requirement plan and actor objects table."""
+    messages, strategy = workflow_messages(plan, actor_objects)
+    workflow = llm.complete("workflow", messages, strategy=strategy, refresh=refresh)
     return workflow
 
-def generate_state_transitions(plan, data_objects):
+def generate_state_transitions(plan, data_objects, refresh=False):
     """Generate state transition steps based on the plan and Data Objects Table."""
-    instruction_message = "Generate state transition steps for the software based on the requirements plan and data objects."
-    openai_response = openai.chat.completions.create(
-        model="gpt-4o",
-        messages=[
-            {"role": "system", "content": instruction_message},
-            {"role": "user", "content": f"Requirements Plan:\n{plan}\nData Objects:\n{data_objects}"}
-        ],
-        temperature=0.5,
-        max_tokens=2000
-    )
-    state_transitions = openai_response.choices[0].message.content
+    instruction_message = "Generate state transition steps for the software based on the requirements plan and data objects." + diagrams.STATE_GRAPH_INSTRUCTION
+    messages, strategy = fit_plan("state_transitions", lambda text: [
+        {"role": "system", "content": instruction_message},
+        {"role": "user", "content": f"Requirements Plan:\n{text}\nData Objects:\n{data_objects}"}
+    ], plan, data_objects)
+    state_transitions = llm.complete("state_transitions", messages, strategy=strategy, refresh=refresh)
     return state_transitions
 
-def generate_use_case_table(plan, actor_objects):
+USE_CASE_TABLE_INSTRUCTION = "Generate a detailed use case table including columns: UC_ID, UC_Name (e.g User Login, View Error details), and Description to describe each actor's interactions with the system based on the requirements plan."
+
+def use_case_table_messages(plan, actor_objects):
+    """The use case table prompt and the budget strategy its plan needed."""
+    return fit_plan("use_case_table", lambda text: [
+        {"role": "system", "content": USE_CASE_TABLE_INSTRUCTION},
+        {"role": "user", "content": f"Requirements Plan:\n{text}\nActor Objects:\n{actor_objects}"}
+    ], plan, actor_objects)
+
+def generate_use_case_table(plan, actor_objects, refresh=False):
     """Generate a use case description table based on the plan and Actor Objects Table."""
-    instruction_message = "Generate a detailed use case table including columns: UC_ID, UC_Name (e.g User Login, View Error details), and Description to describe each actor's interactions with the system based on the requirements plan."
-    openai_response = openai.chat.completions.create(
-        model="gpt-4o",
-        messages=[
-            {"role": "system", "content": instruction_message},
-            {"role": "user", "content": f"Requirements Plan:\n{plan}\nActor Objects:\n{actor_objects}"}
-        ],
-        temperature=0.5,
-        max_tokens=2000
-    )
-    use_case_table = openai_response.choices[0].message.content
+    messages, strategy = use_case_table_messages(plan, actor_objects)
+    use_case_table = llm.complete("use_case_table", messages, strategy=strategy, refresh=refresh)
     return use_case_table
 
-def generate_permission_matrix(actor_objects, use_case_table):
-    """Generate a permission matrix table based on Actor Objects Table and Use Case Table."""
-    instruction_message = """Generate a permission matrix showing which actors have access to which use cases.\n
+MAX_CANDIDATES = 5
+
+def generate_workflow_candidates(plan, actor_objects, n, data_objects="", refresh=False):
+    """Generate ``n`` workflows in one request; returns ``[(workflow, graph, score parts)]``, best first."""
+    candidates = llm.complete_candidates("workflow", workflow_messages(plan, actor_objects)[0], n, refresh=refresh)
+    ranked = scoring.rank(candidates, scoring.score_workflow, actor_objects, data_objects)
+    return [diagrams.split_graph(text) + (parts,) for text, parts in ranked]
+
+def generate_use_case_table_candidates(plan, actor_objects, n, data_objects="", refresh=False):
+    """Generate ``n`` use case tables in one request; returns ``[(table, defects, score parts)]``, best first.
+
+    Only the best candidate is repaired; the others are repaired if the user picks one.
+    """
+    candidates = llm.complete_candidates("use_case_table", use_case_table_messages(plan, actor_objects)[0], n, refresh=refresh)
+    ranked = scoring.rank(candidates, scoring.score_use_case_table, actor_objects, data_objects)
+    best, parts = ranked[0]
+    return [repair_use_case_table(best, plan, actor_objects) + (parts,)] + [(text, None, parts) for text, parts in ranked[1:]]
+
+PERMISSION_INSTRUCTION = """Generate a permission matrix showing which actors have access to which use cases.\n
     Columns are Actor and row are UC name\n
     Cell values:
     “O” means that user has permission on corresponding function. For more information about what the actor can do on that function, please refer to corresponding use case.\n
     “O*” means that user has permission on corresponding function on the item they created. For more information about what the actor can do on that function, please refer to corresponding use case.\n
     “X” means that user does not have permission on corresponding function.
     """
-    openai_response = openai.chat.completions.create(
-        model="gpt-4o",
-        messages=[
-            {"role": "system", "content": instruction_message},
-            {"role": "user", "content": f"Actor Objects:\n{actor_objects}\nUse Case Table:\n{use_case_table}"}
-        ],
-        temperature=0.5,
-        max_tokens=2000
-    )
-    permission_matrix = openai_response.choices[0].message.content
+PERMISSION_TILE_SIZE = 15  # use cases per tile
+PERMISSION_TILE_WORKERS = 4
+
+def generate_permission_tile(actor_objects, actors, use_cases, refresh=False):
+    """Generate the permission matrix rows for one block of use cases."""
+    header = " | ".join(["Use Case"] + actors)
+    labels = "\n".join(permissions.use_case_label(use_case) for use_case in use_cases)
+    instruction_message = PERMISSION_INSTRUCTION + f"""\n
+    Return only a markdown table with exactly the columns: {header}.
+    Write one row for each of the listed use cases, using the listed text unchanged in the first column."""
+    return llm.complete("permission_tile", [
+        {"role": "system", "content": instruction_message},
+        {"role": "user", "content": f"Actor Objects:\n{actor_objects}\nUse Cases:\n{labels}"}
+    ], refresh=refresh)
+
+def generate_permission_grid(actor_objects, use_case_table, refresh=False):
+    """Generate the permission matrix tile by tile, concurrently, into a PermissionMatrix.
+
+    Returns None if the actors or use cases cannot be read from their tables.
+    """
+    actors = validators.object_names(actor_objects)
+    use_cases = validators.use_case_names(use_case_table)
+    if not actors or not use_cases:
+        return None
+    matrix = permissions.PermissionMatrix(actors, use_cases)
+    pending = use_cases
+    # A second round only re-requests the use cases whose rows came back incomplete, bypassing the cache
+    for attempt in range(2):
+        blocks = [pending[start:start + PERMISSION_TILE_SIZE] for start in range(0, len(pending), PERMISSION_TILE_SIZE)]
+        retry = refresh or attempt > 0
+        with ThreadPoolExecutor(max_workers=PERMISSION_TILE_WORKERS) as pool:
+            tiles = pool.map(progress.bind(scheduler.bind(lambda block: generate_permission_tile(actor_objects, actors, block, retry))), blocks)
+            for tile in tiles:
+                table = validators.parse_table(tile)
+                if table is not None:
+                    matrix.fill(table)
+        pending = matrix.incomplete_use_cases()
+        if not pending:
+            break
+    return matrix
+
+def generate_permission_matrix(actor_objects, use_case_table, refresh=False):
+    """Generate a permission matrix table based on Actor Objects Table and Use Case Table."""
+    matrix = generate_permission_grid(actor_objects, use_case_table, refresh)
+    if matrix is not None:
+        return matrix.to_markdown()
+    permission_matrix = llm.complete("permission_matrix", [
+        {"role": "system", "content": PERMISSION_INSTRUCTION},
+        {"role": "user", "content": f"Actor Objects:\n{actor_objects}\nUse Case Table:\n{use_case_table}"}
+    ], refresh=refresh)
     return permission_matrix
 
-def generate_use_case_specs(use_case, workflow):
-    """Generate detailed specifications for a use case, including workflow information."""
+MAX_REPAIR_ROUNDS = 2
+
+def repair_table(table, defects, instruction, context, refresh=False):
+    """Ask for corrected versions of only the broken or missing rows of a table. ``refresh`` bypasses the cache on a retry."""
+    broken = sorted({defect.row for defect in defects if defect.kind == "row"})
+    missing = [label for defect in defects if defect.kind == "missing_rows" for label in defect.missing]
+    problems = "\n".join(f"- {defect.message}" for defect in defects if defect.kind in ("row", "missing_rows"))
+    rows_to_fix = validators.Table(table.header, [table.rows[index] for index in broken]).render() if broken else "(none)"
+    instruction_message = f"""You repair rows of a markdown table with the columns: {' | '.join(table.header)}. {instruction}\n
+    Return only a markdown table with exactly these columns: first the corrected versions of the rows to fix, in the same order, then one new row for each missing entry. Do not return any other rows."""
+    response = llm.complete("repair", [
+        {"role": "system", "content": instruction_message},
+        {"role": "user", "content": f"Problems:\n{problems}\nRows to fix:\n{rows_to_fix}\nMissing entries:\n{', '.join(missing) or '(none)'}\nContext:\n{context}"}
+    ], refresh=refresh)
+    repaired = validators.parse_table(response)
+    if repaired is None:
+        return table
+    return validators.splice_rows(table, [row for row in repaired.rows if len(row) == len(table.header)], broken)
+
+def repair_missing_columns(table, columns, instruction, context, refresh=False):
+    """Ask for the values of the missing columns only, and merge them into the table."""
+    labels = "\n".join(row[0] for row in table.rows if row)
+    instruction_message = f"""Return a markdown table with the columns: {' | '.join([table.header[0]] + columns)}, with one row for each of the listed {table.header[0]} values. {instruction}"""
+    response = llm.complete("repair", [
+        {"role": "system", "content": instruction_message},
+        {"role": "user", "content": f"{table.header[0]} values:\n{labels}\nContext:\n{context}"}
+    ], refresh=refresh)
+    extra = validators.parse_table(response)
+    if extra is None:
+        return table
+    return validators.merge_columns(table, extra)
+
+def repair_object_table(object_table, plan, nl_instruction):
+    """Validate a data/actor/external system table and fix only the defective rows. Returns the table and any remaining defects."""
+    # A later round repeats a request whose cached answer did not fix the table, so it bypasses the cache
+    for attempt in range(MAX_REPAIR_ROUNDS):
+        table, defects = validators.validate_object_table(object_table)
+        if not defects:
+            break
+        if any(defect.kind == "structure" for defect in defects):
+            object_table = generate_table(plan, nl_instruction, refresh=True)  # the cached answer is the broken one
+            continue
+        object_table = repair_table(table, defects, nl_instruction, f"Requirements Plan:\n{plan}", attempt > 0).render()
+    return object_table, validators.validate_object_table(object_table)[1]
+
+def repair_use_case_table(use_case_table, plan, actor_objects):
+    """Validate a use case table and fix only the defective rows. Returns the table and any remaining defects."""
+    for attempt in range(MAX_REPAIR_ROUNDS):
+        table, defects = validators.validate_use_case_table(use_case_table)
+        if not defects:
+            break
+        if any(defect.kind == "structure" for defect in defects):
+            use_case_table = generate_use_case_table(plan, actor_objects, refresh=True)
+            continue
+        # Duplicate ids are fixed locally; only incomplete rows need the model
+        validators.renumber_duplicate_ids(table)
+        table, defects = validators.validate_use_case_table(table.render())
+        if defects:
+            table = repair_table(table, defects, "Each row describes one use case; UC_IDs must be unique.", f"Requirements Plan:\n{plan}\nActor Objects:\n{actor_objects}", attempt > 0)
+        use_case_table = table.render()
+    return use_case_table, validators.validate_use_case_table(use_case_table)[1]
+
+def repair_permission_matrix(permission_matrix, actor_objects, use_case_table):
+    """Validate a permission matrix and fix only the defective rows or missing actors. Returns the matrix and any remaining defects."""
+    instruction = "Cell values must be O, O* or X."
+    context = f"Actor Objects:\n{actor_objects}\nUse Case Table:\n{use_case_table}"
+    for attempt in range(MAX_REPAIR_ROUNDS):
+        table, defects = validators.validate_permission_matrix(permission_matrix, actor_objects, use_case_table)
+        if not defects:
+            break
+        if table is None:
+            permission_matrix = generate_permission_matrix(actor_objects, use_case_table, refresh=True)
+            continue
+        # A structure defect of a readable matrix is an unreadable actor or use case table, which is left to the caller
+        # Columns and rows of removed actors and use cases are dropped locally
+        stale = [defect for defect in defects if defect.kind in ("extra_columns", "extra_rows")]
+        if stale:
+            for defect in stale:
+                table = validators.drop_columns(table, defect.missing) if defect.kind == "extra_columns" else validators.patch_rows(table, [], defect.missing)
+            table, defects = validators.validate_permission_matrix(table.render(), actor_objects, use_case_table)
+        for defect in defects:
+            if defect.kind == "missing_columns":
+                table = repair_missing_columns(table, defect.missing, instruction, context, attempt > 0)
+        if any(defect.kind in ("row", "missing_rows") for defect in defects):
+            table = repair_table(table, defects, instruction, context, attempt > 0)
+        permission_matrix = table.render()
+    return permission_matrix, validators.validate_permission_matrix(permission_matrix, actor_objects, use_case_table)[1]
+
+PATCH_TABLE_INSTRUCTION = """You update a markdown table with the columns: {columns} after the requirements plan changed. {instruction}
+
+    Return a markdown table with exactly these columns holding only the rows to add and the rows to change (a changed row keeps its {key}). Do not return unchanged rows.
+    After the table, add one line "Remove: " followed by the {key} values of the rows that no longer apply, comma separated, or "Remove: none"."""
+
+def patch_table(previous, diff, key, instruction, context=""):
+    """Update a table for a plan change, asking only for the rows to add, change or remove.
+
+    Returns the patched table and the keys of the rows it touched, or None if
+    the previous table cannot be read and the artifact has to be regenerated.
+    """
+    table = validators.parse_table(previous or "")
+    if table is None or table.column(key) is None:
+        return None
+    key_column = table.column(key)
+    response = llm.complete("patch", [
+        {"role": "system", "content": PATCH_TABLE_INSTRUCTION.format(columns=' | '.join(table.header), instruction=instruction, key=table.header[key_column])},
+        {"role": "user", "content": f"Plan changes:\n{diff.to_markdown()}\nCurrent table:\n{table.render()}" + (f"\nContext:\n{context}" if context else "")}
+    ])
+    patch = validators.parse_table(response)
+    rows = [row for row in patch.rows if len(row) == len(table.header)] if patch is not None else []
+    match = re.search(r"^\W*Remove:\s*(.*)$", response, re.I | re.M)
+    removed = [value.strip() for value in match.group(1).split(",")] if match and match.group(1).strip().lower() != "none" else []
+    touched = {validators.normalize(row[key_column]) for row in rows} | {validators.normalize(value) for value in removed}
+    return validators.patch_rows(table, rows, removed, key_column).render(), touched
+
+def patch_text(previous, diff, instruction):
+    """Update a prose artifact for a plan change from the delta and the previous version."""
+    return llm.complete("patch", [
+        {"role": "system", "content": f"""You update a document after the requirements plan changed. {instruction}
+
+    Change only what the plan changes require and keep everything else as it is, in the same format, including the ```json graph block at the end."""},
+        {"role": "user", "content": f"Plan changes:\n{diff.to_markdown()}\nCurrent document:\n{previous}"}
+    ])
+
+PATCH_INSTRUCTIONS = {
+    'workflow': "The document is a user workflow of the actors.",
+    'state_transitions': "The document describes the state transitions of the data objects.",
+}
+
+def patch_artifacts(plan, new_plan, current):
+    """Patch the artifacts in ``current`` ({name: markdown}, workflow and state transitions
+    joined with their graph) with only the delta between two plans.
+
+    Returns the diff summary, the patched artifacts, their defects, and the
+    normalized keys of the use cases the change touched (None if all of them).
+    """
+    diff = plan_diff.diff_plans(plan, new_plan)
+    patched, defects, touched = {}, [], None
+    if not diff:
+        return diff.summary(), patched, defects, touched
+
+    for name, instruction in OBJECT_TABLE_INSTRUCTIONS.items():
+        if name in current:
+            table = patch_table(current[name], diff, "object", instruction)
+            table = table[0] if table else generate_table(new_plan, instruction)
+            patched[name], table_defects = repair_object_table(table, new_plan, instruction)
+            defects += table_defects
+
+    for name, instruction in PATCH_INSTRUCTIONS.items():
+        if name in current:
+            patched[name] = patch_text(current[name], diff, instruction)
+
+    if 'use_case_table' in current:
+        actor_objects = patched.get('actor_objects', current.get('actor_objects'))
+        table = patch_table(current['use_case_table'], diff, "UC_ID", "Each row describes one use case; UC_IDs must be unique.", f"Actor Objects:\n{actor_objects}")
+        use_case_table, touched = table if table else (generate_use_case_table(new_plan, actor_objects), None)
+        patched['use_case_table'], table_defects = repair_use_case_table(use_case_table, new_plan, actor_objects)
+        defects += table_defects
+        if 'permission_matrix' in current:
+            # Rows of new use cases are missing from the old matrix; the repair requests only those
+            patched['permission_matrix'], matrix_defects = repair_permission_matrix(current['permission_matrix'], actor_objects, patched['use_case_table'])
+            defects += matrix_defects
+    return diff.summary(), patched, defects, touched
+
+PLAN_EDIT_ARTIFACTS = ('data_objects', 'actor_objects', 'external_systems', 'use_case_table', 'permission_matrix')
+
+def apply_plan_edit(new_plan):
+    """Save an edited plan and the downstream artifacts, patched by a job with only the delta. Returns the diff summary."""
+    current = {name: load_artifact(name) for name in PLAN_EDIT_ARTIFACTS if name in st.session_state}
+    if 'workflow' in st.session_state:
+        current['workflow'] = diagrams.join_graph(load_artifact('workflow'), load_artifact('workflow_graph'))
+    if 'state_transitions' in st.session_state:
+        current['state_transitions'] = diagrams.join_graph(load_artifact('state_transitions'), load_artifact('state_graph'))
+    summary, patched, defects, touched = run_job("plan_edit", {"plan": load_artifact('plan'), "new_plan": new_plan, "artifacts": current})
+    save_artifact('plan', new_plan)
+    show_defects(defects)
+
+    for name in OBJECT_TABLE_INSTRUCTIONS:
+        if name in patched:
+            save_object_table(name, patched[name])
+
+    if 'workflow' in patched:
+        workflow, workflow_graph = diagrams.split_graph(patched['workflow'])
+        save_artifact('workflow_graph', workflow_graph)
+        save_artifact('workflow', workflow)
+
+    if 'state_transitions' in patched:
+        state_transitions, state_graph = diagrams.split_graph(patched['state_transitions'])
+        save_artifact('state_graph', state_graph)
+        save_artifact('state_transitions', state_transitions)
+
+    if 'use_case_table' in patched:
+        use_cases = save_use_case_table(patched['use_case_table'])
+
+        # Only the specs of added or changed use cases are generated again, on Resume
+        spec_run = st.session_state.get('spec_run')
+        if spec_run is not None:
+            stale = [spec_run.key(use_case) for use_case in use_cases if touched is None or validators.normalize(spec_run.key(use_case)) in touched]
+            spec_run.update(use_cases, stale)
+            spec_run.fn = spec_job(load_artifact('workflow'))
+            st.session_state.pop('use_case_specs', None)
+            st.session_state.pop('use_case_specs_run', None)
+
+    if 'permission_matrix' in patched:
+        save_permission_matrix(patched['permission_matrix'], load_artifact('actor_objects'), patched['use_case_table'])
+    return summary
+
+def save_object_table(name, md_table):
+    """Save a data/actor/external system table, and its objects in the model if downstream steps read them."""
+    save_artifact(name, md_table)
+    if name in artifacts.OBJECT_TABLES:
+        part, object_type = artifacts.OBJECT_TABLES[name]
+        update_model(**{part: artifacts.objects_from_markdown(md_table, object_type)})
+
+def save_use_case_table(use_case_table):
+    """Save a use case table and its use cases, parsed once into the model. Returns the use cases."""
+    save_artifact('use_case_table', use_case_table)
+    use_cases = artifacts.use_cases_from_markdown(use_case_table, load_model().actors)
+    if not use_cases:
+        # Not a table the local parser understands; let the model parse it
+        try:
+            records = parse_markdown_table(use_case_table).get('use_cases', [])
+        except Exception as e:
+            st.error(f"Error in generating JSON response from OpenAI: {e}")
+            records = []
+        use_cases = tuple(artifacts.UseCase.from_record(record) for record in records)
+    update_model(use_cases=use_cases)
+    return load_model().use_cases
+
+def save_permission_matrix(permission_matrix, actor_objects, use_case_table):
+    """Save a permission matrix and its grid, parsed once."""
+    save_artifact('permission_matrix', permission_matrix)
+    save_artifact('permission_grid', permissions.PermissionMatrix.from_markdown(permission_matrix, actor_objects, use_case_table))
+
+def show_defects(defects):
+    """Warn about defects that could not be repaired."""
+    if defects:
+        st.warning("Some problems could not be repaired automatically:\n" + "\n".join(f"- {defect.message}" for defect in defects))
+
+SPEC_WORKERS = 4
+
+SPEC_INSTRUCTION = """Generate a concise specifications table including the following rows:
+         Objective, Actor(s), Trigger, Pre-condition, User-Workflow, Post-condition, Acceptance Criteria for the following use case.\n
+         You can refer to the User Workflow for more context: {workflow}"""
+
+def generate_use_case_specs(use_case, workflow, refresh=False):
+    """Generate detailed specifications for a use case, including workflow information.
+
+    Errors are raised, so a spec run can mark the use case for retry.
+    """
+    request = f"Use Case Name: {use_case.name}\nDescription: {use_case.description}"
+    # A long workflow is cut down to the parts most relevant to this use case
+    decision = llm.fit("use_case_specs", [{"role": "system", "content": SPEC_INSTRUCTION.format(workflow="")}, {"role": "user", "content": request}], workflow, query=request)
+    return llm.complete("use_case_specs", [
+        {"role": "system", "content": SPEC_INSTRUCTION.format(workflow=decision.text)},
+        {"role": "user", "content": request}
+    ], strategy=decision.strategy, refresh=refresh)
+
+TEST_CASE_INSTRUCTION = """Turn the acceptance criteria of the following use case into test cases.
+    Answer with one markdown table with the columns: Title, Steps, Expected Result.
+    Cover every acceptance criterion with at least one test case. Number the steps in the Steps cell and separate them with <br>."""
+TEST_CASE_WORKERS = 8
+TEST_CASE_REFRESH = 1.0  # seconds between updates of a running test case run
+
+def generate_test_cases(use_case, spec):
+    """Generate test case rows from the Acceptance Criteria of a use case spec.
+
+    Rows are cached by spec hash, so an unchanged spec is never sent again.
+    Errors are raised, so a test case run can mark the use case for retry.
+    """
+    key = test_cases.spec_key(use_case, spec)
+    rows = llm.cache.get(key) if llm.cache is not None else None
+    if rows is not None:
+        return rows  # one lookup, so an entry evicted in between is not returned as None
+    messages = [
+        {"role": "system", "content": TEST_CASE_INSTRUCTION},
+        {"role": "user", "content": f"Use Case: {use_case.label}\nAcceptance Criteria:\n{test_cases.acceptance_criteria(spec)}"}
+    ]
+    answer = llm.complete("test_cases", messages)
+    rows = test_cases.parse_test_cases(answer, use_case)
+    if not rows:
+        if llm.cache is not None:
+            llm.cache.discard(llm.request_key("test_cases", messages))  # so a retry asks again
+        raise ValueError("The answer has no test case table")
+    if llm.cache is not None:
+        llm.cache.cache(key, rows)
+    return rows
+
+def export_permission_docx(permission_matrix, actor_objects, use_case_table):
+    """The permission matrix as .docx file bytes."""
+    document = BytesIO()
+    permissions.PermissionMatrix.from_markdown(permission_matrix, actor_objects, use_case_table).to_docx().save(document)
+    return document.getvalue()
+
+def use_case_args(use_case):
+    """A use case as JSON-serializable job arguments."""
+    return {"id": use_case.id, "name": use_case.name, "description": use_case.description}
+
+def fold_meetings_job(meetings, merge_state):
+    """Fold a series of meetings into a plan from a copy of ``merge_state``. Returns the plan and the new merge state."""
+    merge_state = copy.deepcopy(merge_state)
+    plan = fold_meetings([tuple(meeting) for meeting in meetings], merge_state)
+    if plan is None:
+        raise ValueError("There are no meetings to merge into a plan")  # a failed job is not cached
+    return plan, merge_state
+
+# Generation and export jobs by kind. Each takes JSON-serializable arguments, so it
+# can run in this process or on a worker process (worker.py) through the job queue.
+JOBS = {
+    "transcript": lambda args: ingest.read_transcript(BytesIO(disk_store().get(args['content']))),
+    "plan": lambda args: generate_plan(args['transcript'], args.get('refresh', False), raise_errors=True),
+    "meeting_plan": lambda args: fold_meetings_job(args['meetings'], args['merge_state']),
+    "plan_edit": lambda args: patch_artifacts(args['plan'], args['new_plan'], args['artifacts']),
+    "object_table": lambda args: repair_object_table(generate_table(args['plan'], args['instruction'], args.get('refresh', False)), args['plan'], args['instruction']),
+    "workflow": lambda args: diagrams.split_graph(generate_workflow(args['plan'], args['actor_objects'], args.get('refresh', False))),
+    "state_transitions": lambda args: diagrams.split_graph(generate_state_transitions(args['plan'], args['data_objects'], args.get('refresh', False))),
+    "use_case_table": lambda args: repair_use_case_table(generate_use_case_table(args['plan'], args['actor_objects'], args.get('refresh', False)), args['plan'], args['actor_objects']),
+    "permission_matrix": lambda args: repair_permission_matrix(generate_permission_matrix(args['actor_objects'], args['use_case_table'], args.get('refresh', False)), args['actor_objects'], args['use_case_table']),
+    "workflow_candidates": lambda args: generate_workflow_candidates(args['plan'], args['actor_objects'], args['n'], args['data_objects'], args.get('refresh', False)),
+    "use_case_table_candidates": lambda args: generate_use_case_table_candidates(args['plan'], args['actor_objects'], args['n'], args['data_objects'], args.get('refresh', False)),
+    "use_case_spec": lambda args: generate_use_case_specs(artifacts.UseCase(**args['use_case']), args['workflow'], args.get('refresh', False)),
+    "test_cases": lambda args: generate_test_cases(artifacts.UseCase(**args['use_case']), args['spec']),
+    "permission_docx": lambda args: export_permission_docx(args['permission_matrix'], args['actor_objects'], args['use_case_table']),
+}
+
+JOB_RUNS = 3  # times a job is run before giving up on reading its result
+_MISSING = object()
+
+def run_job(kind, args, priority=scheduler.INTERACTIVE):
+    """Run a job on the worker processes if a job queue is configured, otherwise in this process.
+
+    Workers put results in the shared disk store, keyed by kind and
+    arguments, so a job that any process has already run is not run again,
+    unless its arguments ask for a ``refresh`` (a regenerate).
+    """
+    queue = job_queue()
+    if queue is None:
+        return JOBS[kind](args)
+    store = disk_store()
+    key = jobqueue.result_key(kind, args)
+    if args.get('refresh'):
+        store.discard(key)
+    # The store may evict a result before it is read; the job is then run again
+    for _ in range(JOB_RUNS):
+        if key not in store:
+            job = queue.wait(queue.enqueue(kind, args, priority))
+            if job['status'] == jobqueue.FAILED:
+                raise RuntimeError(f"Job {kind} failed: {job['error']}")
+        result = store.get(key, _MISSING)
+        if result is not _MISSING:
+            return result
+    raise RuntimeError(f"Job {kind} finished but its result was evicted from the store {JOB_RUNS} times")
+
+PROGRESS_REFRESH = 0.5  # seconds between updates of a progress bar
+BOARD_REFRESH = 2.0  # seconds between updates of the stage board while a stage runs
+
+def progress_tracker():
+    """Progress of the stages run in this session."""
+    return st.session_state.setdefault('progress', progress.Tracker())
+
+def run_stage(name, fn, *args):
+    """Run ``fn(*args)`` as stage ``name`` with a live progress bar (tokens so far and ETA); returns its result."""
+    tracker = progress_tracker()
+    ctx = get_script_run_ctx()
+    bar = st.empty()
+    with ThreadPoolExecutor(max_workers=1, initializer=lambda: add_script_run_ctx(ctx=ctx)) as pool:
+        future = pool.submit(scheduler.bind(tracker.run), name, fn, *args)
+        while not future.done():
+            stage = tracker.get(name)
+            bar.progress(stage['fraction'], text=progress.describe(stage))
+            time.sleep(PROGRESS_REFRESH)
+    bar.empty()
+    return future.result()
+
+def run_plan_job(kind, args):
+    """Run a plan job as stage plan with a progress bar. Errors are shown and None is returned."""
     try:
-        openai_response = openai.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": f"""Generate a concise specifications table including the following rows:
-                 Objective, Actor(s), Trigger, Pre-condition, User-Workflow, Post-condition, Acceptance Criteria for the following use case.\n
-                 You can refer to the User Workflow for more context: {workflow}"""},
-                {"role": "user", "content": f"Use Case Name: {use_case['UC_Name']}\nDescription: {use_case['Description']}"}
-            ],
-            temperature=0.5,
-            max_tokens=2000
-        )
-        return openai_response.choices[0].message.content
+        return run_stage('plan', run_job, kind, args)
     except Exception as e:
-        st.error(f"Error generating specifications: {e}")
-        return "Error generating specifications."
+        st.error(f"An error occurred with the OpenAI API: {e}")
+        return None
+
+def spec_job(workflow, refresh=False):
+    """Fan-out function of a spec run: each use case is generated by a job, bound to stage use_case_specs."""
+    return scheduler.bind(progress_tracker().bind('use_case_specs', lambda use_case: run_job("use_case_spec", {"use_case": use_case_args(use_case), "workflow": workflow, "refresh": refresh}, scheduler.priority_for('use_case_specs'))))
+
+def start_fan_out(name, run):
+    """Start a fan-out run (whose function is bound to stage ``name``) and its progress."""
+    progress_tracker().start(name, total=len(run.missing()), workers=run.workers)
+    run.start()
+
+def finish_fan_out(name, run):
+    """Finish the progress of a fan-out run that stopped. Returns False if it was finished already."""
+    stage = progress_tracker().get(name)
+    if stage['status'] != progress.RUNNING:
+        return False
+    failed = len(run.failed())
+    if failed:
+        progress_tracker().finish(name, progress.FAILED, f"{failed} of {len(run.items)} items failed")
+    else:
+        progress_tracker().finish(name, progress.CANCELLED if run.missing() else progress.DONE)
+    return True
+
+def show_progress(tracker, polling):
+    """Stage board of this session: status, items, tokens, elapsed time and ETA. Reruns on its own while a stage runs."""
+    stages = tracker.snapshot()
+    with st.expander("Progress", expanded=polling):
+        st.table([
+            {
+                "stage": stage['name'],
+                "status": stage['status'],
+                "items": f"{stage['done']}/{stage['total']}" if stage['total'] is not None else "",
+                "tokens": stage['tokens'],
+                "elapsed": progress.format_seconds(stage['elapsed']),
+                "ETA": progress.format_seconds(stage['eta']) if stage['status'] == progress.RUNNING else "",
+            }
+            for stage in stages
+        ])
+    if polling and not tracker.running():
+        st.rerun()  # stop polling
+
+def show_diagram(graph, name, state_diagram=False):
+    """Show a generated diagram with Mermaid and image downloads."""
+    if graph is None or not graph.nodes:
+        return
+    svg = diagrams.render(graph, "svg")
+    if svg is not None:
+        st.image(svg.decode())
+    else:
+        st.graphviz_chart(diagrams.to_dot(graph))
+    with st.expander("Mermaid"):
+        st.code(diagrams.to_mermaid(graph, state_diagram), language="mermaid")
+    col1, col2, col3 = st.columns(3)
+    col1.download_button("Download .mmd", diagrams.to_mermaid(graph, state_diagram), file_name=f"{name}.mmd", key=f"{name}_mmd")
+    if svg is not None:
+        col2.download_button("Download .svg", svg, file_name=f"{name}.svg", key=f"{name}_svg")
+        col3.download_button("Download .png", diagrams.render(graph, "png"), file_name=f"{name}.png", key=f"{name}_png")
+
+@st.fragment
+def show_transcript(text, key):
+    """Show a transcript one page at a time. Paging reruns only this fragment."""
+    lines = text.splitlines()
+    pages = max(1, math.ceil(len(lines) / TRANSCRIPT_PAGE_LINES))
+    page = 1
+    if pages > 1:
+        page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1, key=f"transcript_page_{key}")
+    start = (page - 1) * TRANSCRIPT_PAGE_LINES
+    st.text_area("Content", value="\n".join(lines[start:start + TRANSCRIPT_PAGE_LINES]), height=300, key=f"transcript_{key}_{page}")
+
+ARTIFACT_SECTIONS = {
+    "Requirement Plan": 'plan',
+    "Data Objects": 'data_objects',
+    "Actor Objects": 'actor_objects',
+    "External Systems": 'external_systems',
+    "User Workflow": 'workflow',
+    "State Transitions": 'state_transitions',
+    "Use Case Table": 'use_case_table',
+    "Use Case Specs": 'use_case_specs',
+    "Permission Matrix": 'permission_matrix',
+    "Traceability": 'transcript_index',
+}
+
+@st.fragment
+def show_artifacts():
+    """Render only the artifact section that is open. Switching sections reruns only this fragment."""
+    available = [label for label, key in ARTIFACT_SECTIONS.items() if key in st.session_state]
+    if 'plan' not in st.session_state and "Traceability" in available:
+        available.remove("Traceability")  # nothing to trace before there is a plan
+    if not available:
+        return
+    section = st.segmented_control("Artifacts", available, default=available[0])
+    with profiling.profiled(f"render_{ARTIFACT_SECTIONS.get(section)}", profiling_enabled()):
+        show_section(section)
+
+def show_section(section):
+    """Render one artifact section."""
+    if section == "Requirement Plan":
+        st.write("### Generated Requirement Plan:")
+        st.markdown(load_artifact('plan'))
+        with st.expander("Edit plan"):
+            edited = st.text_area("Requirement Plan", value=load_artifact('plan'), height=400, key="plan_editor")
+            if st.button("Apply changes", help="Only the changed components are sent to update the tables, workflow and use cases."):
+                with st.spinner("Updating the artifacts affected by the change..."):
+                    st.session_state['plan_edit_summary'] = apply_plan_edit(edited)
+                st.session_state.pop('plan_editor', None)
+                st.rerun()
+            if 'plan_edit_summary' in st.session_state:
+                st.caption(f"Last edit: {st.session_state['plan_edit_summary']}")
+
+    elif section == "Data Objects":
+        st.write("### Data Objects Table:")
+        st.markdown(load_artifact('data_objects'))
+
+    elif section == "Actor Objects":
+        st.write("### Actor Objects Table:")
+        st.markdown(load_artifact('actor_objects'))
+
+    elif section == "External Systems":
+        st.write("### External Systems Table:")
+        st.markdown(load_artifact('external_systems'))
+
+    elif section == "User Workflow":
+        st.write("### Generated User Workflow:")
+        st.markdown(load_artifact('workflow'))
+        show_diagram(load_artifact('workflow_graph'), "workflow")
+        show_candidates('workflow', use_workflow_candidate)
+
+    elif section == "State Transitions":
+        st.write("### Generated State Transitions:")
+        st.markdown(load_artifact('state_transitions'))
+        show_diagram(load_artifact('state_graph'), "state_transitions", state_diagram=True)
+
+    elif section == "Use Case Table":
+        st.write("### Generated Use Case Table:")
+        st.markdown(load_artifact('use_case_table'))
+        show_candidates('use_case_table', use_use_case_table_candidate)
+
+    elif section == "Use Case Specs":
+        st.write("### Generated Use Case Specifications:")
+        model = load_model()
+        show_spec_index(model.use_cases)
+        for use_case, spec in zip(model.use_cases, load_artifact('use_case_specs')):
+            show_spec(use_case, spec, model)
+
+    elif section == "Permission Matrix":
+        st.write("### Generated Permission Matrix:")
+        st.markdown(load_artifact('permission_matrix'))
+        if 'permission_grid' in st.session_state:
+            grid = load_artifact('permission_grid')
+            if grid.use_cases:
+                use_case = st.selectbox("Which actors can perform...", grid.use_cases, format_func=permissions.use_case_label)
+                st.write(", ".join(grid.actors_for(use_case[0])) or "No actor has access to this use case.")
+            with profiling.profiled("docx_export", profiling_enabled()):
+                document = run_job("permission_docx", {"permission_matrix": load_artifact('permission_matrix'), "actor_objects": load_artifact('actor_objects'), "use_case_table": load_artifact('use_case_table')})
+            st.download_button("Download Permission Matrix (.docx)", document, file_name="permission_matrix.docx")
+
+    elif section == "Traceability":
+        st.write("### Requirement Traceability:")
+        show_traceability(st.session_state['transcript_index'])
+
+def use_workflow_candidate(candidate):
+    workflow, workflow_graph, _ = candidate
+    save_artifact('workflow_graph', workflow_graph)
+    save_artifact('workflow', workflow)
+
+def use_use_case_table_candidate(candidate):
+    use_case_table, defects, _ = candidate
+    if defects is None:  # not repaired when it was generated
+        use_case_table, defects = repair_use_case_table(use_case_table, load_artifact('plan'), load_artifact('actor_objects'))
+    show_defects(defects)
+    save_use_case_table(use_case_table)
+
+def show_candidates(name, use):
+    """Scores of the candidates of a best-of-N generation, with the option to switch to another one."""
+    candidates = load_artifact(f'{name}_candidates')
+    if not candidates or len(candidates) < 2:
+        return
+    with st.expander(f"Candidates ({len(candidates)})"):
+        st.table([
+            {"candidate": index + 1, **{part: round(value, 2) for part, value in parts.items()}}
+            for index, (*_, parts) in enumerate(candidates)
+        ])
+        index = st.selectbox("Candidate", range(len(candidates)), format_func=lambda index: f"#{index + 1} (score {candidates[index][-1]['score']:.2f})", key=f"{name}_candidate")
+        st.markdown(candidates[index][0])
+        if st.button("Use this candidate", key=f"use_{name}_candidate"):
+            use(candidates[index])
+            st.rerun()
+
+def show_traceability(index):
+    """Table linking requirements, use cases and data objects to the utterances that support them."""
+    model = load_model()
+    items = {
+        "Requirement": transcripts.plan_requirements(load_artifact('plan')),
+        "Use Case": [f"{use_case.id} - {use_case.name} - {use_case.description}" for use_case in model.use_cases],
+        "Data Object": [f"{data_object.name} - {data_object.description}" for data_object in model.data_objects],
+    }
+    start = time.perf_counter()
+    trace = transcripts.traceability(index, items)
+    seconds = time.perf_counter() - start
+    rows = []
+    for entry in trace:
+        for rank, (score, utterance) in enumerate(entry['sources'], 1):
+            rows.append({
+                "Artifact": entry['artifact'],
+                "Item": entry['item'],
+                "Rank": rank,
+                "Speaker": utterance.speaker,
+                "Meeting": utterance.source,
+                "Utterance": utterance.text,
+                "Score": round(score, 2),
+            })
+        if not entry['sources']:
+            rows.append({"Artifact": entry['artifact'], "Item": entry['item'], "Rank": None, "Speaker": None, "Meeting": None, "Utterance": "No supporting utterance found.", "Score": None})
+    st.caption(f"{len(trace)} items traced to {len(index.utterances)} utterances in {seconds * 1000:.1f} ms")
+    st.dataframe(rows, use_container_width=True, hide_index=True)
+
+def spec_anchor(use_case):
+    """Anchor of a use case's specification, for links from the index."""
+    return "spec-" + re.sub(r"\W+", "-", use_case.id or use_case.name).strip("-").lower()
+
+def show_spec_index(use_cases):
+    """Collapsible index linking to each use case's specification."""
+    with st.expander(f"Index ({len(use_cases)} use cases)"):
+        st.markdown("\n".join(f"- [{use_case.label}](#{spec_anchor(use_case)})" for use_case in use_cases))
+
+def show_spec(use_case, spec, model):
+    """Render one use case specification under its own heading, with the actors it names."""
+    st.subheader(use_case.label, anchor=spec_anchor(use_case))
+    actors = model.actors_of(use_case)
+    if actors:
+        st.caption("Actors: " + ", ".join(actor.name for actor in actors))
+    st.markdown(spec)
+
+def watch_spec_run(spec_run, real_time_placeholder):
+    """Show the progress of a spec run and each specification as it finishes, until the run stops.
+
+    Every use case gets its own slot, in use case order, that is written once
+    when its specification arrives, so the page grows by one spec at a time.
+    """
+    use_cases = spec_run.items
+    model = load_model()
+    show_spec_index(use_cases)
+    slots = [st.empty() for _ in use_cases]
+    shown = set()
+    while True:
+        finished = not spec_run.running()
+        for index, use_case in enumerate(use_cases):
+            result = spec_run.result(use_case)
+            if index in shown or result is None or result['status'] != fanout.DONE:
+                continue
+            shown.add(index)
+            with slots[index].container():
+                show_spec(use_case, result['value'], model)
+
+        # Display the progress in real-time
+        stage = progress_tracker().get('use_case_specs')
+        real_time_placeholder.progress(stage['fraction'], text=progress.describe(stage))
+        if finished:
+            finish_fan_out('use_case_specs', spec_run)
+            break
+        time.sleep(PROGRESS_REFRESH)
+
+def show_test_case_run(test_case_run, polling):
+    """Test cases generated so far, with downloads. Reruns on its own while the run is going."""
+    rows = [row for value in test_case_run.values() for row in value]
+    st.write("### Generated Test Cases:")
+    status = f"{len(test_case_run.done())}/{len(test_case_run.items)} use cases done, {len(test_case_run.failed())} failed, {len(rows)} test cases"
+    if not test_case_run.running() and test_case_run.missing():
+        status += ". Generate again to retry the rest."
+    st.caption(status)
+    if rows:
+        st.dataframe(rows, column_order=test_cases.COLUMNS, use_container_width=True, hide_index=True)
+        col1, col2 = st.columns(2)
+        col1.download_button("Download Test Cases (.csv)", test_cases.to_csv(rows), file_name="test_cases.csv", mime="text/csv")
+        if test_cases.xlsx_available():
+            col2.download_button("Download Test Cases (.xlsx)", test_cases.to_xlsx(rows), file_name="test_cases.xlsx")
+    if test_case_run.running():
+        stage = progress_tracker().get('test_cases')
+        st.progress(stage['fraction'], text=progress.describe(stage))
+    if not test_case_run.running():
+        # Also when the run ended before the first poll, e.g. with every use case cached
+        if finish_fan_out('test_cases', test_case_run) and not test_case_run.missing():
+            save_artifact('test_cases', rows)
+        if polling:
+            st.rerun()  # stop polling and refresh the buttons
+
+PREFETCH_REFRESH = 2.0  # seconds between status updates of a running prefetch
+
+def start_prefetch(key, transcript_text=None, make_plan=None):
+    """Generate every artifact of an upload in the background, once per upload."""
+    run = st.session_state.get('prefetch')
+    if run is not None and run.key == key:
+        return
+    if run is not None:
+        run.cancel()  # the upload changed
+    run = prefetch.Prefetch(key, transcript_text, make_plan, session=get_script_run_ctx().session_id)
+    st.session_state['prefetch'] = run
+    run.start()
+
+def show_prefetch(run, polling):
+    """Status of the background prefetch, with a Cancel button. Reruns on its own while it is going."""
+    st.caption(run.summary())
+    if run.running():
+        st.caption(f"About {progress.format_seconds(run.tracker.eta())} left")
+    if run.running() and st.button("Cancel prefetch"):
+        run.cancel()
+    if polling and not run.running():
+        st.rerun()  # stop polling
+
+def show_profile():
+    """Top hotspots of the recently profiled stages."""
+    with st.expander("Profile"):
+        for entry in reversed(profiling.recent):
+            st.write(f"**{entry['stage']}**: {entry['seconds'] * 1000:.1f} ms, peak {entry['peak_bytes'] / 1e6:.2f} MB")
+            st.table([{**row, "tottime": f"{row['tottime'] * 1000:.2f} ms", "cumtime": f"{row['cumtime'] * 1000:.2f} ms"} for row in entry['hotspots']])
+            st.caption(" · ".join(entry['files']))
 
 def main():
     # Streamlit interface
     st.set_page_config(page_title="Agent James - Test Case Maker", page_icon=":memo:", layout='wide')
+    # Connect to OpenAI key
+    connect_openai()
+    # Identical requests from any session are answered from the shared store
+    llm.cache = shared_store()
+    # LLM requests of this session share the request slots fairly with other sessions
+    scheduler.set_session(get_script_run_ctx().session_id)
 
     # Using columns to center the logo
     col1, col2, col3 = st.columns([1,2,1])  # Adjust the ratio as needed to center the logo
     with col2:
-        logo_path = "bavista_logo.png"  # Update 'path_to_your_logo.png' with the real path to your logo file
-        st.image(logo_path, use_column_width=True)  # Adjust 'use_column_width' to True or set width parameter
+        st.image(logo(), use_container_width=True)
     
     st.title('Agent Simon - Minutes to Requirements')
+    # With a job queue the buttons read the workers' store, which a prefetch in this process cannot warm
+    queued = job_queue() is not None
+    prefetching = st.toggle("Prefetch", disabled=queued, help="Generate the plan and every artifact in the background right after upload, at low priority, so the buttons show finished results."
+                            + (" Off while jobs run on worker processes (AGENT_SIMON_QUEUE), whose cache it cannot warm." if queued else "")) and not queued
+    if not prefetching and 'prefetch' in st.session_state:
+        st.session_state.pop('prefetch').cancel()
+
+    if st.toggle("Merge a series of meetings", help="Upload several transcripts of the same project to build one plan. Adding a meeting later only merges that meeting into the existing plan."):
+        uploaded_files = st.file_uploader("Upload meeting transcripts (.docx, .vtt, .srt, .txt or .pdf)", type=TRANSCRIPT_TYPES, accept_multiple_files=True)
+        if uploaded_files:
+            meetings = read_meetings(uploaded_files)
+            st.session_state['transcript_index'] = transcript_index(tuple(digest for digest, _, _ in meetings), [(name, text) for _, name, text in meetings])
+            if prefetching and meetings:
+                start_prefetch(tuple(digest for digest, _, _ in meetings), make_plan=lambda: fold_meetings(meetings, {}))
+            st.write("### Uploaded Documents:")
+            for digest, name, text in meetings:
+                with st.expander(name):
+                    show_transcript(text, digest)
+
+            if st.button("Generate Requirement Plan", use_container_width=True, type="primary"):
+                with st.spinner('🤔Merging the meetings into one set of requirements...'):
+                    plan = None
+                    merged = run_plan_job("meeting_plan", {"meetings": meetings, "merge_state": st.session_state.get('meeting_merge', {})})
+                    if merged is not None:
+                        plan, st.session_state['meeting_merge'] = merged
+                    if plan:
+                        save_artifact('plan', plan)  # Save plan to session state
+                        st.markdown("### Generated Requirement Plan:")
+                        st.markdown(plan)
+                        st.markdown('👈 Follow the **actions** on the sidebar to continue')
+                    else:
+                        st.error('Failed to generate Requirement Plan.')
+    else:
+        uploaded_file = st.file_uploader("Upload a meeting transcript (.docx, .vtt, .srt, .txt or .pdf)", type=TRANSCRIPT_TYPES)
+        text = None
+        if uploaded_file is not None:
+            bytes_data = uploaded_file.getvalue()
+            digest = hashlib.sha256(bytes_data).hexdigest()
+            try:
+                text = load_transcript(digest, bytes_data)
+            except ingest.UnsupportedFormat as e:
+                st.error(f"Cannot read {uploaded_file.name}: {e}")
+        if text is not None:
+            st.session_state['transcript_index'] = transcript_index((digest,), [(uploaded_file.name, text)])
+            if prefetching:
+                start_prefetch((digest,), transcript_text=text)
+            st.write("### Uploaded Document:")
+            show_transcript(text, digest)
 
-    uploaded_file = st.file_uploader("Upload a Teams meeting transcript .docx file", type='docx')
-    if uploaded_file is not None:
-        bytes_data = uploaded_file.getvalue()
-        text = read_docx(BytesIO(bytes_data))
-        st.write("### Uploaded Document:")
-        st.text_area("Content", value=text, height=300)
-
-        if st.button("Generate Requirement Plan", use_container_width=True, type="primary"):
-            with st.spinner('🤔Thinking on how to convert minutes to requirements...'):
-                plan = generate_plan(text)
-                if plan:
-                    st.session_state['plan'] = plan  # Save plan to session state
-                    st.markdown("### Generated Requirement Plan:")
-                    st.markdown(plan)
-                    st.markdown('👈 Follow the **actions** on the sidebar to continue')
-                else:
-                    st.error('Failed to generate Requirement Plan.')
+            if st.button("Generate Requirement Plan", use_container_width=True, type="primary"):
+                with st.spinner('🤔Thinking on how to convert minutes to requirements...'):
+                    plan = run_plan_job("plan", {"transcript": text, "refresh": 'plan' in st.session_state})
+                    if plan:
+                        save_artifact('plan', plan)  # Save plan to session state
+                        st.markdown("### Generated Requirement Plan:")
+                        st.markdown(plan)
+                        st.markdown('👈 Follow the **actions** on the sidebar to continue')
+                    else:
+                        st.error('Failed to generate Requirement Plan.')
 
     # Sidebar for other actions
     with st.sidebar:
+        if 'prefetch' in st.session_state:
+            run = st.session_state['prefetch']
+            polling = run.running()
+            st.fragment(show_prefetch, run_every=PREFETCH_REFRESH if polling else None)(run, polling)
         if 'plan' in st.session_state:
             st.write("### Actions")
+            candidates = st.number_input("Candidates per generation", min_value=1, max_value=MAX_CANDIDATES, value=1, help="Generate several workflows or use case tables in one request and keep the one that scores best for validity and coverage of the actors and data objects. The others can still be picked.")
             if st.button("Generate Data Objects Table"):
-                data_objects = generate_table(st.session_state['plan'], "List all data objects within the software system...")
-                st.session_state['data_objects'] = data_objects
+                data_objects, defects = run_stage('data_objects', run_job, "object_table", {"plan": load_artifact('plan'), "instruction": OBJECT_TABLE_INSTRUCTIONS['data_objects'], "refresh": 'data_objects' in st.session_state})
+                show_defects(defects)
+                save_object_table('data_objects', data_objects)
 
             if st.button("Generate Actor Objects Table"):
-                actor_objects = generate_table(st.session_state['plan'], "List all actors that directly interact with the software...")
-                st.session_state['actor_objects'] = actor_objects
+                actor_objects, defects = run_stage('actor_objects', run_job, "object_table", {"plan": load_artifact('plan'), "instruction": OBJECT_TABLE_INSTRUCTIONS['actor_objects'], "refresh": 'actor_objects' in st.session_state})
+                show_defects(defects)
+                save_object_table('actor_objects', actor_objects)
 
             if st.button("Generate External System Objects"):
-                external_systems = generate_table(st.session_state['plan'], "List all external systems or services...")
-                st.session_state['external_systems'] = external_systems
+                external_systems, defects = run_stage('external_systems', run_job, "object_table", {"plan": load_artifact('plan'), "instruction": OBJECT_TABLE_INSTRUCTIONS['external_systems'], "refresh": 'external_systems' in st.session_state})
+                show_defects(defects)
+                save_object_table('external_systems', external_systems)
 
             if 'actor_objects' in st.session_state and 'plan' in st.session_state:
                 if st.button("Generate Workflow"):
-                    workflow = generate_workflow(st.session_state['plan'], st.session_state['actor_objects'])
-                    st.session_state['workflow'] = workflow
+                    if candidates > 1:
+                        workflows = run_stage('workflow', run_job, "workflow_candidates", {"plan": load_artifact('plan'), "actor_objects": load_artifact('actor_objects'), "n": candidates, "data_objects": load_artifact('data_objects') or "", "refresh": 'workflow' in st.session_state})
+                        save_artifact('workflow_candidates', workflows)
+                        workflow, workflow_graph, _ = workflows[0]
+                    else:
+                        st.session_state.pop('workflow_candidates', None)
+                        workflow, workflow_graph = run_stage('workflow', run_job, "workflow", {"plan": load_artifact('plan'), "actor_objects": load_artifact('actor_objects'), "refresh": 'workflow' in st.session_state})
+                    save_artifact('workflow_graph', workflow_graph)
+                    save_artifact('workflow', workflow)
 
             if 'workflow' in st.session_state and 'data_objects' in st.session_state:
                 if st.button("Generate State Transition"):
-                    state_transitions = generate_state_transitions(st.session_state['plan'], st.session_state['data_objects'])
-                    st.session_state['state_transitions'] = state_transitions
+                    state_transitions, state_graph = run_stage('state_transitions', run_job, "state_transitions", {"plan": load_artifact('plan'), "data_objects": load_artifact('data_objects'), "refresh": 'state_transitions' in st.session_state})
+                    save_artifact('state_graph', state_graph)
+                    save_artifact('state_transitions', state_transitions)
 
             if 'actor_objects' in st.session_state and 'plan' in st.session_state:
                 if st.button("Generate Use Case Table"):
-                    use_case_table = generate_use_case_table(st.session_state['plan'], st.session_state['actor_objects'])
-                    st.session_state['use_case_table'] = use_case_table
-                    # Parse and store in session state
-                    st.session_state['use_cases'] = parse_markdown_table(use_case_table)
+                    if candidates > 1:
+                        use_case_tables = run_stage('use_case_table', run_job, "use_case_table_candidates", {"plan": load_artifact('plan'), "actor_objects": load_artifact('actor_objects'), "n": candidates, "data_objects": load_artifact('data_objects') or "", "refresh": 'use_case_table' in st.session_state})
+                        save_artifact('use_case_table_candidates', use_case_tables)
+                        use_case_table, defects, _ = use_case_tables[0]
+                    else:
+                        st.session_state.pop('use_case_table_candidates', None)
+                        use_case_table, defects = run_stage('use_case_table', run_job, "use_case_table", {"plan": load_artifact('plan'), "actor_objects": load_artifact('actor_objects'), "refresh": 'use_case_table' in st.session_state})
+                    show_defects(defects)
+                    save_use_case_table(use_case_table)
 
             if 'use_case_table' in st.session_state and 'actor_objects' in st.session_state:
                 if st.button("Generate Permission Matrix"):
-                    permission_matrix = generate_permission_matrix(st.session_state['actor_objects'], st.session_state['use_case_table'])
-                    st.session_state['permission_matrix'] = permission_matrix
+                    permission_matrix, defects = run_stage('permission_matrix', run_job, "permission_matrix", {"actor_objects": load_artifact('actor_objects'), "use_case_table": load_artifact('use_case_table'), "refresh": 'permission_matrix' in st.session_state})
+                    show_defects(defects)
+                    save_permission_matrix(permission_matrix, load_artifact('actor_objects'), load_artifact('use_case_table'))
 
-    # Main area to display results
-    if 'data_objects' in st.session_state:
-        st.write("### Data Objects Table:")
-        st.markdown(st.session_state['data_objects'])
+        tracker = progress_tracker()
+        if tracker.stages:
+            polling = tracker.running()
+            st.fragment(show_progress, run_every=BOARD_REFRESH if polling else None)(tracker, polling)
+        show_memory_usage()
+        if profiling_enabled():
+            show_profile()
+        summary = llm.telemetry_summary()
+        if summary:
+            with st.expander("LLM telemetry"):
+                st.table([{"stage": stage, **totals} for stage, totals in summary.items()])
+            with st.expander("LLM queue"):
+                st.table([{"class": name, **stats} for name, stats in llm.queue.stats().items()])
+        if job_queue() is not None:
+            with st.expander("Workers"):
+                st.table([job_queue().stats()])
 
-    if 'actor_objects' in st.session_state:
-        st.write("### Actor Objects Table:")
-        st.markdown(st.session_state['actor_objects'])
-
-    if 'external_systems' in st.session_state:
-        st.write("### External Systems Table:")
-        st.markdown(st.session_state['external_systems'])
-
-    if 'workflow' in st.session_state:
-        st.write("### Generated User Workflow:")
-        st.markdown(st.session_state['workflow'])
-
-    if 'state_transitions' in st.session_state:
-        st.write("### Generated State Transitions:")
-        st.markdown(st.session_state['state_transitions'])
+    # Main area to display results
+    show_artifacts()
 
-    if 'use_case_table' in st.session_state:
-        st.write("### Generated Use Case Table:")
-        st.markdown(st.session_state['use_case_table'])
+    if load_model().use_cases and 'workflow' in st.session_state:
+        spec_run = st.session_state.get('spec_run')
+        col1, col2, col3 = st.columns(3)
+        generate = col1.button("Generate Use Case Specs", use_container_width=True, type="primary")
+        resume = False
+        if spec_run is not None and not spec_run.running() and spec_run.missing():
+            resume = col2.button(f"Resume ({len(spec_run.missing())} missing or failed)", use_container_width=True)
+        if spec_run is not None and spec_run.running():
+            if col3.button("Cancel", use_container_width=True):
+                spec_run.cancel()
 
-    if 'use_cases' in st.session_state and 'workflow' in st.session_state:
-        if st.button("Generate Use Case Specs", use_container_width=True, type="primary"):
-            # Initialize an empty list to store all use case specifications
-            use_case_specs = []
+        if generate:
+            if spec_run is not None:
+                spec_run.cancel()
+            workflow = load_artifact('workflow')
+            refresh = 'use_case_specs' in st.session_state  # generating again asks for new specs
+            spec_run = fanout.FanOutRun(
+                spec_job(workflow, refresh),
+                load_model().use_cases,
+                key=lambda use_case: use_case.id or use_case.name,
+                workers=SPEC_WORKERS,
+            )
+            st.session_state['spec_run'] = spec_run
+        if generate or resume:
+            start_fan_out('use_case_specs', spec_run)
 
-            # Create placeholders for real-time updates and accumulated results
+        if spec_run is not None and (spec_run.running() or generate or resume):
+            # Create a placeholder for real-time updates
             real_time_placeholder = st.empty()
-            accumulated_results_placeholder = st.empty()
-            accumulated_results = ""  # Start with an empty string to accumulate results
 
-            # Loop through each use case and generate specifications
-            for index, use_case in enumerate(st.session_state['use_cases']['use_cases']):
-                # Generate specifications for the current use case, including workflow
-                description = generate_use_case_specs(use_case, st.session_state['workflow'])
-
-                # Append the new specification to the list
-                use_case_specs.append(description)
-
-                # Display the specification being processed in real-time
-                real_time_placeholder.markdown(f"Processing use case {index + 1}/{len(st.session_state['use_cases']['use_cases'])}...")
-
-                # Update the accumulated results with the new specification
-                accumulated_results += f"**Use Case {index + 1}:**\n{description}\n\n"
-                accumulated_results_placeholder.markdown(accumulated_results)
+            # Show each specification as its checkpoint arrives, in use case order
+            with profiling.profiled("spec_rendering", profiling_enabled()):
+                watch_spec_run(spec_run, real_time_placeholder)
 
             # Clear the real-time placeholder once all specs are processed
             real_time_placeholder.empty()
+            if spec_run.missing():
+                st.rerun()  # refresh the buttons so Resume is offered
 
-            # Update session state with all generated use case specifications
-            st.session_state['use_case_specs'] = use_case_specs
+        if spec_run is not None and not spec_run.running():
+            # The run may have ended between reruns, e.g. after Cancel, without being watched
+            finish_fan_out('use_case_specs', spec_run)
+            if not spec_run.missing():
+                if st.session_state.get('use_case_specs_run') is not spec_run:
+                    # Update session state with all generated use case specifications
+                    save_artifact('use_case_specs', spec_run.values())
+                    st.session_state['use_case_specs_run'] = spec_run
+                    st.success("All use case specifications have been generated successfully!")
+            else:
+                failed = [f"- {use_case.name}: {spec_run.result(use_case)['error']}" for use_case in spec_run.failed()]
+                st.warning(f"{len(spec_run.done())}/{len(spec_run.items)} use case specifications generated. Resume to generate the rest." + ("\n\nFailed:\n" + "\n".join(failed) if failed else ""))
 
-            # Display a completion message or any additional information
-            st.success("All use case specifications have been generated successfully!")
-    # # Display the generated use case specifications
-    # if 'use_case_specs' in st.session_state:
-    #     st.write("### Generated Use Case Specifications:")
-    #     for spec in st.session_state['use_case_specs']:
-    #         st.text(spec)
-
-    if 'permission_matrix' in st.session_state:
-        st.write("### Generated Permission Matrix:")
-        st.markdown(st.session_state['permission_matrix'])
+    if 'use_case_specs' in st.session_state:
+        test_case_run = st.session_state.get('test_case_run')
+        col1, col2, col3 = st.columns(3)
+        if col1.button("Generate Test Cases", use_container_width=True, type="primary"):
+            items = list(zip(load_model().use_cases, load_artifact('use_case_specs')))
+            if test_case_run is None:
+                test_case_run = fanout.FanOutRun(
+                    scheduler.bind(progress_tracker().bind('test_cases', lambda item: run_job("test_cases", {"use_case": use_case_args(item[0]), "spec": item[1]}, scheduler.priority_for('test_cases')))),
+                    items,
+                    key=lambda item: test_cases.spec_key(*item),
+                    workers=TEST_CASE_WORKERS,
+                )
+                st.session_state['test_case_run'] = test_case_run
+            else:
+                test_case_run.update(items)  # keeps the test cases of unchanged specs
+            start_fan_out('test_cases', test_case_run)
+        if test_case_run is not None and test_case_run.running():
+            if col3.button("Cancel test cases", use_container_width=True):
+                test_case_run.cancel()
+        if test_case_run is not None:
+            # The run goes on in the background; only this fragment polls it
+            polling = test_case_run.running()
+            st.fragment(show_test_case_run, run_every=TEST_CASE_REFRESH if polling else None)(test_case_run, polling)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
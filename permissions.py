@@ -0,0 +1,128 @@
+"""Compact actor x use case permission matrix.
+
+Cells are stored in a NumPy int8 grid (one row per use case, one column per
+actor) so large matrices can be assembled from tiles, queried and rendered to
+markdown or Word without re-parsing text. NumPy is imported on first use,
+so importing this module (and the app) stays cheap.
+"""
+import validators
+
+UNKNOWN, DENIED, ALLOWED, ALLOWED_OWN = -1, 0, 1, 2
+SYMBOLS = {DENIED: "X", ALLOWED: "O", ALLOWED_OWN: "O*", UNKNOWN: "?"}
+CODES = {"X": DENIED, "O": ALLOWED, "O*": ALLOWED_OWN}
+
+
+def use_case_label(use_case):
+    """Label used for a (UC_ID, UC_Name) pair in the first column of the matrix."""
+    return f"{use_case[0]} {use_case[1]}"
+
+
+class PermissionMatrix:
+    """Permissions of ``actors`` (columns) on ``use_cases`` (rows of (UC_ID, UC_Name))."""
+
+    def __init__(self, actors, use_cases, grid=None):
+        self.actors = list(actors)
+        self.use_cases = list(use_cases)
+        if grid is None:
+            import numpy as np
+            grid = np.full((len(self.use_cases), len(self.actors)), UNKNOWN, dtype=np.int8)
+        self.grid = grid
+        self._actor_index = {validators.normalize(actor): index for index, actor in enumerate(self.actors)}
+        self._use_case_index = {}
+        for index, (uc_id, uc_name) in enumerate(self.use_cases):
+            self._use_case_index[validators.normalize(uc_id)] = index
+            self._use_case_index[validators.normalize(uc_name)] = index
+            self._use_case_index[validators.normalize(use_case_label((uc_id, uc_name)))] = index
+
+    @classmethod
+    def from_markdown(cls, md_text, actor_objects, use_case_table):
+        """Build a matrix from a markdown permission table and the actor and use case tables."""
+        matrix = cls(validators.object_names(actor_objects), validators.use_case_names(use_case_table))
+        table = validators.parse_table(md_text)
+        if table is not None:
+            matrix.fill(table)
+        return matrix
+
+    def actor_index(self, actor):
+        return self._actor_index.get(validators.normalize(actor))
+
+    def use_case_index(self, use_case):
+        """Find a use case row by UC_ID, UC_Name or a label starting with the UC_ID."""
+        key = validators.normalize(use_case)
+        if key in self._use_case_index:
+            return self._use_case_index[key]
+        for index, (uc_id, _) in enumerate(self.use_cases):
+            if key.startswith(validators.normalize(uc_id) + " "):
+                return index
+        return None
+
+    def fill(self, table):
+        """Copy the cells of a parsed markdown table (or tile) into the grid. Unknown rows and actors are ignored."""
+        columns = [self.actor_index(heading) for heading in table.header[1:]]
+        for row in table.rows:
+            if not row:
+                continue
+            row_index = self.use_case_index(row[0])
+            if row_index is None:
+                continue
+            for column, cell in zip(columns, row[1:]):
+                code = CODES.get(cell.replace(" ", ""))
+                if column is not None and code is not None:
+                    self.grid[row_index, column] = code
+
+    def incomplete_use_cases(self):
+        """Use cases that still have unknown cells."""
+        import numpy as np
+        rows = np.flatnonzero((self.grid == UNKNOWN).any(axis=1))
+        return [self.use_cases[index] for index in rows]
+
+    def permission(self, actor, use_case):
+        """Return "O", "O*", "X" or "?" for one cell."""
+        row, column = self.use_case_index(use_case), self.actor_index(actor)
+        if row is None or column is None:
+            raise KeyError(f"Unknown actor or use case: {actor!r}, {use_case!r}")
+        return SYMBOLS[int(self.grid[row, column])]
+
+    def actors_for(self, use_case, own_items=True):
+        """Actors that may perform a use case. With ``own_items`` False, O* (own items only) is excluded."""
+        row = self.use_case_index(use_case)
+        if row is None:
+            raise KeyError(f"Unknown use case: {use_case!r}")
+        import numpy as np
+        allowed = (self.grid[row] == ALLOWED) | (own_items & (self.grid[row] == ALLOWED_OWN))
+        return [self.actors[index] for index in np.flatnonzero(allowed)]
+
+    def use_cases_for(self, actor, own_items=True):
+        """Use cases an actor may perform, as (UC_ID, UC_Name) pairs."""
+        column = self.actor_index(actor)
+        if column is None:
+            raise KeyError(f"Unknown actor: {actor!r}")
+        import numpy as np
+        allowed = (self.grid[:, column] == ALLOWED) | (own_items & (self.grid[:, column] == ALLOWED_OWN))
+        return [self.use_cases[index] for index in np.flatnonzero(allowed)]
+
+    def rows(self):
+        """Yield the matrix as lists of cell text, header first."""
+        yield ["Use Case"] + self.actors
+        for use_case, cells in zip(self.use_cases, self.grid):
+            yield [use_case_label(use_case)] + [SYMBOLS[int(code)] for code in cells]
+
+    def to_markdown(self):
+        """Render the matrix as a markdown table."""
+        header, *rows = self.rows()
+        return validators.Table(header, rows).render()
+
+    def to_docx(self, document=None):
+        """Add the matrix as a table to a python-docx ``document`` (a new one if not given) and return it."""
+        from docx import Document
+        if document is None:
+            document = Document()
+        header, *rows = self.rows()
+        table = document.add_table(rows=1, cols=len(header))
+        table.style = "Table Grid"
+        for cell, text in zip(table.rows[0].cells, header):
+            cell.text = text
+        for row in rows:
+            for cell, text in zip(table.add_row().cells, row):
+                cell.text = text
+        return document
@@ -0,0 +1,166 @@
+"""Run the whole minutes-to-requirements pipeline without the Streamlit UI.
+
+Used for regression and performance runs: record a run once against the live
+API, then replay it offline and compare artifacts and stage timings.
+
+    python pipeline.py "Meeting transcript 01 - Simple Sausage QCS.docx" --cassette run.jsonl --mode record --out baseline.json
+    python pipeline.py "Meeting transcript 01 - Simple Sausage QCS.docx" --cassette run.jsonl --mode replay --speed 0 --baseline baseline.json
+"""
+import argparse
+import dataclasses
+import json
+import sys
+import time
+import artifacts
+import diagrams
+import fanout
+import ingest
+import llm
+import main
+import progress
+import replay
+import scheduler
+
+
+# Stages of a run, in order
+STAGES = ['plan', 'data_objects', 'actor_objects', 'external_systems', 'workflow', 'state_transitions',
+          'use_case_table', 'permission_matrix', 'use_case_specs', 'test_cases']
+
+
+class Cancelled(Exception):
+    """Raised by ``run_pipeline`` when its ``cancelled`` event is set."""
+
+
+def run_pipeline(transcript_text, cancelled=None, on_stage=None, make_plan=None, tracker=None):
+    """Generate every artifact for a transcript, in the order the UI offers them.
+
+    Returns the artifacts and the wall time of each stage in seconds. If the
+    ``cancelled`` event is set, the run stops at the next stage with
+    Cancelled. ``on_stage(name)`` is called after each stage, and
+    ``make_plan()`` replaces the plan generated from the transcript. Stage
+    status, tokens and ETA are reported to ``tracker`` (a progress.Tracker).
+    """
+    outputs, timings = {}, {}
+    tracker = tracker or progress.Tracker(STAGES)
+
+    def stage(name, fn):
+        if cancelled is not None and cancelled.is_set():
+            raise Cancelled(name)
+        start = time.perf_counter()
+        with tracker.stage(name):
+            outputs[name] = fn()
+        timings[name] = time.perf_counter() - start
+        if on_stage is not None:
+            on_stage(name)
+        return outputs[name]
+
+    def fan_out(name, run):
+        if cancelled is not None and cancelled.is_set():
+            raise Cancelled(name)
+        start = time.perf_counter()
+        tracker.start(name, total=len(run.items), workers=run.workers)
+        run.start()
+        while not run.wait(timeout=0.5):
+            if cancelled is not None and cancelled.is_set():
+                run.cancel()
+                tracker.finish(name, progress.CANCELLED)
+                raise Cancelled(name)
+        failed = len(run.failed())
+        tracker.finish(name, progress.FAILED if failed else progress.DONE, f"{failed} of {len(run.items)} items failed" if failed else None)
+        timings[name] = time.perf_counter() - start
+        if on_stage is not None:
+            on_stage(name)
+
+    plan = stage('plan', make_plan or (lambda: main.generate_plan(transcript_text)))
+    if not plan:
+        raise RuntimeError("Failed to generate Requirement Plan.")
+    # The same requests as the UI buttons, so a prefetch run warms the cache the UI reads
+    instructions = main.OBJECT_TABLE_INSTRUCTIONS
+    object_table = lambda name: main.repair_object_table(main.generate_table(plan, instructions[name]), plan, instructions[name])[0]
+    data_objects = stage('data_objects', lambda: object_table('data_objects'))
+    actor_objects = stage('actor_objects', lambda: object_table('actor_objects'))
+    stage('external_systems', lambda: object_table('external_systems'))
+
+    workflow, workflow_graph = stage('workflow', lambda: diagrams.split_graph(main.generate_workflow(plan, actor_objects)))
+    outputs['workflow'], outputs['workflow_graph'] = workflow, workflow_graph and dataclasses.asdict(workflow_graph)
+    state_transitions, state_graph = stage('state_transitions', lambda: diagrams.split_graph(main.generate_state_transitions(plan, data_objects)))
+    outputs['state_transitions'], outputs['state_graph'] = state_transitions, state_graph and dataclasses.asdict(state_graph)
+
+    use_case_table = stage('use_case_table', lambda: main.repair_use_case_table(main.generate_use_case_table(plan, actor_objects), plan, actor_objects)[0])
+    stage('permission_matrix', lambda: main.repair_permission_matrix(main.generate_permission_matrix(actor_objects, use_case_table), actor_objects, use_case_table)[0])
+
+    use_cases = artifacts.use_cases_from_markdown(use_case_table)
+    spec_run = fanout.FanOutRun(
+        scheduler.bind(tracker.bind('use_case_specs', lambda use_case: main.generate_use_case_specs(use_case, workflow))),
+        use_cases,
+        key=lambda use_case: use_case.id,
+        workers=main.SPEC_WORKERS,
+    )
+    fan_out('use_case_specs', spec_run)
+    outputs['use_case_specs'] = {
+        use_case.id: {name: value for name, value in spec_run.result(use_case).items() if name != 'seconds'}
+        for use_case in use_cases
+    }
+
+    items = [(use_case, spec_run.result(use_case)['value']) for use_case in spec_run.done()]
+    test_case_run = fanout.FanOutRun(
+        scheduler.bind(tracker.bind('test_cases', lambda item: main.generate_test_cases(*item))),
+        items,
+        key=lambda item: item[0].id,
+        workers=main.TEST_CASE_WORKERS,
+    )
+    fan_out('test_cases', test_case_run)
+    outputs['test_cases'] = [row for value in test_case_run.values() for row in value]
+    return {"artifacts": outputs, "timings": timings}
+
+
+def compare(result, baseline):
+    """Lines describing artifact differences and stage timing changes against a baseline run."""
+    lines = []
+    for name, value in baseline["artifacts"].items():
+        if result["artifacts"].get(name) != value:
+            lines.append(f"artifact changed: {name}")
+    for name, seconds in baseline["timings"].items():
+        now = result["timings"].get(name)
+        if now is not None:
+            lines.append(f"{name:20s} {seconds:8.2f}s -> {now:8.2f}s ({now - seconds:+.2f}s)")
+    return lines
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("transcript", help="meeting transcript (.docx, .vtt, .srt, .txt or .pdf)")
+    parser.add_argument("--cassette", help="cassette file to record to or replay from")
+    parser.add_argument("--mode", choices=[replay.RECORD, replay.REPLAY], default=replay.REPLAY)
+    parser.add_argument("--speed", type=float, default=1.0, help="replay latency scale: 1 = as recorded, 0 = no delay")
+    parser.add_argument("--out", help="write artifacts and timings to this JSON file")
+    parser.add_argument("--baseline", help="compare against the JSON output of an earlier run")
+    parser.add_argument("--progress", action="store_true", help="print stage progress and ETA to stderr")
+    return parser.parse_args(argv)
+
+
+def run(argv=None):
+    args = parse_args(argv)
+    if args.cassette:
+        llm.cassette = replay.Cassette(args.cassette, mode=args.mode, speed=args.speed)
+    # Headless runs queue behind interactive work if they share a process with the UI
+    tracker = progress.Tracker(STAGES)
+    if args.progress:
+        tracker.subscribe(progress.printer(sys.stderr))
+    with scheduler.context(priority=scheduler.BATCH, session="pipeline"):
+        result = run_pipeline(ingest.read_transcript(args.transcript), tracker=tracker)
+    if args.out:
+        with open(args.out, "w") as file:
+            json.dump(result, file, indent=2, default=str)
+    for name, seconds in result["timings"].items():
+        print(f"{name:20s} {seconds:8.2f}s")
+    if args.baseline:
+        with open(args.baseline) as file:
+            differences = compare(json.loads(json.dumps(result, default=str)), json.load(file))
+        print("\n".join(differences))
+        return 1 if any(line.startswith("artifact changed") for line in differences) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(run())
@@ -0,0 +1,96 @@
+"""Structured diff between two versions of a requirement plan.
+
+A plan is split into components at its headings. Comparing two versions
+gives the components that were added, removed or changed, which is all a
+downstream generator needs to patch its previous artifact instead of
+regenerating it from the whole plan.
+"""
+import re
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+PREAMBLE = "(introduction)"  # text before the first component heading
+
+_HEADING = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+
+
+def split_components(plan):
+    """Components of a plan as an ordered {title: text} dict.
+
+    Components start at the shallowest heading level that occurs more than
+    once, so a single document title above them is kept in the preamble.
+    A title used again is numbered: "Reports", "Reports (2)".
+    """
+    lines = (plan or "").splitlines()
+    levels = [len(match.group(1)) for match in map(_HEADING.match, lines) if match]
+    repeated = sorted(level for level in set(levels) if levels.count(level) > 1)
+    level = repeated[0] if repeated else min(levels, default=None)
+    components = OrderedDict()
+    title, body = PREAMBLE, []
+
+    def add(title, body):
+        # A repeated title gets an ordinal, e.g. "Reports (2)", so no component is lost
+        unique, number = title, 1
+        while unique in components:
+            number += 1
+            unique = f"{title} ({number})"
+        components[unique] = "\n".join(body).strip()
+
+    for line in lines:
+        match = _HEADING.match(line)
+        if match and len(match.group(1)) == level:
+            if title != PREAMBLE or "".join(body).strip():
+                add(title, body)
+            title, body = match.group(2).strip(), []
+        else:
+            body.append(line)
+    if title != PREAMBLE or "".join(body).strip():
+        add(title, body)
+    return components
+
+
+def _normalize(text):
+    return re.sub(r"[\s*_`]+", " ", text).strip().lower()
+
+
+@dataclass
+class PlanDiff:
+    added: dict = field(default_factory=dict)  # title -> text
+    removed: dict = field(default_factory=dict)  # title -> text
+    changed: dict = field(default_factory=dict)  # title -> (old text, new text)
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.changed)
+
+    def summary(self):
+        """One line naming the affected components, for display."""
+        parts = [f"{label}: {', '.join(titles)}" for label, titles in
+                 (("added", self.added), ("removed", self.removed), ("changed", self.changed)) if titles]
+        return "; ".join(parts) or "no changes"
+
+    def to_markdown(self):
+        """The delta as markdown, for a patch prompt."""
+        sections = []
+        for title, text in self.added.items():
+            sections.append(f"### Added component: {title}\n{text}")
+        for title, text in self.removed.items():
+            sections.append(f"### Removed component: {title}\n{text}")
+        for title, (old, new) in self.changed.items():
+            sections.append(f"### Changed component: {title}\nBefore:\n{old}\n\nAfter:\n{new}")
+        return "\n\n".join(sections)
+
+
+def diff_plans(old_plan, new_plan):
+    """Components added, removed or changed from ``old_plan`` to ``new_plan``; titles match loosely."""
+    old = {_normalize(title): (title, text) for title, text in split_components(old_plan).items()}
+    new = {_normalize(title): (title, text) for title, text in split_components(new_plan).items()}
+    diff = PlanDiff()
+    for key, (title, text) in new.items():
+        if key not in old:
+            diff.added[title] = text
+        elif _normalize(old[key][1]) != _normalize(text):
+            diff.changed[title] = (old[key][1], text)
+    for key, (title, text) in old.items():
+        if key not in new:
+            diff.removed[title] = text
+    return diff
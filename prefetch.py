@@ -0,0 +1,77 @@
+"""Background pre-warming of every artifact right after a transcript is uploaded.
+
+A ``Prefetch`` runs the headless pipeline on a background thread at BULK
+priority, so it only uses request slots that interactive work leaves free.
+Every completion it makes lands in the shared ``llm.cache``; when the user
+then clicks a button, the UI sends the same request and is answered from
+the cache at once. Cancelling stops the run at the next stage (queued
+specs and test cases are dropped; calls already sent finish).
+
+The UI turns prefetch off when jobs run on worker processes
+(AGENT_SIMON_QUEUE): the buttons then read the workers' disk store, not
+this process's cache, so a prefetch here would only double the requests.
+"""
+import threading
+import time
+
+import pipeline
+import progress
+import scheduler
+
+RUNNING, DONE, FAILED, CANCELLED = "running", "done", "failed", "cancelled"
+
+
+class Prefetch:
+    """Prefetch the artifacts of one upload. ``key`` identifies the upload (e.g. the transcript digests)."""
+
+    def __init__(self, key, transcript_text=None, make_plan=None, session=None):
+        self.key = key
+        self.transcript_text = transcript_text
+        self.make_plan = make_plan
+        self.session = session
+        self.stages = []  # stages finished, in order
+        self.tracker = progress.Tracker(pipeline.STAGES)
+        self.status = None
+        self.error = None
+        self.seconds = 0.0
+        self._cancel = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start the run on a background thread. Does nothing if it was started already."""
+        if self._thread is not None:
+            return
+        self.status = RUNNING
+        self._thread = threading.Thread(target=self._run, name=f"prefetch-{self.key}", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        start = time.perf_counter()
+        try:
+            with scheduler.context(priority=scheduler.BULK, session=self.session):
+                pipeline.run_pipeline(self.transcript_text, cancelled=self._cancel, on_stage=self.stages.append,
+                                      make_plan=self.make_plan, tracker=self.tracker)
+        except pipeline.Cancelled:
+            self.status = CANCELLED
+        except Exception as e:
+            self.status, self.error = FAILED, f"{type(e).__name__}: {e}"
+        else:
+            self.status = DONE
+        self.seconds = time.perf_counter() - start
+
+    def cancel(self):
+        self._cancel.set()
+
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def summary(self):
+        """One line describing the run, for display."""
+        done = ", ".join(self.stages) or "nothing yet"
+        if self.status == RUNNING:
+            return f"Prefetching in the background. Ready: {done}"
+        if self.status == FAILED:
+            return f"Prefetch failed after {done}: {self.error}"
+        if self.status == CANCELLED:
+            return f"Prefetch cancelled. Ready: {done}"
+        return f"Prefetched everything in {self.seconds:.0f}s"
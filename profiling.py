@@ -0,0 +1,144 @@
+"""Opt-in profiling of the local (non-LLM) hot path.
+
+Code wrapped in ``profiled(stage)`` runs under cProfile and tracemalloc
+while a sampling thread records its call stacks. For every profiled block
+two files are written to PROFILE_DIR:
+
+    <timestamp>-<stage>.pstats   cProfile stats (python -m pstats, snakeviz)
+    <timestamp>-<stage>.folded   collapsed stacks (flamegraph.pl, speedscope)
+
+and a summary with the top hotspots is kept in ``recent`` for display.
+Profiling is off unless AGENT_SIMON_PROFILE=1 or the caller enables it.
+Blocks that overlap on different threads share tracemalloc, so the peak
+memory of each is the process's peak while it ran.
+"""
+import cProfile
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, deque
+from contextlib import contextmanager
+
+ENABLED = os.environ.get("AGENT_SIMON_PROFILE") == "1"
+PROFILE_DIR = os.environ.get("AGENT_SIMON_PROFILE_DIR", "profiles")
+SAMPLE_INTERVAL = 0.002  # seconds between stack samples
+TOP_FUNCTIONS = 10
+
+recent = deque(maxlen=50)
+_active = threading.local()
+# tracemalloc is process-wide: profiled blocks on different threads share it
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+_tracing_started = False  # tracing was started here, not by someone else
+
+
+def _start_tracing():
+    """Start tracemalloc for a block unless it is tracing already; returns the traced memory now."""
+    global _tracing_users, _tracing_started
+    with _tracing_lock:
+        if _tracing_users == 0:
+            _tracing_started = not tracemalloc.is_tracing()
+            if _tracing_started:
+                tracemalloc.start()
+            # Only reset when no other block is measuring, so their peaks are never lowered
+            tracemalloc.reset_peak()
+        _tracing_users += 1
+        return tracemalloc.get_traced_memory()[0]
+
+
+def _stop_tracing():
+    """Release tracemalloc; the last block out stops it if it was started here. Returns the peak traced memory."""
+    global _tracing_users, _tracing_started
+    with _tracing_lock:
+        peak = tracemalloc.get_traced_memory()[1]
+        _tracing_users -= 1
+        if _tracing_users == 0 and _tracing_started:
+            tracemalloc.stop()
+            _tracing_started = False
+        return peak
+
+
+class _StackSampler(threading.Thread):
+    """Samples the call stack of one thread into collapsed-stack counts."""
+
+    def __init__(self, thread_id):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(SAMPLE_INTERVAL):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def _hotspots(profiler):
+    stats = pstats.Stats(profiler)
+    rows = []
+    for (filename, line, name), (_, calls, tottime, cumtime, _) in stats.stats.items():
+        rows.append({
+            "function": f"{name} ({os.path.basename(filename)}:{line})",
+            "calls": calls,
+            "tottime": tottime,
+            "cumtime": cumtime,
+        })
+    return sorted(rows, key=lambda row: row["tottime"], reverse=True)[:TOP_FUNCTIONS]
+
+
+@contextmanager
+def profiled(stage, enabled=None):
+    """Profile the block as ``stage`` if profiling is enabled. Nested blocks count toward the outer one."""
+    if not (ENABLED if enabled is None else enabled) or getattr(_active, "stage", None):
+        yield
+        return
+    _active.stage = stage
+    memory_before = _start_tracing()
+    sampler = _StackSampler(threading.get_ident())
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:  # another profiler is active in this process
+        _active.stage = None
+        _stop_tracing()
+        yield
+        return
+    start = time.perf_counter()
+    sampler.start()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        sampler.stop()
+        seconds = time.perf_counter() - start
+        peak = _stop_tracing() - memory_before
+        _active.stage = None
+        _write(stage, profiler, sampler.stacks, seconds, peak)
+
+
+def _write(stage, profiler, stacks, seconds, peak):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    prefix = os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{int(time.time() * 1000) % 1000:03d}-{stage}")
+    profiler.dump_stats(prefix + ".pstats")
+    with open(prefix + ".folded", "w") as file:
+        file.writelines(f"{stack} {count}\n" for stack, count in stacks.items())
+    recent.append({
+        "stage": stage,
+        "seconds": seconds,
+        "peak_bytes": peak,
+        "hotspots": _hotspots(profiler),
+        "files": [prefix + ".pstats", prefix + ".folded"],
+    })
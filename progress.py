@@ -0,0 +1,261 @@
+"""Progress of multi-stage runs: status, tokens so far and ETA of every stage.
+
+A ``Tracker`` holds the stages of one run (the UI keeps one per session,
+the pipeline one per call). Work runs inside ``tracker.stage(name)`` or,
+for the items of a fan-out, through ``tracker.bind(name, fn)``; chat
+completions made there report their tokens as they stream in. The ETA of
+a stage is the moving average of its past durations in this process, or
+for a fan-out the pace of its finished items. Listeners registered with
+``subscribe`` get every change, so the CLI and other callers can follow a
+run without the UI.
+"""
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+
+PENDING, RUNNING, DONE, FAILED, CANCELLED = "pending", "running", "done", "failed", "cancelled"
+START, ADVANCE, TOKENS, FINISH = "start", "advance", "tokens", "finish"
+
+HISTORY_SIZE = 20  # past durations averaged per stage
+
+_history = defaultdict(lambda: deque(maxlen=HISTORY_SIZE))  # stage (or "stage/item") -> seconds
+_history_lock = threading.Lock()
+_local = threading.local()
+
+
+def record_duration(name, seconds):
+    with _history_lock:
+        _history[name].append(seconds)
+
+
+def expected(name):
+    """Moving average of the past durations of a stage, or None if it never finished in this process."""
+    with _history_lock:
+        durations = list(_history[name])
+    return sum(durations) / len(durations) if durations else None
+
+
+@dataclass
+class Stage:
+    name: str
+    status: str = PENDING
+    started: float = None
+    finished: float = None
+    tokens: int = 0
+    done: int = 0  # finished items of a fan-out
+    failed: int = 0
+    total: int = None  # items of a fan-out, None for a single step
+    workers: int = 1
+    error: str = None
+
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.monotonic()) - self.started
+
+    def eta(self):
+        """Seconds until the stage is expected to finish, or None if there is nothing to go by."""
+        if self.status in (DONE, FAILED, CANCELLED):
+            return 0.0
+        if self.total is not None:
+            remaining = self.total - self.done - self.failed
+            if self.done:
+                return self.elapsed() / (self.done + self.failed) * remaining
+            item = expected(f"{self.name}/item")
+            return None if item is None else item * remaining / max(1, self.workers)
+        average = expected(self.name)
+        if average is None:
+            return None
+        return max(0.0, average - self.elapsed())
+
+    def fraction(self):
+        """Share of the stage done, between 0 and 1, for a progress bar."""
+        if self.status == DONE:
+            return 1.0
+        if self.total:
+            return (self.done + self.failed) / self.total
+        eta = self.eta()
+        if eta is None or self.status != RUNNING:
+            return 0.0
+        return min(0.99, self.elapsed() / max(self.elapsed() + eta, 1e-9))
+
+
+class Tracker:
+    """Stages of one run, in the order they were planned or started."""
+
+    def __init__(self, stages=()):
+        self.stages = {name: Stage(name) for name in stages}
+        self._listeners = []
+        self._lock = threading.RLock()  # listeners are called under it, so they see changes in order
+
+    def subscribe(self, listener):
+        """Call ``listener(event, stage)`` on every change; ``stage`` is a dict snapshot. Returns ``listener``.
+
+        The snapshot of a TOKENS event also holds the streamed ``text``, if any.
+
+        Listeners are called in order of the changes, on the thread that made
+        them, so they should be quick (print, or hand the snapshot to a queue).
+        """
+        self._listeners.append(listener)
+        return listener
+
+    def unsubscribe(self, listener):
+        self._listeners.remove(listener)
+
+    def _update(self, event, name, text=None, **changes):
+        with self._lock:
+            stage = self.stages.setdefault(name, Stage(name))
+            for field_name, value in changes.items():
+                setattr(stage, field_name, value)
+            snapshot = self._snapshot(stage)
+            if text is not None:
+                snapshot["text"] = text
+            for listener in list(self._listeners):
+                listener(event, snapshot)
+
+    def _snapshot(self, stage):
+        return {**asdict(stage), "elapsed": stage.elapsed(), "eta": stage.eta(), "fraction": stage.fraction()}
+
+    def start(self, name, total=None, workers=1):
+        """Mark a stage running. ``total`` is the number of items of a fan-out."""
+        self._update(START, name, status=RUNNING, started=time.monotonic(), finished=None, tokens=0,
+                     done=0, failed=0, total=total, workers=workers, error=None)
+
+    def advance(self, name, seconds=None, failed=False):
+        """One item of a fan-out finished (in ``seconds``)."""
+        if seconds is not None and not failed:
+            record_duration(f"{name}/item", seconds)
+        with self._lock:
+            stage = self.stages.setdefault(name, Stage(name))
+            if failed:
+                self._update(ADVANCE, name, failed=stage.failed + 1)
+            else:
+                self._update(ADVANCE, name, done=stage.done + 1)
+
+    def add_tokens(self, name, count, text=None):
+        with self._lock:
+            self._update(TOKENS, name, text, tokens=self.stages.setdefault(name, Stage(name)).tokens + count)
+
+    def finish(self, name, status=DONE, error=None):
+        stage = self.stages.get(name)
+        finished = time.monotonic()
+        if status == DONE and stage is not None and stage.started is not None:
+            record_duration(name, finished - stage.started)
+        self._update(FINISH, name, status=status, finished=finished, error=error)
+
+    @contextmanager
+    def stage(self, name, total=None, workers=1):
+        """Run a block as stage ``name``; tokens of completions made in it are counted for the stage."""
+        self.start(name, total, workers)
+        try:
+            with self.attached(name):
+                yield
+        except BaseException as e:
+            self.finish(name, FAILED, f"{type(e).__name__}: {e}")
+            raise
+        failed = self.stages[name].failed
+        self.finish(name, FAILED if failed else DONE, f"{failed} of {total} items failed" if failed else None)
+
+    def run(self, name, fn, *args):
+        """``fn(*args)`` as stage ``name``; returns its result."""
+        with self.stage(name):
+            return fn(*args)
+
+    @contextmanager
+    def attached(self, name):
+        """Count the tokens of completions made by this thread in the block for stage ``name``."""
+        previous = getattr(_local, "current", None)
+        _local.current = (self, name)
+        try:
+            yield
+        finally:
+            _local.current = previous
+
+    def bind(self, name, fn):
+        """Wrap the per-item function of a fan-out so every item counts for stage ``name``."""
+        def wrapped(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                with self.attached(name):
+                    result = fn(*args, **kwargs)
+            except Exception:
+                self.advance(name, failed=True)
+                raise
+            self.advance(name, time.perf_counter() - start)
+            return result
+        return wrapped
+
+    def snapshot(self):
+        """Every stage as a dict with its elapsed time, ETA and fraction done, in order."""
+        with self._lock:
+            return [self._snapshot(stage) for stage in self.stages.values()]
+
+    def get(self, name):
+        """Snapshot of one stage."""
+        with self._lock:
+            return self._snapshot(self.stages.setdefault(name, Stage(name)))
+
+    def running(self):
+        return any(stage.status == RUNNING for stage in self.stages.values())
+
+    def eta(self):
+        """Seconds until every planned stage is expected to be done, or None if some stage has no history."""
+        total = 0.0
+        for stage in self.snapshot():
+            if stage["status"] in (DONE, FAILED, CANCELLED):
+                continue
+            eta = stage["eta"] if stage["status"] == RUNNING else expected(stage["name"])
+            if eta is None:
+                return None
+            total += eta
+        return total
+
+
+def bind(fn):
+    """Wrap ``fn`` so completions it makes, e.g. on a worker thread, count for the caller's stage."""
+    current = getattr(_local, "current", None)
+    if current is None:
+        return fn
+
+    def bound(*args, **kwargs):
+        with current[0].attached(current[1]):
+            return fn(*args, **kwargs)
+    return bound
+
+
+def add_tokens(count, text=None):
+    """Report ``count`` completion tokens (and the ``text`` they streamed) for the stage this thread is working on, if any."""
+    current = getattr(_local, "current", None)
+    if current is not None and (count or text):
+        tracker, name = current
+        tracker.add_tokens(name, count, text)
+
+
+def format_seconds(seconds):
+    if seconds is None:
+        return "?"
+    seconds = int(round(seconds))
+    return f"{seconds // 60}m{seconds % 60:02d}s" if seconds >= 60 else f"{seconds}s"
+
+
+def describe(stage):
+    """One line for a stage snapshot, e.g. for a CLI or a progress bar."""
+    items = f" {stage['done']}/{stage['total']}" if stage["total"] is not None else ""
+    failed = f" ({stage['failed']} failed)" if stage["failed"] else ""
+    text = f"{stage['name']}: {stage['status']}{items}{failed}, {stage['tokens']} tokens, {format_seconds(stage['elapsed'])}"
+    if stage["status"] == RUNNING:
+        text += f", about {format_seconds(stage['eta'])} left"
+    if stage["error"]:
+        text += f" - {stage['error']}"
+    return text
+
+
+def printer(file):
+    """A listener that prints stage starts, finishes and fan-out items to ``file``."""
+    def listener(event, stage):
+        if event != TOKENS:
+            file.write(describe(stage) + "\n")
+            file.flush()
+    return listener
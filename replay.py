@@ -0,0 +1,94 @@
+"""Record and replay of chat completion requests.
+
+In record mode every request sent through ``llm`` is written to a cassette
+file (JSON lines) with its response and latency. In replay mode the responses
+are served back from the cassette without network access, with the original
+latency scaled by ``speed`` (1.0 = as recorded, 0 = no delay).
+
+Configure through the environment or with ``llm.cassette = Cassette(...)``:
+    AGENT_SIMON_CASSETTE=run.jsonl AGENT_SIMON_CASSETTE_MODE=record|replay AGENT_SIMON_REPLAY_SPEED=0
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+
+RECORD, REPLAY = "record", "replay"
+
+
+class CassetteMiss(KeyError):
+    """Raised in replay mode when a request was not recorded."""
+
+
+def request_key(request):
+    """Key of a request for matching on replay. ``max_tokens`` is left out because it is sized adaptively."""
+    content = json.dumps({name: value for name, value in request.items() if name != "max_tokens"}, sort_keys=True, default=str)
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+class Cassette:
+    def __init__(self, path, mode=REPLAY, speed=1.0):
+        if mode not in (RECORD, REPLAY):
+            raise ValueError(f"Unknown cassette mode: {mode!r}")
+        self.path = path
+        self.mode = mode
+        self.speed = speed
+        self._lock = threading.Lock()
+        self._responses = defaultdict(deque)
+        self._last = {}
+        self._start = time.perf_counter()
+        if mode == REPLAY:
+            self._load()
+        else:
+            open(path, "w").close()
+
+    def _load(self):
+        with open(self.path) as file:
+            for line in file:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._responses[entry["key"]].append(entry)
+
+    def record(self, request, response, latency):
+        """Append one request/response pair to the cassette."""
+        entry = {
+            "key": request_key(request),
+            "request": request,
+            "response": response,
+            "latency": latency,
+            "offset": time.perf_counter() - self._start - latency,
+        }
+        with self._lock, open(self.path, "a") as file:
+            file.write(json.dumps(entry, default=str) + "\n")
+
+    def replay(self, request):
+        """Return the recorded response for a request, after its scaled latency.
+
+        Identical requests are served in recorded order; once they run out the
+        last response is repeated.
+        """
+        key = request_key(request)
+        with self._lock:
+            if self._responses[key]:
+                entry = self._last[key] = self._responses[key].popleft()
+            elif key in self._last:
+                entry = self._last[key]
+            else:
+                raise CassetteMiss(f"Request not in cassette {self.path}: {json.dumps(request, default=str)[:200]}")
+        if self.speed:
+            time.sleep(entry["latency"] * self.speed)
+        return entry["response"]
+
+
+def from_env():
+    """Cassette configured by the environment, or None."""
+    path = os.environ.get("AGENT_SIMON_CASSETTE")
+    if not path:
+        return None
+    return Cassette(
+        path,
+        mode=os.environ.get("AGENT_SIMON_CASSETTE_MODE", REPLAY),
+        speed=float(os.environ.get("AGENT_SIMON_REPLAY_SPEED", 1.0)),
+    )
@@ -0,0 +1,163 @@
+"""Priority scheduling of LLM requests across sessions and pipeline stages.
+
+At most ``slots`` requests are in flight at once. When a slot frees up the
+waiting request with the best class goes next:
+
+    INTERACTIVE  plan, tables, repairs: a user is waiting on the button
+    WORKFLOW     diagrams and permission tiles
+    BULK         use case specs fanned out in the background
+    BATCH        headless pipeline runs
+
+Within a class the session with the fewest requests in flight goes first, so
+one session's batch cannot take every slot, and requests are served in
+arrival order after that. A waiting request moves up one class for every
+``aging`` seconds it has waited, so low classes are never starved.
+"""
+import itertools
+import math
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+INTERACTIVE, WORKFLOW, BULK, BATCH = 0, 1, 2, 3
+CLASS_NAMES = {INTERACTIVE: "interactive", WORKFLOW: "workflow", BULK: "bulk", BATCH: "batch"}
+
+# Default class of each llm stage; stages not listed are interactive
+STAGE_PRIORITY = {
+    "workflow": WORKFLOW,
+    "state_transitions": WORKFLOW,
+    "permission_tile": WORKFLOW,
+    "use_case_specs": BULK,
+    "test_cases": BULK,
+}
+
+AGING_SECONDS = 20.0
+WAIT_HISTORY = 200  # recent waits kept per class for the percentiles
+
+_context = threading.local()
+
+
+@dataclass
+class _Ticket:
+    priority: int
+    session: str
+    enqueued: float
+    sequence: int
+    granted: bool = field(default=False)
+
+
+def current():
+    """(priority, session) set for the current thread, either may be None."""
+    return getattr(_context, "priority", None), getattr(_context, "session", None)
+
+
+@contextmanager
+def context(priority=None, session=None):
+    """Run the block on behalf of ``session``, with requests no higher than ``priority``."""
+    previous = current()
+    _context.priority = previous[0] if priority is None else priority
+    _context.session = previous[1] if session is None else session
+    try:
+        yield
+    finally:
+        _context.priority, _context.session = previous
+
+
+def set_session(session):
+    """Attribute the requests of the current thread to ``session``."""
+    _context.session = session
+
+
+def bind(fn):
+    """Wrap ``fn`` so it runs under the caller's scheduling context, e.g. on a worker thread."""
+    priority, session = current()
+
+    def bound(*args, **kwargs):
+        with context(priority, session):
+            return fn(*args, **kwargs)
+    return bound
+
+
+def priority_for(stage):
+    """Class of a request for ``stage``; a context priority can only lower it."""
+    priority = STAGE_PRIORITY.get(stage, INTERACTIVE)
+    context_priority = current()[0]
+    return priority if context_priority is None else max(priority, context_priority)
+
+
+class Scheduler:
+    def __init__(self, slots=8, aging=AGING_SECONDS):
+        self.slots = slots
+        self.aging = aging
+        self._condition = threading.Condition()
+        self._waiting = []
+        self._running = 0
+        self._in_flight = Counter()  # session -> requests running
+        self._sequence = itertools.count()
+        self._stats = {
+            priority: {"running": 0, "completed": 0, "wait_seconds": 0.0, "waits": deque(maxlen=WAIT_HISTORY)}
+            for priority in CLASS_NAMES
+        }
+
+    def _rank(self, ticket, now):
+        aged = max(INTERACTIVE, ticket.priority - int((now - ticket.enqueued) // self.aging))
+        return aged, self._in_flight[ticket.session], ticket.sequence
+
+    def _dispatch(self):
+        """Grant free slots to the best waiting tickets. Called with the condition held."""
+        now = time.monotonic()
+        granted = False
+        while self._running < self.slots and self._waiting:
+            ticket = min(self._waiting, key=lambda ticket: self._rank(ticket, now))
+            self._waiting.remove(ticket)
+            ticket.granted = True
+            self._running += 1
+            self._in_flight[ticket.session] += 1
+            granted = True
+        if granted:
+            self._condition.notify_all()
+
+    @contextmanager
+    def slot(self, priority=INTERACTIVE, session=None):
+        """Hold one request slot for the block, waiting for it by priority."""
+        with self._condition:
+            ticket = _Ticket(priority, session, time.monotonic(), next(self._sequence))
+            self._waiting.append(ticket)
+            self._dispatch()
+            while not ticket.granted:
+                self._condition.wait()
+            wait = time.monotonic() - ticket.enqueued
+            stats = self._stats[priority]
+            stats["running"] += 1
+            stats["wait_seconds"] += wait
+            stats["waits"].append(wait)
+        try:
+            yield wait
+        finally:
+            with self._condition:
+                self._running -= 1
+                self._in_flight[session] -= 1
+                if not self._in_flight[session]:
+                    del self._in_flight[session]
+                stats["running"] -= 1
+                stats["completed"] += 1
+                self._dispatch()
+
+    def stats(self):
+        """Queue depth, requests running and wait times per class, for display."""
+        with self._condition:
+            depth = Counter(ticket.priority for ticket in self._waiting)
+            summary = {}
+            for priority, stats in self._stats.items():
+                waits = sorted(stats["waits"])
+                started = stats["running"] + stats["completed"]
+                summary[CLASS_NAMES[priority]] = {
+                    "waiting": depth[priority],
+                    "running": stats["running"],
+                    "completed": stats["completed"],
+                    "mean_wait": stats["wait_seconds"] / started if started else 0.0,
+                    "p95_wait": waits[math.ceil(0.95 * (len(waits) - 1))] if waits else 0.0,
+                }
+            return summary
@@ -0,0 +1,97 @@
+"""Local scoring of alternative candidates for the same artifact.
+
+With ``temperature`` above zero the use case table and the workflow differ
+from one generation to the next. Several candidates are requested at once
+and ranked here without another LLM call, by structural validity, by how
+many of the actors (and data objects) they cover, and by how much each one
+agrees with the others (self-consistency: content most candidates share is
+less likely to be made up).
+"""
+import diagrams
+import transcripts
+import validators
+
+# Weights of the score parts; each part is between 0 and 1
+WEIGHTS = {"validity": 0.4, "actor_coverage": 0.25, "object_coverage": 0.15, "agreement": 0.2}
+
+
+def coverage(text, names):
+    """Share of ``names`` mentioned in ``text`` (1.0 if there are no names to cover)."""
+    if not names:
+        return 1.0
+    text = validators.normalize(text)
+    return sum(validators.normalize(name) in text for name in names) / len(names)
+
+
+def _jaccard(a, b):
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+def score_use_case_table(md_text, actor_objects, data_objects=""):
+    """Score parts of a use case table candidate (before agreement)."""
+    table, defects = validators.validate_use_case_table(md_text)
+    if table is None or any(defect.kind == "structure" for defect in defects):
+        validity = 0.0
+    else:
+        validity = 1.0 - len(defects) / max(1, len(table.rows))
+    return {
+        "validity": max(0.0, validity),
+        "actor_coverage": coverage(md_text, validators.object_names(actor_objects)),
+        "object_coverage": coverage(md_text, validators.object_names(data_objects or "")),
+        "defects": len(defects),
+    }
+
+
+def _graph_checks(graph, actors):
+    """Fraction of the structural checks a workflow graph passes."""
+    if graph is None or not graph.nodes:
+        return 0.0
+    kinds = {node.get("kind") for node in graph.nodes}
+    ids = [str(node["id"]) for node in graph.nodes]
+    # Every node should be reachable from a start node
+    following = {node_id: [] for node_id in ids}
+    for edge in graph.edges:
+        following[str(edge["source"])].append(str(edge["target"]))
+    reached = {str(node["id"]) for node in graph.nodes if node.get("kind") == "start"} or {ids[0]}
+    pending = list(reached)
+    while pending:
+        for target in following[pending.pop()]:
+            if target not in reached:
+                reached.add(target)
+                pending.append(target)
+    names = {validators.normalize(actor) for actor in actors}
+    lanes = [lane for lane in graph.lanes if validators.normalize(lane) in names]
+    checks = [
+        "start" in kinds,
+        "end" in kinds,
+        bool(graph.edges),
+        len(reached) / len(ids),
+        len(lanes) / len(graph.lanes) if graph.lanes and names else 1.0,
+    ]
+    return sum(checks) / len(checks)
+
+
+def score_workflow(text, actor_objects, data_objects=""):
+    """Score parts of a workflow candidate (before agreement)."""
+    _, graph = diagrams.split_graph(text)
+    actors = validators.object_names(actor_objects)
+    return {
+        "validity": _graph_checks(graph, actors),
+        "actor_coverage": coverage(text, actors),
+        "object_coverage": coverage(text, validators.object_names(data_objects or "")),
+        "defects": 0 if graph is not None else 1,
+    }
+
+
+def rank(candidates, score, actor_objects, data_objects=""):
+    """Candidates as ``[(text, parts)]``, best first, with ``parts["score"]`` the weighted total."""
+    tokens = [set(transcripts.tokenize(text)) for text in candidates]
+    ranked = []
+    for index, text in enumerate(candidates):
+        parts = score(text, actor_objects, data_objects)
+        others = [_jaccard(tokens[index], other) for position, other in enumerate(tokens) if position != index]
+        parts["agreement"] = sum(others) / len(others) if others else 1.0
+        parts["score"] = sum(weight * parts[name] for name, weight in WEIGHTS.items())
+        ranked.append((text, parts))
+    ranked.sort(key=lambda candidate: -candidate[1]["score"])
+    return ranked
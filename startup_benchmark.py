@@ -0,0 +1,105 @@
+"""Measure the startup cost of the Streamlit app.
+
+Each sample runs in a fresh interpreter so nothing is cached between runs:
+
+    import      time to import main.py (the cost every new worker process pays)
+    first_paint time for the first run of the script to render the landing page
+
+    python startup_benchmark.py --runs 5 --out startup.json
+    python startup_benchmark.py --baseline startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SLOWEST_IMPORTS = 10
+
+IMPORT_SCRIPT = """
+import time
+start = time.perf_counter()
+import main
+print(time.perf_counter() - start)
+"""
+
+FIRST_PAINT_SCRIPT = """
+import time
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file("main.py", default_timeout=60)
+at.secrets["OPENAI_API_KEY"] = "unused"
+start = time.perf_counter()
+at.run()
+print(time.perf_counter() - start)
+if at.exception:
+    raise SystemExit(at.exception[0].value)
+"""
+
+
+def _run(script, *flags):
+    result = subprocess.run([sys.executable, *flags, "-c", script], cwd=HERE, capture_output=True, text=True, check=True)
+    return result
+
+
+def measure(script, runs):
+    """Median and all samples, in seconds, of the time ``script`` prints."""
+    samples = [float(_run(script).stdout.split()[-1]) for _ in range(runs)]
+    return {"median": statistics.median(samples), "samples": samples}
+
+
+def slowest_imports(limit=SLOWEST_IMPORTS):
+    """Modules imported directly by main with the largest cumulative import time, from ``python -X importtime``."""
+    children = []
+    for line in _run(IMPORT_SCRIPT, "-X", "importtime").stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        # A module is listed after everything it imports
+        if depth == 0 and name.strip() == "main":
+            return sorted(children, key=lambda module: module["seconds"], reverse=True)[:limit]
+        if depth == 0:
+            children = []
+        elif depth == 1:
+            children.append({"module": name.strip(), "seconds": int(cumulative) / 1e6})
+    return []
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per measurement")
+    parser.add_argument("--out", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare against the JSON output of an earlier run")
+    return parser.parse_args(argv)
+
+
+def run(argv=None):
+    args = parse_args(argv)
+    result = {
+        "import": measure(IMPORT_SCRIPT, args.runs),
+        "first_paint": measure(FIRST_PAINT_SCRIPT, args.runs),
+        "slowest_imports": slowest_imports(),
+    }
+    if args.out:
+        with open(args.out, "w") as file:
+            json.dump(result, file, indent=2)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+    for name in ("import", "first_paint"):
+        line = f"{name:12s} {result[name]['median'] * 1000:8.1f} ms"
+        if baseline:
+            line += f" (baseline {baseline[name]['median'] * 1000:8.1f} ms)"
+        print(line)
+    for module in result["slowest_imports"]:
+        print(f"  {module['module']:30s} {module['seconds'] * 1000:8.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(run())
@@ -0,0 +1,96 @@
+"""Structured test cases derived from the Acceptance Criteria of use case specs.
+
+The generator answers with a markdown table per use case; this module finds
+the criteria in a spec, parses the answer into rows with stable test case
+ids, and exports all rows as CSV or, if openpyxl is installed, XLSX.
+"""
+import csv
+import hashlib
+import io
+import re
+
+import artifacts
+import validators
+
+COLUMNS = ["TC_ID", "UC_ID", "Title", "Steps", "Expected Result"]
+GENERATED_COLUMNS = ["Title", "Steps", "Expected Result"]  # the columns the model fills in
+
+_CRITERIA_HEADING = re.compile(r"^\W*acceptance criteria\W*$", re.I | re.M)
+
+
+def spec_key(use_case, spec):
+    """Cache key of the test cases of a spec: they only change when the spec or use case does."""
+    content = "\0".join([use_case.id, use_case.name, spec or ""])
+    return "test_cases:" + hashlib.sha256(content.encode()).hexdigest()
+
+
+def acceptance_criteria(spec):
+    """The Acceptance Criteria of a spec table, or of an "Acceptance Criteria" heading; the whole spec if neither is found."""
+    criteria = artifacts.spec_from_markdown("", spec).get("Acceptance Criteria")
+    if criteria:
+        return criteria.replace("<br>", "\n").strip()
+    match = _CRITERIA_HEADING.search(spec or "")
+    if match:
+        return spec[match.end():].strip()
+    return spec or ""
+
+
+def test_case_id(uc_id, number):
+    return f"{uc_id or 'UC'}-TC{number:02d}"
+
+
+def parse_test_cases(md_text, use_case):
+    """Rows (dicts keyed by COLUMNS) of the test case table in a generator answer, numbered per use case (an artifacts.UseCase)."""
+    table = validators.parse_table(md_text)
+    if table is None:
+        return []
+    columns = [table.column(name) for name in GENERATED_COLUMNS]
+    if columns[0] is None or columns[2] is None:
+        return []
+    rows = []
+    for row in table.rows:
+        cells = {name: row[column] if column is not None and column < len(row) else "" for name, column in zip(GENERATED_COLUMNS, columns)}
+        if not any(cells.values()):
+            continue
+        cells["Steps"] = cells["Steps"].replace("<br>", "\n")
+        rows.append({"TC_ID": test_case_id(use_case.id, len(rows) + 1), "UC_ID": use_case.id, **cells})
+    return rows
+
+
+def to_csv(rows):
+    """All test cases as CSV bytes."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=COLUMNS)
+    writer.writeheader()
+    writer.writerows(rows)
+    return buffer.getvalue().encode("utf-8")
+
+
+def xlsx_available():
+    try:
+        import openpyxl  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def to_xlsx(rows):
+    """All test cases as XLSX bytes. Needs openpyxl."""
+    from openpyxl import Workbook
+    from openpyxl.styles import Alignment, Font
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.title = "Test Cases"
+    sheet.append(COLUMNS)
+    for cell in sheet[1]:
+        cell.font = Font(bold=True)
+    for row in rows:
+        sheet.append([row[name] for name in COLUMNS])
+    for column, width in zip("ABCDE", (14, 10, 40, 60, 40)):
+        sheet.column_dimensions[column].width = width
+    for row in sheet.iter_rows(min_row=2):
+        for cell in row:
+            cell.alignment = Alignment(wrap_text=True, vertical="top")
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
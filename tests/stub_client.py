@@ -0,0 +1,78 @@
+"""Stub chat completions client with canned replies, used to record tests/fixtures/pipeline_stub.jsonl.
+
+Each prompt type gets one well-formed answer, so a recorded run exercises
+the pipeline's parsing, repairs and fan-outs without a model or network:
+
+    python tests/stub_client.py
+"""
+import json
+import os
+import re
+import sys
+from types import SimpleNamespace
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(ROOT, "tests", "fixtures")
+
+USE_CASE_TABLE = """| UC_ID | UC_Name | Description |
+|---|---|---|
+| UC_01 | Place order | Customer pays for the books in the cart |
+| UC_02 | Update stock | Staff update stock and prices |
+| UC_03 | Sales report | Manager reads the weekly sales report |"""
+
+
+def reply(messages):
+    """The canned answer to a request."""
+    system, user = messages[0]["content"], messages[-1]["content"]
+    if "Title, Steps, Expected Result" in system:
+        return "| Title | Steps | Expected Result |\n|---|---|---|\n| Works | 1. open<br>2. go | it works |\n| Fails | 1. break | error shown |"
+    if "Parse the table" in system:
+        return json.dumps({"use_cases": []})
+    if "permission" in system.lower() or "Cell values" in system:
+        match = re.search(r"exactly the columns: (.*)\.", system)
+        if match:
+            columns = [column.strip() for column in match.group(1).split("|")]
+            labels = user.split("Use Cases:\n", 1)[-1].splitlines() if "Use Cases:\n" in user else []
+            rows = "\n".join("| " + " | ".join([label] + ["O"] * (len(columns) - 1)) + " |" for label in labels)
+            return "| " + " | ".join(columns) + " |\n|" + "---|" * len(columns) + "\n" + rows
+        return "| Use Case | Admin |\n|---|---|\n| UC_01 Place order | O |"
+    if "use case table" in system.lower():
+        return USE_CASE_TABLE
+    if "three columns" in system:
+        if "actors" in system:
+            return "| item # | object | description |\n|---|---|---|\n| 1 | Admin | a |\n| 2 | Worker | w |"
+        return "| item # | object | description |\n|---|---|---|\n| 1 | Sausage | s |\n| 2 | Batch | b |"
+    if "specifications table" in system:
+        return "| Row | Value |\n|---|---|\n| Objective | x |\n| Acceptance Criteria | works |"
+    return "# Plan\n\n## Component A\nObjective: a\nRequirements: r\n\n## Component B\nObjective: b\n"
+
+
+def create(self=None, **request):
+    """Stand-in for openai's Completions.create, streaming or not."""
+    content = reply(request["messages"])
+    n = request.get("n") or 1
+    usage = SimpleNamespace(prompt_tokens=sum(len(message["content"]) for message in request["messages"]) // 4, completion_tokens=len(content) // 4)
+    if request.get("stream"):
+        def chunks():
+            pieces = [content[start:start + 4] for start in range(0, len(content), 4)]
+            for number, piece in enumerate(pieces):
+                finish = "stop" if number == len(pieces) - 1 else None
+                yield SimpleNamespace(usage=None, choices=[SimpleNamespace(index=index, delta=SimpleNamespace(content=piece), finish_reason=finish) for index in range(n)])
+            yield SimpleNamespace(usage=usage, choices=[])
+        return chunks()
+    return SimpleNamespace(usage=usage, choices=[SimpleNamespace(index=index, message=SimpleNamespace(content=content), finish_reason="stop") for index in range(n)])
+
+
+def patch():
+    """Patch openai to answer every request from the stub."""
+    return mock.patch("openai.resources.chat.completions.Completions.create", create)
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, ROOT)
+    os.environ.setdefault("OPENAI_API_KEY", "stub")
+    import pipeline
+    with patch():
+        sys.exit(pipeline.run([os.path.join(FIXTURES, "meeting.vtt"), "--cassette", os.path.join(FIXTURES, "pipeline_stub.jsonl"),
+                               "--mode", "record", "--out", os.path.join(FIXTURES, "pipeline_stub_baseline.json")]))
@@ -0,0 +1,126 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+import api
+import progress
+
+
+def echo(args, job):
+    """A generator that streams its text back in two parts."""
+    progress.add_tokens(1, args["text"][:2])
+    progress.add_tokens(1, args["text"][2:])
+    time.sleep(args.get("sleep", 0))
+    return args["text"].upper()
+
+
+@pytest.fixture(autouse=True)
+def service(monkeypatch):
+    monkeypatch.setattr(api, "service", api.JobService(workers=4))
+    monkeypatch.setattr(api, "PARTIAL_SECONDS", 0)
+    monkeypatch.setitem(api.GENERATORS, "echo", (["text"], api._streamed(echo)))
+    return api.service
+
+
+async def request(method, path, body=None, headers=()):
+    """Call the ASGI app; returns the status and the body."""
+    scope = {"type": "http", "method": method, "path": path, "headers": [(name.encode(), value.encode()) for name, value in headers]}
+    messages = [{"type": "http.request", "body": json.dumps(body).encode() if body is not None else b""}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+    await api.app(scope, receive, send)
+    return sent[0]["status"], b"".join(message.get("body", b"") for message in sent[1:]).decode()
+
+
+def events(body):
+    """(id, event, data) of the server-sent events in a stream body."""
+    parsed = []
+    for block in body.split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+        if fields:
+            parsed.append((int(fields["id"]), fields["event"], json.loads(fields["data"])))
+    return parsed
+
+
+def test_idempotency_key_returns_the_first_job():
+    async def scenario():
+        body = {"generator": "echo", "args": {"text": "hello"}}
+        first = await request("POST", "/jobs", body, [("Idempotency-Key", "k1")])
+        again = await request("POST", "/jobs", body, [("Idempotency-Key", "k1")])
+        other = await request("POST", "/jobs", {"generator": "echo", "args": {"text": "bye"}}, [("Idempotency-Key", "k1")])
+        unkeyed = await request("POST", "/jobs", body)
+        return first, again, other, unkeyed
+    first, again, other, unkeyed = asyncio.run(scenario())
+    assert first[0] == 202 and again[0] == 200
+    assert json.loads(first[1])["id"] == json.loads(again[1])["id"]
+    assert other[0] == 409
+    assert unkeyed[0] == 202 and json.loads(unkeyed[1])["id"] != json.loads(first[1])["id"]
+    assert len(api.service.jobs) == 2
+
+
+def test_events_stream_status_partial_output_and_result():
+    async def scenario():
+        status, body = await request("POST", "/jobs", {"generator": "echo", "args": {"text": "hello"}})
+        job_id = json.loads(body)["id"]
+        stream = await request("GET", f"/jobs/{job_id}/events")
+        resumed = await request("GET", f"/jobs/{job_id}/events", headers=[("Last-Event-ID", "1")])
+        polled = await request("GET", f"/jobs/{job_id}")
+        return stream, resumed, polled
+    stream, resumed, polled = asyncio.run(scenario())
+    assert stream[0] == 200
+    assert events(stream[1]) == [
+        (0, "status", {"status": "queued"}),
+        (1, "status", {"status": "running"}),
+        (2, "partial", {"text": "he"}),
+        (3, "partial", {"text": "llo"}),
+        (4, "done", {"result": "HELLO"}),
+    ]
+    assert events(resumed[1]) == events(stream[1])[2:]
+    job = json.loads(polled[1])
+    assert (job["status"], job["result"], job["partial"]) == ("done", "HELLO", [{"text": "he"}, {"text": "llo"}])
+
+
+def test_events_stream_sends_heartbeats_while_waiting(monkeypatch):
+    monkeypatch.setattr(api, "HEARTBEAT_SECONDS", 0.05)
+
+    async def scenario():
+        status, body = await request("POST", "/jobs", {"generator": "echo", "args": {"text": "hello", "sleep": 0.3}})
+        return await request("GET", f"/jobs/{json.loads(body)['id']}/events")
+    status, body = asyncio.run(scenario())
+    assert ": keep-alive" in body
+    assert events(body)[-1] == (4, "done", {"result": "HELLO"})
+
+
+def test_failed_jobs_and_bad_requests():
+    async def scenario():
+        missing = await request("POST", "/jobs", {"generator": "echo", "args": {}})
+        unknown = await request("POST", "/jobs", {"generator": "nope", "args": {}})
+        status, body = await request("POST", "/jobs", {"generator": "echo", "args": {"text": "hi", "sleep": "x"}})
+        stream = await request("GET", f"/jobs/{json.loads(body)['id']}/events")
+        return missing, unknown, stream
+    missing, unknown, stream = asyncio.run(scenario())
+    assert missing[0] == 400 and unknown[0] == 404
+    assert events(stream[1])[-1][1] == "failed"
+
+
+def test_startup_sets_up_the_cache_and_api_key(monkeypatch):
+    import llm
+    monkeypatch.setattr(llm, "cache", None)
+    monkeypatch.setattr(llm, "resolve_api_key", None)
+    messages, sent = [{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}], []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message["type"])
+    asyncio.run(api.app({"type": "lifespan"}, receive, send))
+    assert sent == ["lifespan.startup.complete", "lifespan.shutdown.complete"]
+    assert llm.cache is not None and llm.resolve_api_key is not None
@@ -0,0 +1,70 @@
+import os
+
+import artifact_store
+
+# Small strings are stored uncompressed: 100 characters take 101 bytes
+A, B, C, D = ("a" * 100, "b" * 100, "c" * 100, "d" * 100)
+
+
+def test_least_recently_used_entries_are_evicted_first():
+    store = artifact_store.ArtifactStore(max_bytes=250)
+    store.cache("a", A)
+    store.cache("b", B)
+    assert store.get("a") == A  # now "b" is the least recently used
+    store.cache("c", C)
+    assert "b" not in store
+    assert store.get("a") == A and store.get("c") == C
+    assert store.stats()["evictions"] == 1
+    assert store.stats()["stored_bytes"] == 202
+
+
+def test_pinned_entries_are_kept_until_their_refs_are_gone():
+    store = artifact_store.ArtifactStore(max_bytes=250)
+    ref = store.put(A)
+    store.cache("b", B)
+    store.cache("c", C)
+    assert store.get(ref) == A  # the oldest, but pinned
+    assert "b" not in store
+    store.discard(ref.key)
+    assert store.get(ref) == A  # discarding a held entry does nothing
+    assert store.stats()["pinned_entries"] == 1
+    del ref
+    assert store.stats()["pinned_entries"] == 0
+    store.get("c")
+    store.cache("d", D)
+    assert store.stats()["entries"] == 2 and "c" in store and "d" in store
+
+
+def test_put_keys_by_content_and_pins_per_ref():
+    store = artifact_store.ArtifactStore()
+    first, second = store.put(A), store.put(A)
+    assert first.key == second.key == artifact_store.content_key(b"s" + A.encode())
+    assert store.stats()["entries"] == 1
+    del first
+    assert store.stats()["pinned_entries"] == 1
+    del second
+    assert store.stats()["pinned_entries"] == 0
+
+
+def test_large_values_are_compressed():
+    store = artifact_store.ArtifactStore()
+    value = {"table": "| a | b |\n" * 2000}
+    ref = store.put(value)
+    stats = store.stats()
+    assert stats["stored_bytes"] < stats["raw_bytes"] // 10
+    assert store.get(ref) == value
+    assert store.get("missing", "default") == "default"
+    assert (store.hits, store.misses) == (1, 1)
+
+
+def test_disk_store_evicts_the_least_recently_used_files(tmp_path):
+    store = artifact_store.DiskStore(str(tmp_path), max_bytes=2 * 105)  # 4 header bytes an entry
+    store.cache("aa", A)
+    store.cache("bb", B)
+    os.utime(store._path("aa"), (1, 1))
+    os.utime(store._path("bb"), (2, 2))
+    assert store.get("aa") == A  # touched: now the newest
+    store.cache("cc", C)
+    assert "bb" not in store and "aa" in store and "cc" in store
+    # Another process opening the directory sees the same entries
+    assert artifact_store.DiskStore(str(tmp_path)).get("cc") == C
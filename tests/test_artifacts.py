@@ -0,0 +1,57 @@
+import pickle
+
+import artifacts
+import test_cases
+
+ACTORS = """| Item # | Object | Description |
+|---|---|---|
+| 1 | Customer | Buys books |
+| 2 | Clerk | Ships orders |
+"""
+
+USE_CASES = """| UC ID | UC Name | Description |
+|---|---|---|
+| UC1 | Place order | The customer pays for the basket |
+| UC2 | Ship order | The clerk packs and ships an order |
+"""
+
+SPEC = """| Field | Value |
+|---|---|
+| **Name** | Place order |
+| **Acceptance Criteria** | Payment is taken<br>An order number is shown |
+"""
+
+
+def test_use_cases_refer_to_the_actors_they_name():
+    actors = artifacts.objects_from_markdown(ACTORS, artifacts.Actor)
+    model = artifacts.Model(actors=actors, use_cases=artifacts.use_cases_from_markdown(USE_CASES, actors))
+    assert [actor.id for actor in actors] == ["A1", "A2"]
+    assert [actor.name for actor in model.actors_of(model.use_cases[0])] == ["Customer"]
+    assert [actor.name for actor in model.actors_of(model.use_cases[1])] == ["Clerk"]
+
+
+def test_update_relinks_use_cases_to_new_actors():
+    model = artifacts.Model(use_cases=artifacts.use_cases_from_markdown(USE_CASES))
+    assert model.use_cases[0].actor_ids == ()
+    model = model.update(actors=artifacts.objects_from_markdown(ACTORS, artifacts.Actor))
+    assert model.use_cases[0].actor_ids == ("A1",)
+
+
+def test_model_pickles_without_the_actor_lookup():
+    actors = artifacts.objects_from_markdown(ACTORS, artifacts.Actor)
+    model = artifacts.Model(actors=actors, use_cases=artifacts.use_cases_from_markdown(USE_CASES, actors))
+    model.actors_of(model.use_cases[0])
+    restored = pickle.loads(pickle.dumps(model))
+    assert restored == model
+    assert restored.actors_of(restored.use_cases[1])[0].name == "Clerk"
+
+
+def test_acceptance_criteria_are_read_from_the_spec():
+    spec = artifacts.spec_from_markdown("UC1", SPEC)
+    assert spec.get("name") == "Place order"
+    assert test_cases.acceptance_criteria(SPEC) == "Payment is taken\nAn order number is shown"
+
+
+def test_acceptance_criteria_under_a_heading_or_missing():
+    assert test_cases.acceptance_criteria("## Acceptance Criteria\n- Payment is taken") == "- Payment is taken"
+    assert test_cases.acceptance_criteria("no criteria here") == "no criteria here"
@@ -0,0 +1,92 @@
+import sys
+import types
+
+import pytest
+
+import budget
+
+MODEL = "gpt-4o-mini"
+ENCODING = budget._encoding  # the real lookup, before the fixture below replaces it
+
+
+@pytest.fixture(autouse=True)
+def estimated_tokens(monkeypatch):
+    # Token counts are estimated (4 characters a token), with or without tiktoken installed
+    monkeypatch.setattr(budget, "_encoding", lambda model: None)
+    monkeypatch.setattr(budget, "PROMPT_BUDGETS", {"small": 100})
+
+
+def messages(text=""):
+    return [{"role": "system", "content": "Summarize."}, {"role": "user", "content": text}]
+
+
+def test_count_tokens_estimate():
+    assert budget.count_tokens("a" * 10, MODEL) == 3
+    assert budget.message_tokens(messages(), MODEL) == 3 + 3 + 3 + 0 + budget.REPLY_OVERHEAD
+
+
+def test_check_enforces_the_stage_budget():
+    assert budget.check(messages("a" * 40), MODEL, 1000, "small") == (22, 1000)
+    with pytest.raises(budget.PromptTooLarge):
+        budget.check(messages("a" * 400), MODEL, 1000, "small")
+    # Without a stage only the context window counts
+    assert budget.check(messages("a" * 400), MODEL, 1000)[0] == 112
+
+
+def test_check_lowers_max_tokens_to_fit_the_context_window():
+    prompt_tokens, max_tokens = budget.check(messages("a" * 4 * 7500), "unknown-model", 1000)
+    assert max_tokens == budget.DEFAULT_CONTEXT_WINDOW - prompt_tokens
+
+
+def test_compress_drops_timestamps_fillers_and_repeats():
+    text = "[00:01] Um, we need, you know, a cart.\n[00:02] Um, we need, you know, a cart.\n\n  Pay   by card."
+    assert budget.compress(text) == "we need, a cart.\nPay by card."
+
+
+def test_fit_sends_a_short_input_unchanged():
+    decision = budget.fit("small", MODEL, messages(), "short text", 1000)
+    assert (decision.strategy, decision.text) == (budget.SEND, "short text")
+
+
+def test_fit_compresses_when_that_is_enough():
+    text = "\n".join(["[00:01] um the cart holds books"] * 2 + ["uh pay by card"] * 20)
+    decision = budget.fit("small", MODEL, messages(), text, 1000)
+    assert decision.strategy == budget.COMPRESS
+    assert decision.text == "the cart holds books\npay by card"
+
+
+def test_fit_retrieves_the_passages_relevant_to_a_query():
+    text = "\n\n".join(f"Paragraph {index} is about shipping and couriers." for index in range(20)) + "\n\nPayments go through the card provider."
+    decision = budget.fit("small", MODEL, messages(), text, 1000, query="card payments")
+    assert decision.strategy == budget.RETRIEVE
+    assert "Payments go through the card provider." in decision.text
+    assert budget.count_tokens(decision.text, MODEL) <= decision.limit
+
+
+def test_fit_chunks_without_a_query():
+    text = "\n".join(f"Line {index} is about something different every time." for index in range(40))
+    decision = budget.fit("small", MODEL, messages(), text, 1000)
+    assert decision.strategy == budget.CHUNK
+    assert "\n".join(decision.chunks) == text
+    assert all(budget.count_tokens(piece, MODEL) <= decision.limit for piece in decision.chunks)
+
+
+def test_fit_refuses_when_the_rest_of_the_prompt_fills_the_budget():
+    with pytest.raises(budget.PromptTooLarge):
+        budget.fit("small", MODEL, messages("a" * 400), "text", 1000)
+
+
+def test_an_encoding_that_cannot_be_loaded_falls_back_to_the_estimate(monkeypatch):
+    loads = []
+
+    def encoding_for_model(model):
+        loads.append(model)
+        raise OSError("cannot download o200k_base.tiktoken")
+    monkeypatch.setitem(sys.modules, "tiktoken", types.SimpleNamespace(encoding_for_model=encoding_for_model, get_encoding=encoding_for_model))
+    ENCODING.cache_clear()
+    try:
+        assert ENCODING(MODEL) is None
+        assert ENCODING(MODEL) is None
+        assert loads == [MODEL]  # the failure is cached, not retried on every count
+    finally:
+        ENCODING.cache_clear()
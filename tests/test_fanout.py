@@ -0,0 +1,104 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import budget
+import fanout
+import llm
+
+
+def test_resume_runs_only_missing_and_failed_items():
+    calls, flaky = [], {"b"}
+
+    def fn(item):
+        calls.append(item)
+        if item in flaky:
+            flaky.discard(item)
+            raise ValueError("try again")
+        return item.upper()
+    run = fanout.FanOutRun(fn, ["a", "b", "c"], workers=2)
+    run.start()
+    assert run.wait(timeout=5)
+    assert run.failed() == ["b"] and run.result("b")["error"] == "try again"
+    assert run.missing() == ["b"]
+    run.start()
+    assert run.wait(timeout=5)
+    assert sorted(calls) == ["a", "b", "b", "c"]
+    assert run.values() == ["A", "B", "C"]
+
+
+def test_cancel_drops_queued_items_and_keeps_nothing_in_flight():
+    started, release = threading.Event(), threading.Event()
+
+    def fn(item):
+        started.set()
+        release.wait(5)
+        return item.upper()
+    run = fanout.FanOutRun(fn, ["a", "b", "c"], workers=1)
+    run.start()
+    assert started.wait(5)
+    run.cancel()
+    release.set()
+    assert run.wait(timeout=5)
+    assert run.done() == [] and run.missing() == ["a", "b", "c"]
+    assert run.status("a") == fanout.CANCELLED
+    # Resumed from the checkpoints, every item runs again
+    run.start()
+    assert run.wait(timeout=5)
+    assert run.values() == ["A", "B", "C"]
+
+
+def test_update_reruns_stale_items_only():
+    calls = []
+    run = fanout.FanOutRun(lambda item: calls.append(item) or item, ["a", "b"])
+    run.start()
+    run.wait(timeout=5)
+    run.update(["a", "b", "c"], stale=["b"])
+    run.start()
+    run.wait(timeout=5)
+    assert sorted(calls) == ["a", "b", "b", "c"]
+    assert run.values() == ["a", "b", "c"]
+
+
+class SlowStream:
+    """A streaming answer that runs for seconds unless it is closed."""
+
+    def __init__(self):
+        self.closed = False
+
+    def __iter__(self):
+        for _ in range(300):
+            if self.closed:
+                return
+            time.sleep(0.01)
+            yield SimpleNamespace(usage=None, choices=[SimpleNamespace(index=0, delta=SimpleNamespace(content="x"), finish_reason=None)])
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def slow_api(monkeypatch):
+    streams = []
+
+    def create(**request):
+        streams.append(SlowStream())
+        return streams[-1]
+    monkeypatch.setattr(llm, "_openai", lambda: SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create))))
+    monkeypatch.setattr(llm, "cache", None)
+    monkeypatch.setattr(llm, "cassette", None)
+    monkeypatch.setattr(budget, "_encoding", lambda model: None)
+    return streams
+
+
+def test_cancel_closes_streaming_requests(slow_api):
+    run = fanout.FanOutRun(lambda item: llm.complete("use_case_specs", [{"role": "user", "content": item}]), ["UC1"])
+    run.start()
+    while not slow_api:
+        time.sleep(0.01)
+    run.cancel()
+    assert run.wait(timeout=1)
+    assert slow_api[0].closed
+    assert run.status("UC1") == fanout.CANCELLED
@@ -0,0 +1,59 @@
+import io
+import zipfile
+
+import pytest
+
+import ingest
+
+
+def utterances(data):
+    return [(utterance.speaker, utterance.text) for utterance in ingest.read_utterances(io.BytesIO(data))]
+
+
+def test_vtt_voices_become_speakers_and_consecutive_cues_merge():
+    data = b"WEBVTT\n\n00:00:01.000 --> 00:00:02.000\n<v Anna>Hello</v>\n\n00:00:02.000 --> 00:00:03.000\n<v Anna>again\n\n00:00:03.000 --> 00:00:04.000\n<v Ben>Hi\n"
+    assert ingest.detect_format(io.BytesIO(data)) == "vtt"
+    assert utterances(data) == [("Anna", "Hello again"), ("Ben", "Hi")]
+
+
+def test_srt_with_speaker_prefixes():
+    data = b"1\r\n00:00:01,000 --> 00:00:02,000\r\nAnna: Hello\r\n\r\n2\r\n00:00:02,000 --> 00:00:03,000\r\nBen: Hi\r\n"
+    assert ingest.detect_format(io.BytesIO(data)) == "srt"
+    assert utterances(data) == [("Anna", "Hello"), ("Ben", "Hi")]
+
+
+def test_plain_text():
+    data = "Anna: Let's order books\nBen: Sure – by card\n".encode()
+    assert ingest.detect_format(io.BytesIO(data)) == "txt"
+    assert [text for _, text in utterances(data)] == ["Let's order books", "Sure – by card"]
+
+
+def test_docx_paragraphs():
+    document = (
+        '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"><w:body>'
+        '<w:p><w:r><w:t>Anna: Hello</w:t></w:r></w:p><w:p><w:r><w:t>Ben: Hi</w:t></w:r></w:p>'
+        '</w:body></w:document>'
+    )
+    data = io.BytesIO()
+    with zipfile.ZipFile(data, "w") as archive:
+        archive.writestr("word/document.xml", document)
+    assert ingest.detect_format(io.BytesIO(data.getvalue())) == "docx"
+    assert [text for _, text in utterances(data.getvalue())] == ["Hello", "Hi"]
+
+
+def test_detection_does_not_move_the_stream():
+    stream = io.BytesIO(b"WEBVTT\n")
+    stream.read(2)
+    ingest.detect_format(stream)
+    assert stream.tell() == 2
+
+
+@pytest.mark.parametrize("data", [b"\x89PNG\r\n\x1a\n\0\0\0\rIHDR", b"caf\xe9 au lait\n"])
+def test_binary_and_non_utf8_files_are_rejected(data):
+    with pytest.raises(ingest.UnsupportedFormat):
+        ingest.detect_format(io.BytesIO(data))
+
+
+def test_a_character_cut_at_the_end_of_the_head_is_still_text():
+    data = b"a" * (ingest.SNIFF_BYTES - 1) + "é".encode()
+    assert ingest.detect_format(io.BytesIO(data)) == "txt"
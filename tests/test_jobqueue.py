@@ -0,0 +1,88 @@
+import threading
+import time
+import types
+
+import pytest
+
+import artifact_store
+import jobqueue
+import main
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return jobqueue.JobQueue(str(tmp_path / "jobs.db"))
+
+
+def test_jobs_are_claimed_by_priority_then_age(queue):
+    later = queue.enqueue("echo", {"text": "later"}, priority=2)
+    first = queue.enqueue("echo", {"text": "first"}, priority=0)
+    assert queue.claim("w1")["id"] == first
+    assert queue.claim("w1")["id"] == later
+    assert queue.claim("w1") is None
+
+
+def test_a_lost_worker_s_job_is_claimed_again_after_its_lease(queue, monkeypatch):
+    job_id = queue.enqueue("echo", {"text": "a"})
+    job = queue.claim("w1")
+    assert (job["worker"], job["attempts"]) == ("w1", 1)
+    assert queue.claim("w2") is None  # leased to w1
+
+    clock = [time.time()]
+
+    def later():
+        clock[0] += jobqueue.LEASE_SECONDS + 1  # every lease has run out by the next claim
+        return clock[0]
+    monkeypatch.setattr(jobqueue, "time", types.SimpleNamespace(time=later))
+    for attempt in range(2, jobqueue.MAX_ATTEMPTS + 1):
+        job = queue.claim(f"w{attempt}")
+        assert (job["id"], job["attempts"]) == (job_id, attempt)
+    assert queue.claim("w9") is None
+    job = queue.get(job_id)
+    assert job["status"] == jobqueue.FAILED
+    assert job["error"] == "Gave up after the worker was lost"
+
+
+def test_result_keys_depend_on_kind_and_arguments_only():
+    assert jobqueue.result_key("echo", {"a": 1, "b": 2}) == jobqueue.result_key("echo", {"b": 2, "a": 1})
+    assert jobqueue.result_key("echo", {"a": 1}) != jobqueue.result_key("other", {"a": 1})
+
+
+def test_run_job_runs_a_job_again_when_its_result_was_evicted(queue, tmp_path, monkeypatch):
+    store = artifact_store.DiskStore(str(tmp_path / "store"))
+    monkeypatch.setattr(main, "job_queue", lambda: queue)
+    monkeypatch.setattr(main, "disk_store", lambda: store)
+    monkeypatch.setitem(main.JOBS, "echo", lambda args: args["text"].upper())
+    runs = []
+
+    def work():
+        # Runs two jobs; the first result is evicted before the UI reads it
+        while len(runs) < 2:
+            job = queue.claim("w1")
+            if job is None:
+                continue
+            store.cache(job["result_key"], main.JOBS[job["kind"]](job["args"]))
+            runs.append(job["id"])
+            if len(runs) == 1:
+                store.discard(job["result_key"])
+            queue.finish(job["id"])
+    thread = threading.Thread(target=work, daemon=True)
+    thread.start()
+    assert main.run_job("echo", {"text": "hi"}) == "HI"
+    thread.join(timeout=5)
+    assert len(runs) == 2
+    assert queue.stats()[jobqueue.DONE] == 2
+
+
+def test_run_job_raises_the_error_of_a_failed_job(queue, tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "job_queue", lambda: queue)
+    monkeypatch.setattr(main, "disk_store", lambda: artifact_store.DiskStore(str(tmp_path / "store")))
+
+    def work():
+        job = None
+        while job is None:
+            job = queue.claim("w1")
+        queue.fail(job["id"], "ValueError: bad table")
+    threading.Thread(target=work, daemon=True).start()
+    with pytest.raises(RuntimeError, match="bad table"):
+        main.run_job("echo", {"text": "hi"})
@@ -0,0 +1,98 @@
+from collections import defaultdict, deque
+
+import pytest
+
+import budget
+import llm
+
+
+@pytest.fixture(autouse=True)
+def fake_api(monkeypatch):
+    """Answers queued by each test, served in order; the requests sent are recorded."""
+    sent, answers = [], []
+
+    def create(**request):
+        sent.append(request)
+        content, finish_reason, completion_tokens = answers.pop(0)
+        return {
+            "choices": [{"content": content, "finish_reason": finish_reason}],
+            "usage": {"prompt_tokens": 10, "completion_tokens": completion_tokens},
+        }
+
+    monkeypatch.setattr(llm, "_create", create)
+    monkeypatch.setattr(llm, "cache", None)
+    monkeypatch.setattr(llm, "_output_tokens", defaultdict(lambda: deque(maxlen=llm.HISTORY_SIZE)))
+    monkeypatch.setattr(llm, "telemetry", deque(maxlen=1000))
+    monkeypatch.setattr(budget, "_encoding", lambda model: None)
+    return sent, answers
+
+
+MESSAGES = [{"role": "user", "content": "Write the table."}]
+
+
+def test_max_tokens_is_the_stage_ceiling_until_there_is_history():
+    assert llm.max_tokens_for("table") == llm.STAGES["table"]["max_tokens"]
+    llm._output_tokens["table"].extend([100] * (llm.MIN_HISTORY - 1))
+    assert llm.max_tokens_for("table") == llm.STAGES["table"]["max_tokens"]
+
+
+def test_max_tokens_is_sized_from_past_outputs():
+    llm._output_tokens["table"].extend([400] * 40 + [800])
+    assert llm.max_tokens_for("table") == 500  # the 95th percentile is 400, plus headroom
+    llm._output_tokens["workflow"].extend([10] * llm.MIN_HISTORY)
+    assert llm.max_tokens_for("workflow") == llm.MIN_MAX_TOKENS
+    llm._output_tokens["repair"].extend([5000] * llm.MIN_HISTORY)
+    assert llm.max_tokens_for("repair") == llm.STAGES["repair"]["max_tokens"]
+
+
+def test_complete_records_outputs_and_uses_them(fake_api):
+    sent, answers = fake_api
+    answers.extend([("| a |", "stop", 400)] * llm.MIN_HISTORY + [("| a |", "stop", 400)])
+    for _ in range(llm.MIN_HISTORY + 1):
+        llm.complete("table", MESSAGES)
+    assert sent[0]["max_tokens"] == llm.STAGES["table"]["max_tokens"]
+    assert sent[-1]["max_tokens"] == 500
+    assert llm.telemetry[-1]["adaptive"] is True
+
+
+def test_cut_off_answers_are_continued_and_stitched(fake_api):
+    sent, answers = fake_api
+    answers.extend([("| a | b", "length", 300), (" |\n| c | d |", "stop", 20)])
+    assert llm.complete("table", MESSAGES, max_tokens=300) == "| a | b |\n| c | d |"
+    assert sent[1]["messages"] == MESSAGES + [
+        {"role": "assistant", "content": "| a | b"},
+        {"role": "user", "content": llm.CONTINUE_PROMPT},
+    ]
+    assert sent[1]["max_tokens"] == llm.STAGES["table"]["max_tokens"]
+    record = llm.telemetry[-1]
+    assert (record["continuations"], record["completion_tokens"], record["finish_reason"]) == (1, 320, "stop")
+
+
+def test_continuations_are_limited(fake_api):
+    sent, answers = fake_api
+    answers.extend([("x", "length", 1)] * (llm.MAX_CONTINUATIONS + 1))
+    assert llm.complete("table", MESSAGES) == "x" * (llm.MAX_CONTINUATIONS + 1)
+    assert len(sent) == llm.MAX_CONTINUATIONS + 1
+    assert llm.telemetry[-1]["finish_reason"] == "length"
+
+
+def test_json_answers_are_not_continued(fake_api):
+    sent, answers = fake_api
+    answers.append(('{"a": ', "length", 300))
+    assert llm.complete("plan_merge", MESSAGES, response_format={"type": "json_object"}) == '{"a": '
+    assert len(sent) == 1
+
+
+def test_continuation_is_checked_against_the_context_window(fake_api, monkeypatch):
+    sent, answers = fake_api
+    answers.extend([("a" * 40, "length", 10), ("b", "stop", 1)])
+    # Room for the first request's answer, but only just for its continuation
+    window = budget.message_tokens(MESSAGES, "gpt-4o") + 300
+    monkeypatch.setattr(budget, "CONTEXT_WINDOWS", {"gpt-4o": window})
+    llm.complete("table", MESSAGES, max_tokens=300)
+    assert sent[1]["max_tokens"] < llm.STAGES["table"]["max_tokens"]
+    # No room at all: the answer is returned as it is
+    monkeypatch.setattr(budget, "CONTEXT_WINDOWS", {"gpt-4o": budget.message_tokens(MESSAGES, "gpt-4o") + 256})
+    answers[:] = [("a" * 400, "length", 100)]
+    assert llm.complete("table", MESSAGES, max_tokens=256) == "a" * 400
+    assert len(sent) == 3
@@ -0,0 +1,37 @@
+import artifact_store
+import artifacts
+import llm
+import main
+import validators
+
+USE_CASES = "| UC_ID | UC_Name | Description |\n|---|---|---|\n| UC_01 | Login | l |\n| UC_02 | Report | r |"
+
+
+def test_repair_keeps_the_matrix_when_the_actor_table_cannot_be_read(monkeypatch):
+    def complete(*args, **kwargs):
+        raise AssertionError("no request expected")
+    monkeypatch.setattr(llm, "complete", complete)
+    matrix = "| Use Case | Admin | Clerk |\n|---|---|---|\n| UC_01 Login | O | X |\n| UC_02 Report | O | O |"
+    repaired, defects = main.repair_permission_matrix(matrix, "- Admin: runs the shop\n- Clerk: serves customers", USE_CASES)
+    assert validators.parse_table(repaired) == validators.parse_table(matrix)
+    assert [defect.kind for defect in defects] == ["structure"]
+
+
+class EvictingStore(artifact_store.ArtifactStore):
+    """A store whose entries are evicted right after a membership test, as under memory pressure."""
+
+    def __contains__(self, key):
+        found = super().__contains__(key)
+        self.discard(key)
+        return found
+
+
+def test_test_cases_are_served_from_the_cache_in_one_lookup(monkeypatch):
+    answers = ["| Title | Steps | Expected Result |\n|---|---|---|\n| Log in | 1. Sign in | Home page |"]
+    monkeypatch.setattr(llm, "complete", lambda *args, **kwargs: answers.pop(0))
+    monkeypatch.setattr(llm, "cache", EvictingStore())
+    use_case = artifacts.UseCase("UC_01", "Login")
+    spec = "| Field | Value |\n|---|---|\n| Acceptance Criteria | The user can sign in |"
+    rows = main.generate_test_cases(use_case, spec)
+    assert [row["TC_ID"] for row in rows] == ["UC_01-TC01"]
+    assert main.generate_test_cases(use_case, spec) == rows  # no second request: answers is empty
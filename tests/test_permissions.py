@@ -0,0 +1,72 @@
+import itertools
+
+import main
+import permissions
+import validators
+
+ACTORS = "| item # | object | description |\n|---|---|---|\n| 1 | Admin | a |\n| 2 | Clerk | c |\n| 3 | Guest | g |"
+USE_CASES = "| UC_ID | UC_Name | Description |\n|---|---|---|\n" + "\n".join(
+    f"| UC{number} | Case {number} | d |" for number in range(1, 13)
+)
+SYMBOLS = ["O", "O*", "X"]
+
+
+def expected(actor_index, uc_number):
+    """The permission the fake model gives every cell."""
+    return SYMBOLS[(actor_index + uc_number) % 3]
+
+
+def tile(actors, use_cases, skip=()):
+    """A tile answer for ``use_cases``, without the rows in ``skip``."""
+    rows = [
+        [permissions.use_case_label(use_case)] + [expected(index, int(use_case[0][2:])) for index in range(len(actors))]
+        for use_case in use_cases if use_case[0] not in skip
+    ]
+    return validators.Table(["Use Case"] + actors, rows).render()
+
+
+def test_tiled_grid_is_assembled_and_missing_rows_are_requested_again(monkeypatch):
+    calls = []
+
+    def generate_tile(actor_objects, actors, use_cases, refresh=False):
+        calls.append(([use_case[0] for use_case in use_cases], refresh))
+        # The first answer for the tile with UC5 leaves that row out
+        return tile(actors, use_cases, skip={"UC5"} if len(calls) <= 3 else ())
+    monkeypatch.setattr(main, "PERMISSION_TILE_SIZE", 5)
+    monkeypatch.setattr(main, "generate_permission_tile", generate_tile)
+    matrix = main.generate_permission_grid(ACTORS, USE_CASES)
+    assert sorted(ids for ids, refresh in calls[:3]) == [
+        ["UC1", "UC2", "UC3", "UC4", "UC5"], ["UC11", "UC12"], ["UC6", "UC7", "UC8", "UC9", "UC10"],
+    ]
+    assert calls[3:] == [(["UC5"], True)]
+    assert matrix.incomplete_use_cases() == []
+    for (actor_index, actor), number in itertools.product(enumerate(matrix.actors), range(1, 13)):
+        assert matrix.permission(actor, f"UC{number}") == expected(actor_index, number)
+    assert validators.validate_permission_matrix(matrix.to_markdown(), ACTORS, USE_CASES)[1] == []
+
+
+def test_queries_match_the_markdown_matrix():
+    markdown = tile(["Admin", "Clerk", "Guest"], validators.use_case_names(USE_CASES))
+    matrix = permissions.PermissionMatrix.from_markdown(markdown, ACTORS, USE_CASES)
+    table = validators.parse_table(markdown)
+    for row in table.rows:
+        for actor, cell in zip(table.header[1:], row[1:]):
+            assert matrix.permission(actor, row[0]) == cell
+        allowed = [actor for actor, cell in zip(table.header[1:], row[1:]) if cell in ("O", "O*")]
+        assert matrix.actors_for(row[0]) == allowed
+        assert matrix.actors_for(row[0], own_items=False) == [
+            actor for actor, cell in zip(table.header[1:], row[1:]) if cell == "O"
+        ]
+    guest = [row[0] for row in table.rows if row[3] != "X"]
+    assert [permissions.use_case_label(use_case) for use_case in matrix.use_cases_for("guest")] == guest
+    assert validators.parse_table(matrix.to_markdown()).rows == table.rows
+
+
+def test_use_cases_are_found_by_id_name_or_label():
+    matrix = permissions.PermissionMatrix(["Admin"], validators.use_case_names(USE_CASES))
+    assert matrix.use_case_index("UC1") == 0
+    assert matrix.use_case_index("UC11 Case 11") == 10
+    assert matrix.use_case_index("uc11 renamed") == 10  # the label starts with the ID
+    assert matrix.use_case_index("case 12") == 11
+    assert matrix.use_case_index("UC13") is None
+    assert matrix.permission("Admin", "UC1") == "?"
@@ -0,0 +1,54 @@
+"""Replay of a recorded pipeline run, so a change to prompts, parsing or repairs shows up without network access.
+
+The cassette was NOT recorded against a real model. Its answers come from a
+stub client with canned, well-formed replies (one per prompt type), so the
+test covers the pipeline's own code: prompts, parsing, repairs, fan-outs
+and the stitching of artifacts. It says nothing about answer quality.
+
+Record the stub cassette and baseline again after an intended change with
+``python tests/stub_client.py`` (see tests/stub_client.py).
+"""
+import json
+import os
+
+import pytest
+
+import artifact_store
+import ingest
+import llm
+import main
+import pipeline
+import replay
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+TRANSCRIPT = os.path.join(FIXTURES, "meeting.vtt")
+CASSETTE = os.path.join(FIXTURES, "pipeline_stub.jsonl")
+BASELINE = os.path.join(FIXTURES, "pipeline_stub_baseline.json")
+
+
+@pytest.fixture(autouse=True)
+def replayed(monkeypatch):
+    monkeypatch.setattr(llm, "cache", artifact_store.ArtifactStore())
+    monkeypatch.setattr(llm, "cassette", replay.Cassette(CASSETTE, mode=replay.REPLAY, speed=0))
+
+
+def baseline():
+    with open(BASELINE) as file:
+        return json.load(file)
+
+
+def test_replayed_stub_run_matches_the_baseline():
+    result = json.loads(json.dumps(pipeline.run_pipeline(ingest.read_transcript(TRANSCRIPT)), default=str))
+    assert result["artifacts"] == baseline()["artifacts"]
+    assert list(result["timings"]) == pipeline.STAGES
+    assert not [line for line in pipeline.compare(result, baseline()) if line.startswith("artifact changed")]
+
+
+def test_command_line_compares_against_the_baseline():
+    assert pipeline.run([TRANSCRIPT, "--cassette", CASSETTE, "--speed", "0", "--baseline", BASELINE]) == 0
+
+
+def test_a_changed_prompt_is_not_in_the_cassette(monkeypatch):
+    monkeypatch.setattr(main, "PLAN_INSTRUCTION", main.PLAN_INSTRUCTION + " Be brief.")
+    with pytest.raises(RuntimeError, match="Failed to generate"):
+        pipeline.run_pipeline(ingest.read_transcript(TRANSCRIPT))
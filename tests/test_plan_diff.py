@@ -0,0 +1,55 @@
+import plan_diff
+
+PLAN = """# Bookstore
+
+Online orders for a small bookstore.
+
+## Catalogue
+Objective: browse books
+
+## Checkout
+Objective: pay by card
+"""
+
+
+def test_split_components_keeps_the_document_title_in_the_preamble():
+    components = plan_diff.split_components(PLAN)
+    assert list(components) == [plan_diff.PREAMBLE, "Catalogue", "Checkout"]
+    assert "Online orders" in components[plan_diff.PREAMBLE]
+    assert components["Checkout"] == "Objective: pay by card"
+
+
+def test_split_components_of_an_empty_plan():
+    assert plan_diff.split_components("") == {}
+    assert plan_diff.split_components(None) == {}
+
+
+def test_no_changes():
+    diff = plan_diff.diff_plans(PLAN, PLAN.replace("pay by card", "pay  by   card"))
+    assert not diff
+    assert diff.summary() == "no changes"
+
+
+def test_added_removed_and_changed_components():
+    edited = PLAN.replace("pay by card", "pay by card or voucher").replace("## Catalogue\nObjective: browse books\n", "") + "\n## Reports\nObjective: weekly sales\n"
+    diff = plan_diff.diff_plans(PLAN, edited)
+    assert list(diff.added) == ["Reports"]
+    assert list(diff.removed) == ["Catalogue"]
+    assert diff.changed == {"Checkout": ("Objective: pay by card", "Objective: pay by card or voucher")}
+    assert diff.summary() == "added: Reports; removed: Catalogue; changed: Checkout"
+    markdown = diff.to_markdown()
+    assert "### Added component: Reports" in markdown
+    assert "Before:\nObjective: pay by card\n\nAfter:\nObjective: pay by card or voucher" in markdown
+
+
+def test_titles_match_loosely():
+    diff = plan_diff.diff_plans(PLAN, PLAN.replace("## Checkout", "## **checkout**"))
+    assert not diff
+
+
+def test_repeated_titles_are_numbered_so_no_component_is_lost():
+    plan = "## Reports\nObjective: daily\n\n## Checkout\nObjective: pay\n\n## Reports\nObjective: weekly\n"
+    components = plan_diff.split_components(plan)
+    assert components == {"Reports": "Objective: daily", "Checkout": "Objective: pay", "Reports (2)": "Objective: weekly"}
+    diff = plan_diff.diff_plans(plan, plan.replace("weekly", "monthly"))
+    assert diff.changed == {"Reports (2)": ("Objective: weekly", "Objective: monthly")}
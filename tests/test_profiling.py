@@ -0,0 +1,52 @@
+import threading
+import tracemalloc
+
+import pytest
+
+import profiling
+
+
+@pytest.fixture(autouse=True)
+def profile_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(profiling, "recent", profiling.deque(maxlen=50))
+    assert not tracemalloc.is_tracing()
+
+
+def test_profiled_block_writes_stats_and_stops_tracing():
+    with profiling.profiled("parse", enabled=True):
+        assert tracemalloc.is_tracing()
+        data = [str(number) for number in range(10000)]
+    assert not tracemalloc.is_tracing()
+    summary = profiling.recent[-1]
+    assert summary["stage"] == "parse" and summary["peak_bytes"] > 0
+    assert [path.rsplit(".", 1)[1] for path in summary["files"]] == ["pstats", "folded"]
+    assert data
+
+
+def test_overlapping_blocks_keep_tracing_until_the_last_one_ends():
+    started, release, traced = threading.Event(), threading.Event(), []
+
+    def first():
+        with profiling.profiled("first", enabled=True):  # starts tracing
+            started.set()
+            release.wait(5)
+    thread = threading.Thread(target=first)
+    thread.start()
+    assert started.wait(5)
+    with profiling.profiled("second", enabled=True):
+        release.set()
+        thread.join()  # the block that started tracing ends first
+        traced.append(tracemalloc.is_tracing())
+    assert traced == [True]
+    assert not tracemalloc.is_tracing()
+
+
+def test_tracing_started_elsewhere_is_left_running():
+    tracemalloc.start()
+    try:
+        with profiling.profiled("parse", enabled=True):
+            pass
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
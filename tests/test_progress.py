@@ -0,0 +1,78 @@
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+import budget
+import llm
+import progress
+
+
+def chunk(content=None, usage=None):
+    choices = [] if content is None else [SimpleNamespace(index=0, delta=SimpleNamespace(content=content), finish_reason="stop")]
+    return SimpleNamespace(usage=usage, choices=choices)
+
+
+@pytest.fixture(autouse=True)
+def streaming_api(monkeypatch):
+    """Every request streams "a", "b", "c" and reports 5 completion tokens in its usage."""
+    def create(**request):
+        return iter([chunk("a"), chunk("b"), chunk("c"), chunk(usage=SimpleNamespace(prompt_tokens=4, completion_tokens=5))])
+    monkeypatch.setattr(llm, "_openai", lambda: SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create))))
+    monkeypatch.setattr(llm, "cache", None)
+    monkeypatch.setattr(llm, "cassette", None)
+    monkeypatch.setattr(budget, "_encoding", lambda model: None)
+
+
+def complete(text="hello"):
+    return llm.complete("table", [{"role": "user", "content": text}])
+
+
+def test_streamed_tokens_count_for_the_stage():
+    tracker = progress.Tracker(["table"])
+    events = []
+    tracker.subscribe(lambda event, stage: events.append((event, stage["tokens"], stage.get("text"))))
+    with tracker.stage("table"):
+        assert complete() == "abc"
+    # One token per streamed delta, then the rest of the usage count at once
+    assert [event for event in events if event[0] == progress.TOKENS] == [
+        (progress.TOKENS, 1, "a"), (progress.TOKENS, 2, "b"), (progress.TOKENS, 3, "c"), (progress.TOKENS, 5, None),
+    ]
+    assert tracker.get("table")["tokens"] == 5
+    assert tracker.get("table")["status"] == progress.DONE
+
+
+def test_tokens_outside_a_stage_are_not_counted():
+    tracker = progress.Tracker(["table"])
+    complete()
+    with tracker.stage("table"):
+        pass
+    assert tracker.get("table")["tokens"] == 0
+
+
+def test_fan_out_items_count_for_their_stage():
+    tracker = progress.Tracker(["specs"])
+    with tracker.stage("specs", total=3, workers=2):
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            list(pool.map(tracker.bind("specs", complete), ["a", "b", "c"]))
+    stage = tracker.get("specs")
+    assert (stage["tokens"], stage["done"], stage["fraction"]) == (15, 3, 1.0)
+
+
+def test_bind_carries_the_stage_to_a_worker_thread():
+    tracker = progress.Tracker(["plan", "table"])
+    with tracker.stage("plan"):
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            pool.submit(progress.bind(complete)).result()
+    assert tracker.get("plan")["tokens"] == 5
+    assert tracker.get("table")["tokens"] == 0
+
+
+def test_failed_stage_keeps_its_tokens():
+    tracker = progress.Tracker(["table"])
+    with pytest.raises(ValueError):
+        with tracker.stage("table"):
+            complete()
+            raise ValueError("bad table")
+    stage = tracker.get("table")
+    assert (stage["status"], stage["tokens"], stage["error"]) == (progress.FAILED, 5, "ValueError: bad table")
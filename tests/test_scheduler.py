@@ -0,0 +1,69 @@
+import threading
+import time
+
+import scheduler
+
+
+def test_context_nests_and_restores():
+    assert scheduler.current() == (None, None)
+    with scheduler.context(priority=scheduler.BULK, session="a"):
+        with scheduler.context(session="b"):
+            assert scheduler.current() == (scheduler.BULK, "b")
+        assert scheduler.current() == (scheduler.BULK, "a")
+    assert scheduler.current() == (None, None)
+
+
+def test_priority_for_can_only_be_lowered_by_the_context():
+    assert scheduler.priority_for("plan") == scheduler.INTERACTIVE
+    assert scheduler.priority_for("use_case_specs") == scheduler.BULK
+    with scheduler.context(priority=scheduler.BATCH):
+        assert scheduler.priority_for("plan") == scheduler.BATCH
+    with scheduler.context(priority=scheduler.INTERACTIVE):
+        assert scheduler.priority_for("use_case_specs") == scheduler.BULK
+
+
+def test_bind_carries_the_context_to_another_thread():
+    seen = []
+    with scheduler.context(priority=scheduler.WORKFLOW, session="s"):
+        bound = scheduler.bind(lambda: seen.append(scheduler.current()))
+    thread = threading.Thread(target=bound)
+    thread.start()
+    thread.join()
+    assert seen == [(scheduler.WORKFLOW, "s")]
+
+
+def run_waiting(queue, tickets):
+    """Hold the only slot while ``tickets`` ((priority, session) pairs) queue up; returns the order they ran in."""
+    order, threads = [], []
+    with queue.slot():
+        for priority, session in tickets:
+            def request(priority=priority, session=session):
+                with queue.slot(priority, session):
+                    order.append((priority, session))
+            threads.append(threading.Thread(target=request))
+            threads[-1].start()
+            while queue.stats()[scheduler.CLASS_NAMES[priority]]["waiting"] < sum(ticket[0] == priority for ticket in tickets[:len(threads)]):
+                time.sleep(0.001)
+    for thread in threads:
+        thread.join()
+    return order
+
+
+def test_higher_classes_go_first():
+    order = run_waiting(scheduler.Scheduler(slots=1), [(scheduler.BATCH, "a"), (scheduler.BULK, "a"), (scheduler.INTERACTIVE, "a")])
+    assert [priority for priority, _ in order] == [scheduler.INTERACTIVE, scheduler.BULK, scheduler.BATCH]
+
+
+def test_waiting_requests_age_into_higher_classes():
+    queue = scheduler.Scheduler(slots=1, aging=0.01)
+    ticket = scheduler._Ticket(scheduler.BATCH, "a", time.monotonic() - 1, 0)
+    assert queue._rank(ticket, time.monotonic())[0] == scheduler.INTERACTIVE
+
+
+def test_stats_count_completed_requests():
+    queue = scheduler.Scheduler(slots=2)
+    for _ in range(3):
+        with queue.slot(scheduler.BULK, "s"):
+            pass
+    stats = queue.stats()["bulk"]
+    assert (stats["waiting"], stats["running"], stats["completed"]) == (0, 0, 3)
@@ -0,0 +1,100 @@
+import validators
+
+ACTORS = "| item # | object | description |\n|---|---|---|\n| 1 | Admin | a |\n| 2 | Clerk | c |"
+USE_CASES = "| UC_ID | UC_Name | Description |\n|---|---|---|\n| UC_01 | Login | l |\n| UC_02 | Report | r |"
+
+
+def test_parse_table_keeps_the_prose_around_it():
+    table = validators.parse_table("Here it is:\n\n| A | B |\n|:--|--:|\n| 1 | 2 |\n\nDone.")
+    assert table.header == ["A", "B"]
+    assert table.rows == [["1", "2"]]
+    assert table.render() == "Here it is:\n\n| A | B |\n| --- | --- |\n| 1 | 2 |\n\nDone."
+
+
+def test_parse_table_without_a_table():
+    assert validators.parse_table("no table here") is None
+    assert validators.parse_table("") is None
+
+
+def test_column_matches_loosely():
+    table = validators.parse_table("| UC ID | uc_name |\n|---|---|")
+    assert table.column("UC_ID") == 0
+    assert table.column("UC_Name") == 1
+    assert table.column("Description") is None
+
+
+def test_validate_object_table_reports_broken_rows():
+    table, defects = validators.validate_object_table("| item # | object | description |\n|---|---|---|\n| 1 | Book | b |\n| 2 | | |\n| 3 | Cart |")
+    assert [(defect.kind, defect.row) for defect in defects] == [("row", 1), ("row", 2)]
+
+
+def test_validate_object_table_without_a_table():
+    table, defects = validators.validate_object_table("Sorry")
+    assert table is None
+    assert defects[0].kind == "structure"
+
+
+def test_validate_use_case_table_finds_duplicate_ids_and_renumbers_them():
+    table, defects = validators.validate_use_case_table(USE_CASES + "\n| UC_02 | Export | e |")
+    assert [(defect.kind, defect.row) for defect in defects] == [("row", 2)]
+    assert validators.renumber_duplicate_ids(table) == [2]
+    assert table.rows[2][0] == "UC_03"
+    assert validators.validate_use_case_table(table.render())[1] == []
+
+
+def test_validate_use_case_table_missing_columns():
+    _, defects = validators.validate_use_case_table("| UC_ID | Name |\n|---|---|\n| UC_01 | Login |")
+    assert defects[0].missing == ["UC_Name", "Description"]
+
+
+def test_valid_permission_matrix():
+    matrix = "| Use Case | Admin | Clerk |\n|---|---|---|\n| UC_01 Login | O | O |\n| UC_02 Report | O* | X |"
+    assert validators.validate_permission_matrix(matrix, ACTORS, USE_CASES)[1] == []
+
+
+def test_permission_matrix_missing_and_stale_entries():
+    matrix = "| Use Case | Admin | Guest |\n|---|---|---|\n| UC_01 Login | O | Y |\n| UC_09 Old | O | O |"
+    _, defects = validators.validate_permission_matrix(matrix, ACTORS, USE_CASES)
+    by_kind = {defect.kind: defect for defect in defects}
+    assert by_kind["missing_columns"].missing == ["Clerk"]
+    assert by_kind["extra_columns"].missing == ["Guest"]
+    assert by_kind["missing_rows"].missing == ["UC_02 Report"]
+    assert by_kind["extra_rows"].missing == ["UC_09 Old"]
+    assert by_kind["row"].row == 0
+
+
+def test_splice_and_patch_rows():
+    table = validators.parse_table(USE_CASES)
+    validators.splice_rows(table, [["UC_01", "Sign in", "s"], ["UC_03", "Export", "e"]], replaced=[0])
+    assert [row[1] for row in table.rows] == ["Sign in", "Report", "Export"]
+    validators.patch_rows(table, [["uc_02", "Reports", "r"], ["UC_04", "Audit", "a"]], removed=["UC_03"])
+    assert [row[1] for row in table.rows] == ["Sign in", "Reports", "Audit"]
+
+
+def test_merge_and_drop_columns():
+    table = validators.parse_table("| Use Case | Admin |\n|---|---|\n| UC_01 Login | O |\n| UC_02 Report | X |")
+    extra = validators.parse_table("| Use Case | Clerk |\n|---|---|\n| uc_01 login | O* |")
+    validators.merge_columns(table, extra)
+    assert table.rows == [["UC_01 Login", "O", "O*"], ["UC_02 Report", "X", ""]]
+    validators.drop_columns(table, ["admin"])
+    assert table.header == ["Use Case", "Clerk"]
+    assert table.rows == [["UC_01 Login", "O*"], ["UC_02 Report", ""]]
+
+
+def test_use_case_rows_match_on_whole_ids_and_names():
+    use_cases = "| UC_ID | UC_Name | Description |\n|---|---|---|\n| UC1 | Task 1 | a |\n| UC11 | Task 11 | b |"
+    actors = "| item # | object | description |\n|---|---|---|\n| 1 | Admin | a |"
+    # The UC1 row is missing; neither the UC11 row nor its name may stand in for it
+    _, defects = validators.validate_permission_matrix("| Use Case | Admin |\n|---|---|\n| UC11 Task 11 | O |", actors, use_cases)
+    assert [(defect.kind, defect.missing) for defect in defects] == [("missing_rows", ["UC1 Task 1"])]
+    matrix = "| Use Case | Admin |\n|---|---|\n| UC1 Task 1 | O |\n| Task 11 | X |"
+    assert validators.validate_permission_matrix(matrix, actors, use_cases)[1] == []
+
+
+def test_unreadable_actor_or_use_case_tables_are_structure_defects():
+    matrix = "| Use Case | Admin | Clerk |\n|---|---|---|\n| UC_01 Login | O | X |\n| UC_02 Report | O | O |"
+    bulleted = "- Admin: runs the shop\n- Clerk: serves customers"
+    _, defects = validators.validate_permission_matrix(matrix, bulleted, USE_CASES)
+    assert [defect.kind for defect in defects] == ["structure"]
+    _, defects = validators.validate_permission_matrix(matrix, ACTORS, "UC_01 Login, UC_02 Report")
+    assert [defect.kind for defect in defects] == ["structure"]
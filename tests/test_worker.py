@@ -0,0 +1,32 @@
+import pytest
+
+import jobqueue
+import llm
+import main
+import worker
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    # work() points the process at its store and replaces the LLM cache and key lookup; all are restored
+    monkeypatch.setenv("AGENT_SIMON_DISK_STORE", str(tmp_path / "store"))
+    monkeypatch.setattr(llm, "cache", None)
+    monkeypatch.setattr(llm, "resolve_api_key", None)
+    main.disk_store.clear()
+    yield jobqueue.JobQueue(str(tmp_path / "jobs.db"))
+    main.disk_store.clear()
+
+
+def test_a_failed_merge_is_recorded_on_the_job(queue, tmp_path, monkeypatch):
+    def complete(stage, messages, **options):
+        if stage == "plan_merge":
+            raise RuntimeError("Rate limit reached")
+        return f"# {stage}\n\n## A\ntext"
+    monkeypatch.setattr(llm, "complete", complete)
+    job_id = queue.enqueue("meeting_plan", {"meetings": [["d1", "one", "Anna: hi"], ["d2", "two", "Ben: hello"]], "merge_state": {}})
+
+    assert worker.work(queue.path, str(tmp_path / "store"), stop_when_idle=True) == 1
+    job = queue.get(job_id)
+    assert job["status"] == jobqueue.FAILED
+    assert job["error"] == "RuntimeError: Rate limit reached"
+    assert llm.resolve_api_key is not None  # the key is looked up like in the UI
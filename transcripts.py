@@ -0,0 +1,181 @@
+"""Speaker-aware view of meeting transcripts and traceability back to them.
+
+A transcript is split into utterances (speaker, optional timestamp, text)
+and indexed once in an inverted index. Generated requirements, use cases
+and data objects are then linked to their best supporting utterances with
+BM25 scoring, locally and without another LLM call.
+"""
+import heapq
+import math
+import re
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+
+import validators
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+TRACE_RESULTS = 3
+
+_TIMESTAMP = re.compile(r"^\[?(?P<timestamp>\d{1,2}:\d{2}(?::\d{2})?(?:[.,]\d+)?)\]?\s*")
+_SPEAKER = re.compile(r"^(?P<speaker>[^:]{1,80}?):\s+(?P<text>\S.*)$")
+_TOKEN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset("""
+a about after all also an and any are as at be been but by can could do does for from had has have how i if in into
+is it its just let like me more my no not of on or our out over so some such than that the their them then there these
+they this to up us was we well were what when which who will with would you your yes okay ok sure thanks thank great
+""".split())
+
+
+@dataclass(slots=True)
+class Utterance:
+    index: int
+    speaker: str
+    text: str
+    timestamp: str = None
+    source: str = None  # meeting the utterance comes from
+
+
+def split_speaker(line):
+    """(speaker, text) of a "Speaker: text" line, or None if the line does not start with a speaker."""
+    match = _SPEAKER.match(line)
+    if match is None:
+        return None
+    speaker = match.group("speaker").strip()
+    if len(speaker.split()) > 8 or speaker.endswith((".", "?", "!")):
+        return None
+    return speaker, match.group("text")
+
+
+def utterances_from_lines(lines, source=None):
+    """Build utterances from transcript lines as they are read.
+
+    A line of the form "[timestamp] Speaker: text" starts a new utterance
+    (e.g. "Business Analyst - Jane (Side A): ..."); other lines continue the
+    current one. Each utterance is yielded once it is complete.
+    """
+    current = None
+    index = 0
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        timestamp = None
+        match = _TIMESTAMP.match(line)
+        if match:
+            timestamp, line = match.group("timestamp"), line[match.end():]
+        spoken = split_speaker(line)
+        if current is not None and timestamp is None and spoken is None:
+            current.text += "\n" + line
+            continue
+        if current is not None:
+            yield current
+            index += 1
+        speaker, text = spoken or ("", line)
+        current = Utterance(index, speaker, text, timestamp, source)
+    if current is not None:
+        yield current
+
+
+def split_utterances(text, source=None):
+    """Split transcript text into utterances."""
+    return list(utterances_from_lines(text.splitlines(), source))
+
+
+def to_text(utterances):
+    """Transcript text with one "[timestamp] Speaker: text" entry per utterance; splits back into the same utterances."""
+    lines = []
+    for utterance in utterances:
+        line = f"{utterance.speaker}: {utterance.text}" if utterance.speaker else utterance.text
+        lines.append(f"[{utterance.timestamp}] {line}" if utterance.timestamp else line)
+    return "\n".join(lines)
+
+
+def tokenize(text):
+    """Lowercase word tokens without stopwords, with a plural "s" stripped."""
+    tokens = []
+    for token in _TOKEN.findall(text.lower()):
+        if token in STOPWORDS or len(token) < 2:
+            continue
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+class TranscriptIndex:
+    """Inverted index over utterances with BM25 search."""
+
+    def __init__(self, utterances):
+        self.utterances = utterances
+        self.postings = defaultdict(list)  # token -> [(utterance index, term frequency)]
+        self.lengths = []
+        for position, utterance in enumerate(utterances):
+            tokens = tokenize(f"{utterance.speaker} {utterance.text}")
+            self.lengths.append(len(tokens))
+            for token, count in Counter(tokens).items():
+                self.postings[token].append((position, count))
+        self.average_length = sum(self.lengths) / len(self.lengths) if self.lengths else 0
+        count = len(utterances)
+        self.idf = {
+            token: math.log(1 + (count - len(posting) + 0.5) / (len(posting) + 0.5))
+            for token, posting in self.postings.items()
+        }
+
+    @classmethod
+    def from_transcripts(cls, transcripts):
+        """Index several (name, text) transcripts together; utterances keep their meeting name."""
+        utterances = []
+        for name, text in transcripts:
+            for utterance in split_utterances(text, source=name):
+                utterance.index = len(utterances)
+                utterances.append(utterance)
+        return cls(utterances)
+
+    def search(self, query, k=TRACE_RESULTS):
+        """Return the ``k`` best matching (score, utterance) pairs for a query."""
+        scores = defaultdict(float)
+        for token in set(tokenize(query)):
+            idf = self.idf.get(token)
+            if idf is None:
+                continue
+            for position, frequency in self.postings[token]:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[position] / self.average_length)
+                scores[position] += idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [(score, self.utterances[position]) for position, score in best]
+
+
+def plan_requirements(plan):
+    """Requirement lines of a plan: its bullet and numbered items."""
+    requirements = []
+    for line in (plan or "").splitlines():
+        match = re.match(r"^\s*(?:[-*+]|\d+[.)])\s+(.*\S)", line)
+        if match:
+            text = re.sub(r"[*_`]", "", match.group(1)).strip()
+            if len(tokenize(text)) >= 2:
+                requirements.append(text)
+    return requirements
+
+
+def table_items(md_table, columns):
+    """Text of each row of a markdown table, built from the given columns."""
+    table = validators.parse_table(md_table)
+    if table is None:
+        return []
+    indices = [table.column(name) for name in columns]
+    indices = [index for index in indices if index is not None]
+    return [" - ".join(row[index] for index in indices if index < len(row)) for row in table.rows]
+
+
+def traceability(index, artifacts, k=TRACE_RESULTS):
+    """Link every item of the given artifacts to its top supporting utterances.
+
+    ``artifacts`` maps an artifact name to its list of item texts. Returns one
+    row per item with the matching utterances.
+    """
+    rows = []
+    for artifact, items in artifacts.items():
+        for item in items:
+            rows.append({"artifact": artifact, "item": item, "sources": index.search(item, k)})
+    return rows
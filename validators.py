@@ -0,0 +1,311 @@
+"""Local parsing and validation of the markdown tables produced by the generators.
+
+Each validator returns the parsed table together with a list of defects, so the
+caller can send a small repair request for just the broken rows instead of
+regenerating the whole artifact.
+"""
+import re
+from dataclasses import dataclass, field
+
+OBJECT_COLUMNS = ["item #", "object", "description"]
+USE_CASE_COLUMNS = ["UC_ID", "UC_Name", "Description"]
+PERMISSION_VALUES = {"O", "O*", "X"}
+
+_SEPARATOR_CELL = re.compile(r"^:?-+:?$")
+
+
+@dataclass
+class Table:
+    """A markdown table plus the prose around it, so it can be re-rendered in place."""
+    header: list
+    rows: list
+    prefix: str = ""
+    suffix: str = ""
+
+    def column(self, name):
+        """Return the index of a column, matching names loosely (case, spaces, underscores)."""
+        wanted = normalize(name)
+        for index, heading in enumerate(self.header):
+            if normalize(heading) == wanted:
+                return index
+        return None
+
+    def records(self):
+        """Return the rows as a list of dicts keyed by header."""
+        return [dict(zip(self.header, row)) for row in self.rows]
+
+    def render(self):
+        """Render the table back to markdown, keeping the surrounding prose."""
+        lines = [_render_row(self.header), _render_row(["---"] * len(self.header))]
+        lines += [_render_row(row) for row in self.rows]
+        parts = [self.prefix.rstrip("\n"), "\n".join(lines), self.suffix.lstrip("\n")]
+        return "\n\n".join(part for part in parts if part)
+
+
+@dataclass
+class Defect:
+    """A single problem found in a table.
+
+    ``kind`` is "row" for a broken row (see ``row``), "missing_rows" or
+    "missing_columns" for entries that should be added (see ``missing``),
+    "extra_rows" or "extra_columns" for entries that no longer apply and can
+    be dropped locally (also listed in ``missing``), and "structure" when the
+    table itself is unusable and has to be regenerated, or when a table it is
+    checked against cannot be read.
+    """
+    message: str
+    kind: str = "structure"
+    row: int = None
+    missing: list = field(default_factory=list)
+
+
+def normalize(text):
+    """Normalize a cell or heading for loose comparison."""
+    return re.sub(r"[\s_\-*`]+", " ", str(text)).strip().lower()
+
+
+def _split_row(line):
+    line = line.strip()
+    if line.startswith("|"):
+        line = line[1:]
+    if line.endswith("|") and not line.endswith("\\|"):
+        line = line[:-1]
+    return [cell.strip() for cell in re.split(r"(?<!\\)\|", line)]
+
+
+def _render_row(cells):
+    return "| " + " | ".join(str(cell) for cell in cells) + " |"
+
+
+def _is_separator(cells):
+    return all(_SEPARATOR_CELL.match(cell.replace(" ", "")) for cell in cells if cell) and any(cells)
+
+
+def parse_table(md_text):
+    """Parse the first markdown table in ``md_text``. Returns None if there is no table."""
+    if not md_text:
+        return None
+    lines = md_text.splitlines()
+    for start in range(len(lines) - 1):
+        if "|" not in lines[start] or "|" not in lines[start + 1]:
+            continue
+        header = _split_row(lines[start])
+        if not _is_separator(_split_row(lines[start + 1])):
+            continue
+        end = start + 2
+        rows = []
+        while end < len(lines) and "|" in lines[end]:
+            rows.append(_split_row(lines[end]))
+            end += 1
+        return Table(
+            header=header,
+            rows=rows,
+            prefix="\n".join(lines[:start]),
+            suffix="\n".join(lines[end:]),
+        )
+    return None
+
+
+def _check_shape(table, required_columns):
+    defects = []
+    missing = [name for name in required_columns if table.column(name) is None]
+    if missing:
+        defects.append(Defect(f"Missing columns: {', '.join(missing)}", missing=missing))
+    for index, row in enumerate(table.rows):
+        if len(row) != len(table.header):
+            defects.append(Defect(f"Row has {len(row)} cells, expected {len(table.header)}", "row", index))
+        elif not all(cell for cell in row):
+            defects.append(Defect("Row has empty cells", "row", index))
+    return defects
+
+
+def validate_object_table(md_text):
+    """Validate a data/actor/external system table (item #, object, description)."""
+    table = parse_table(md_text)
+    if table is None:
+        return None, [Defect("No markdown table found")]
+    defects = _check_shape(table, OBJECT_COLUMNS)
+    if not table.rows:
+        defects.append(Defect("Table has no rows"))
+    return table, defects
+
+
+def validate_use_case_table(md_text):
+    """Validate a use case table: required columns, complete rows and unique UC_IDs."""
+    table = parse_table(md_text)
+    if table is None:
+        return None, [Defect("No markdown table found")]
+    defects = _check_shape(table, USE_CASE_COLUMNS)
+    if not table.rows:
+        defects.append(Defect("Table has no rows"))
+    id_column = table.column("UC_ID")
+    if id_column is not None:
+        seen = set()
+        for index, row in enumerate(table.rows):
+            if id_column >= len(row):
+                continue
+            uc_id = normalize(row[id_column])
+            if uc_id in seen:
+                defects.append(Defect(f"Duplicate UC_ID {row[id_column]}", "row", index))
+            seen.add(uc_id)
+    return table, defects
+
+
+def use_case_records(table):
+    """Return the rows of a validated use case table as dicts keyed by the canonical column names."""
+    columns = [table.column(name) for name in USE_CASE_COLUMNS]
+    return [{name: row[column] for name, column in zip(USE_CASE_COLUMNS, columns)} for row in table.rows]
+
+
+def object_names(md_text):
+    """Return the object names listed in a data/actor/external system table."""
+    table = parse_table(md_text)
+    if table is None or not table.header:
+        return []
+    column = table.column("object")
+    if column is None:
+        column = 1 if len(table.header) > 1 else 0
+    return [row[column] for row in table.rows if column < len(row) and row[column]]
+
+
+def use_case_names(md_text):
+    """Return (UC_ID, UC_Name) pairs from a use case table."""
+    table = parse_table(md_text)
+    if table is None:
+        return []
+    id_column, name_column = table.column("UC_ID"), table.column("UC_Name")
+    if id_column is None or name_column is None:
+        return []
+    return [
+        (row[id_column], row[name_column])
+        for row in table.rows
+        if max(id_column, name_column) < len(row)
+    ]
+
+
+def _matches_use_case(cell, use_case):
+    """Whether a row label is a use case: its UC_ID, its UC_Name, or a label starting with the UC_ID as a whole word."""
+    cell = normalize(cell)
+    uc_id, uc_name = normalize(use_case[0]), normalize(use_case[1])
+    return bool(cell) and (cell in (uc_id, uc_name) or bool(uc_id) and cell.startswith(uc_id + " "))
+
+
+def validate_permission_matrix(md_text, actor_objects, use_case_table):
+    """Validate a permission matrix against the actor and use case tables.
+
+    Checks that every actor has a column, every use case has a row, there
+    are no columns or rows of actors and use cases that are gone, and every
+    permission cell is one of O, O* or X. An actor or use case table that
+    cannot be read is a "structure" defect, and its columns or rows are not
+    checked.
+    """
+    table = parse_table(md_text)
+    if table is None:
+        return None, [Defect("No markdown table found")]
+    defects = []
+
+    # Without readable actors or use cases there is nothing to check the columns or rows against;
+    # every one of them would look stale and be dropped
+    actors = object_names(actor_objects)
+    if not actors:
+        defects.append(Defect("No actors can be read from the actor table, so the actor columns cannot be checked"))
+    else:
+        actor_columns = {normalize(heading) for heading in table.header[1:]}
+        missing_actors = [actor for actor in actors if normalize(actor) not in actor_columns]
+        if missing_actors:
+            defects.append(Defect(f"Missing actor columns: {', '.join(missing_actors)}", "missing_columns", missing=missing_actors))
+        known_actors = {normalize(actor) for actor in actors}
+        extra_actors = [heading for heading in table.header[1:] if normalize(heading) not in known_actors]
+        if extra_actors:
+            defects.append(Defect(f"Columns of unknown actors: {', '.join(extra_actors)}", "extra_columns", missing=extra_actors))
+
+    use_cases = use_case_names(use_case_table)
+    if not use_cases:
+        defects.append(Defect("No use cases can be read from the use case table, so the use case rows cannot be checked"))
+    else:
+        row_labels = [row[0] for row in table.rows if row]
+        missing_use_cases = [
+            use_case for use_case in use_cases
+            if not any(_matches_use_case(label, use_case) for label in row_labels)
+        ]
+        if missing_use_cases:
+            labels = [f"{uc_id} {uc_name}" for uc_id, uc_name in missing_use_cases]
+            defects.append(Defect(f"Missing use case rows: {', '.join(labels)}", "missing_rows", missing=labels))
+        extra_use_cases = [label for label in row_labels if not any(_matches_use_case(label, use_case) for use_case in use_cases)]
+        if extra_use_cases:
+            defects.append(Defect(f"Rows of unknown use cases: {', '.join(extra_use_cases)}", "extra_rows", missing=extra_use_cases))
+
+    for index, row in enumerate(table.rows):
+        if len(row) != len(table.header):
+            defects.append(Defect(f"Row has {len(row)} cells, expected {len(table.header)}", "row", index))
+            continue
+        invalid = [cell for cell in row[1:] if cell.replace(" ", "") not in PERMISSION_VALUES]
+        if invalid:
+            defects.append(Defect(f"Invalid permission values: {', '.join(invalid)} (use O, O* or X)", "row", index))
+    return table, defects
+
+
+def renumber_duplicate_ids(table):
+    """Give duplicate UC_IDs fresh ids locally. Returns the indices of renumbered rows."""
+    id_column = table.column("UC_ID")
+    if id_column is None:
+        return []
+    numbers = []
+    for row in table.rows:
+        match = re.search(r"\d+", row[id_column]) if id_column < len(row) else None
+        if match:
+            numbers.append(int(match.group()))
+    next_number = max(numbers, default=0) + 1
+    seen, renumbered = set(), []
+    for index, row in enumerate(table.rows):
+        if id_column >= len(row):
+            continue
+        if normalize(row[id_column]) in seen:
+            prefix = re.sub(r"\d+.*$", "", row[id_column]) or "UC_"
+            row[id_column] = f"{prefix}{next_number:02d}"
+            next_number += 1
+            renumbered.append(index)
+        seen.add(normalize(row[id_column]))
+    return renumbered
+
+
+def splice_rows(table, repaired_rows, replaced=()):
+    """Put ``repaired_rows`` in place of the rows at the ``replaced`` indices; extra rows are appended."""
+    replaced = sorted(replaced)
+    for index, row in zip(replaced, repaired_rows):
+        table.rows[index] = row
+    table.rows.extend(repaired_rows[len(replaced):])
+    return table
+
+
+def merge_columns(table, extra):
+    """Add the columns of ``extra`` to ``table``, joining rows on their first cell."""
+    by_label = {normalize(row[0]): row[1:] for row in extra.rows if row}
+    table.header = table.header + extra.header[1:]
+    blank = [""] * (len(extra.header) - 1)
+    table.rows = [row + by_label.get(normalize(row[0]), blank) for row in table.rows]
+    return table
+
+
+def drop_columns(table, headings):
+    """Remove the columns with the given headings (matched loosely) from ``table``."""
+    dropped = {normalize(heading) for heading in headings}
+    keep = [index for index, heading in enumerate(table.header) if normalize(heading) not in dropped]
+    table.header = [table.header[index] for index in keep]
+    table.rows = [[row[index] for index in keep if index < len(row)] for row in table.rows]
+    return table
+
+
+def patch_rows(table, rows, removed=(), key_column=0):
+    """Apply a row patch: rows whose key matches a row of ``rows`` are replaced, the
+    other ``rows`` are appended, and rows whose key is in ``removed`` are dropped."""
+    patch = {normalize(row[key_column]): row for row in rows if key_column < len(row)}
+    removed = {normalize(key) for key in removed}
+    patched = []
+    for row in table.rows:
+        key = normalize(row[key_column]) if key_column < len(row) else None
+        if key in removed:
+            continue
+        patched.append(patch.pop(key, row))
+    table.rows = patched + list(patch.values())
+    return table
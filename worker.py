@@ -0,0 +1,82 @@
+"""Worker processes for generation and export jobs.
+
+Each process pulls jobs from the shared SQLite queue, runs them through
+``main.JOBS`` and writes the results to the shared disk store, so the CPU
+work of all users is spread over several interpreters instead of sharing
+one GIL. Point the UI at the same queue and store and it only enqueues and
+displays:
+
+    python worker.py --queue jobs.db --store artifacts --processes 4
+    AGENT_SIMON_QUEUE=jobs.db AGENT_SIMON_DISK_STORE=artifacts streamlit run main.py
+"""
+import argparse
+import multiprocessing
+import os
+import socket
+import sys
+import time
+import jobqueue
+
+IDLE_SECONDS = 0.2  # poll interval while the queue is empty
+
+
+def work(queue_path, store_path, stop_when_idle=False):
+    """Run jobs until stopped, or until the queue is empty if ``stop_when_idle``. Returns the number of jobs run."""
+    os.environ["AGENT_SIMON_DISK_STORE"] = store_path
+    os.environ.pop("AGENT_SIMON_QUEUE", None)  # jobs run here, never re-enqueued
+    import llm
+    import main
+    main.connect_openai()  # the key comes from the environment or the Streamlit secrets, as in the UI
+    queue = jobqueue.JobQueue(queue_path)
+    store = main.disk_store()
+    llm.cache = store  # completions are shared by every worker
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    count = 0
+    while True:
+        job = queue.claim(worker)
+        if job is None:
+            if stop_when_idle:
+                return count
+            time.sleep(IDLE_SECONDS)
+            continue
+        try:
+            store.cache(job["result_key"], main.JOBS[job["kind"]](job["args"]))
+        except Exception as e:
+            queue.fail(job["id"], f"{type(e).__name__}: {e}")
+        else:
+            queue.finish(job["id"])
+        count += 1
+
+
+def start(queue_path, store_path, processes, stop_when_idle=False, target=work):
+    """Start worker processes and return them."""
+    context = multiprocessing.get_context("spawn")
+    workers = [context.Process(target=target, args=(queue_path, store_path, stop_when_idle), daemon=True) for _ in range(processes)]
+    for process in workers:
+        process.start()
+    return workers
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queue", default=os.environ.get("AGENT_SIMON_QUEUE", "jobs.db"), help="SQLite job queue file")
+    parser.add_argument("--store", default=os.environ.get("AGENT_SIMON_DISK_STORE", "artifacts"), help="shared artifact store directory")
+    parser.add_argument("--processes", type=int, default=os.cpu_count(), help="worker processes to run")
+    parser.add_argument("--stop-when-idle", action="store_true", help="exit once the queue is empty")
+    return parser.parse_args(argv)
+
+
+def run(argv=None):
+    args = parse_args(argv)
+    workers = start(args.queue, args.store, args.processes, args.stop_when_idle)
+    try:
+        for process in workers:
+            process.join()
+    except KeyboardInterrupt:
+        for process in workers:
+            process.terminate()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(run())
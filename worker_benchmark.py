@@ -0,0 +1,84 @@
+"""Throughput of the worker processes, from 1 to N processes, with a local fake LLM.
+
+Every run gets a fresh queue and store, filled with a mix of CPU-bound jobs
+(parsing .docx transcripts) and LLM-bound jobs (object tables answered by a
+fake model after ``--latency`` seconds), all with distinct inputs so nothing
+is served from the shared cache:
+
+    python worker_benchmark.py --processes 1 2 4 --jobs 40
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import artifact_store
+import ingest_benchmark
+import jobqueue
+import worker
+
+FAKE_TABLE = "| item # | object | description |\n|---|---|---|\n" + "\n".join(f"| {i} | Object {i} | d |" for i in range(1, 21))
+
+
+def _fake_send(**request):
+    time.sleep(float(os.environ["AGENT_SIMON_FAKE_LATENCY"]))
+    return {"choices": [{"content": FAKE_TABLE, "finish_reason": "stop"}], "usage": {"prompt_tokens": 0, "completion_tokens": len(FAKE_TABLE) // 4}}
+
+
+def fake_work(queue_path, store_path, stop_when_idle):
+    """``worker.work`` with the fake model in place of the API."""
+    import llm
+    llm._send = _fake_send
+    return worker.work(queue_path, store_path, stop_when_idle)
+
+
+def fill(queue, store, jobs, utterances):
+    """Enqueue ``jobs`` jobs, half transcript parsing and half object tables."""
+    for index in range(jobs):
+        if index % 2:
+            queue.enqueue("object_table", {"plan": f"Plan {index}", "instruction": "List all data objects within the software system..."})
+        else:
+            document = ingest_benchmark.synthetic("docx", utterances) + f"{index}".encode()  # distinct bytes, same parse
+            queue.enqueue("transcript", {"content": store.put(document).key})
+
+
+def measure(processes, jobs, utterances):
+    """Jobs per second with ``processes`` workers, timed from the first job started to the last finished."""
+    with tempfile.TemporaryDirectory() as directory:
+        queue_path, store_path = os.path.join(directory, "jobs.db"), os.path.join(directory, "artifacts")
+        queue = jobqueue.JobQueue(queue_path)
+        fill(queue, artifact_store.DiskStore(store_path), jobs, utterances)
+        for process in worker.start(queue_path, store_path, processes, stop_when_idle=True, target=fake_work):
+            process.join()
+        with sqlite3.connect(queue_path) as connection:
+            first, last, failed = connection.execute(
+                "SELECT MIN(started), MAX(finished), SUM(status = ?) FROM jobs", (jobqueue.FAILED,)
+            ).fetchone()
+    seconds = last - first
+    return {"processes": processes, "seconds": seconds, "jobs_per_second": jobs / seconds, "failed": failed}
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--jobs", type=int, default=40)
+    parser.add_argument("--utterances", type=int, default=3000, help="size of each transcript to parse")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds the fake model takes per request")
+    return parser.parse_args(argv)
+
+
+def run(argv=None):
+    args = parse_args(argv)
+    os.environ["AGENT_SIMON_FAKE_LATENCY"] = str(args.latency)
+    baseline = None
+    print(f"{'processes':>9s} {'seconds':>8s} {'jobs/s':>8s} {'speedup':>8s} {'failed':>6s}")
+    for processes in args.processes:
+        result = measure(processes, args.jobs, args.utterances)
+        baseline = baseline or result["jobs_per_second"]
+        print(f"{processes:9d} {result['seconds']:8.2f} {result['jobs_per_second']:8.2f} {result['jobs_per_second'] / baseline:8.2f} {result['failed']:6d}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(run())